@@ -0,0 +1,171 @@
+"""Provisioning agent: runs the render/init/apply and destroy pipelines on one hypervisor host.
+
+The API (controller) places VMs on hosts and calls the agent over HTTP; the
+agent registers its capacity with the controller at startup and re-registers
+every AGENT_HEARTBEAT_INTERVAL seconds. Start one per host:
+
+    CONTROLLER_URL=http://api:8000 AGENT_URL=http://this-host:8101 uvicorn agent:app --host 0.0.0.0 --port 8101
+
+Workspaces, IP leases and golden images live under this host's own
+VM_WORKSPACE_ROOT, so several agents can share one machine for testing as
+long as each gets its own root and port.
+"""
+import json
+import os
+import socket
+import threading
+import traceback
+
+import httpx
+from fastapi import FastAPI, HTTPException, Request
+from fastapi.responses import StreamingResponse
+from pydantic import BaseModel, Field
+
+import main
+import nodes
+from jobs import Job
+
+# ---Agent Configuration----
+CONTROLLER_URL = os.getenv("CONTROLLER_URL", "http://127.0.0.1:8000")
+AGENT_URL = os.getenv("AGENT_URL", "http://127.0.0.1:8101")  # how the controller reaches this agent
+AGENT_NODE_ID = os.getenv("AGENT_NODE_ID") or socket.gethostname()
+AGENT_HEARTBEAT_INTERVAL = float(os.getenv("AGENT_HEARTBEAT_INTERVAL", "15"))
+
+app = FastAPI()
+
+
+class AgentVMRequest(BaseModel):
+    owner: str  # user email the VM belongs to
+    box_name: str = Field(pattern=main.BOX_NAME_PATTERN)
+    vm_name: str = Field(pattern=main.VM_NAME_PATTERN)
+    cpus: int
+    memory: int
+    linked_clone: bool = False  # resolved by the controller
+
+
+class AgentDestroyRequest(BaseModel):
+    owner: str
+    vm_name: str
+
+
+class AgentJob(Job):
+    """Job whose log entries are also handed to emit(entry) as they are written"""
+
+    def __init__(self, kind, owner, emit):
+        super().__init__(kind, owner)
+        self.emit = emit
+
+    def _append(self, level, message, phase):
+        super()._append(level, message, phase)
+        self.emit(self.phases[-1])
+
+
+def authorize(request: Request):
+    if not nodes.authorized(request.headers):
+        raise HTTPException(status_code=401, detail="Invalid node token")
+
+
+def stream_pipeline(kind, owner, pipeline):
+    """Run pipeline(job) in a worker thread, streaming its log entries and then its result as JSON lines"""
+    def run(on_line):
+        job = AgentJob(kind, owner, lambda entry: on_line({"entry": entry}))
+        try:
+            return {"result": pipeline(job)}
+        except Exception as e:
+            traceback.print_exc()
+            return {"error": str(e)}
+        finally:
+            main.log_broker.close(main.stream_key(job))
+
+    async def events():
+        async for event in main.stream_lines(run):
+            yield json.dumps(event) + "\n"
+    return StreamingResponse(events(), media_type="application/x-ndjson")
+
+
+def build(job, req):
+    workspace = main.workspace_allocator.acquire(req.owner, req.vm_name)
+    try:
+        init_output, apply_output = main.build_vm(job, workspace, req.box_name, req.vm_name, req.memory, req.cpus,
+                                                  linked_clone=req.linked_clone)
+    except Exception:
+        main.linked_clones.release(workspace.key)
+        raise
+    return {"vm_ip": workspace.ip, "terraform_init": init_output, "terraform_apply": apply_output,
+            "disk_saved_bytes": main.linked_clones.saved_bytes(workspace.key)}
+
+
+def destroy(job, req):
+    workspace = main.workspace_allocator.find(req.owner, req.vm_name)
+    if not workspace:
+        # Never built here (e.g. the create failed before reaching this host): nothing to tear down
+        return {"terraform_destroy": f"No workspace for VM '{req.vm_name}' on node {AGENT_NODE_ID}"}
+    return main.destroy_vm_job(job, req, workspace)
+
+
+@app.post("/agent/vms")
+def create_vm(req: AgentVMRequest, request: Request):
+    """Build a VM on this host, streaming the job log"""
+    authorize(request)
+    print(f"Building {req.vm_name} for {req.owner} ({req.cpus} vCPUs / {req.memory} MB)")
+    return stream_pipeline("create-vm", req.owner, lambda job: build(job, req))
+
+
+@app.post("/agent/vms/destroy")
+def destroy_vm(req: AgentDestroyRequest, request: Request):
+    """Destroy a VM on this host and reclaim its workspace, streaming the job log"""
+    authorize(request)
+    print(f"Destroying {req.vm_name} for {req.owner}")
+    return stream_pipeline("destroy-vm", req.owner, lambda job: destroy(job, req))
+
+
+@app.get("/agent/status")
+def get_status(request: Request):
+    """Capacity this agent registers and the workspaces it holds"""
+    authorize(request)
+    workspaces_dir = main.workspace_allocator.workspaces_dir
+    return {
+        **registration(),
+        "workspaces": sorted(os.listdir(workspaces_dir)) if os.path.isdir(workspaces_dir) else [],
+        "ip_leases": main.workspace_allocator.ip_pool.leases(),
+    }
+
+
+def registration():
+    return {
+        "node_id": AGENT_NODE_ID,
+        "url": AGENT_URL,
+        "cpus": main.scheduler.cpu_capacity,
+        "memory_mb": main.scheduler.memory_capacity,
+    }
+
+
+_stop = threading.Event()
+
+
+def heartbeat_loop():
+    registered = False
+    while not _stop.is_set():
+        try:
+            response = httpx.post(f"{CONTROLLER_URL.rstrip('/')}/nodes/register", json=registration(),
+                                  headers=nodes.node_headers(), timeout=nodes.NODE_CONNECT_TIMEOUT)
+            response.raise_for_status()
+            if not registered:
+                print(f"Registered node {AGENT_NODE_ID} with {CONTROLLER_URL}")
+            registered = True
+        except Exception as e:
+            print(f"Error registering with {CONTROLLER_URL}: {e}")
+            registered = False
+        _stop.wait(AGENT_HEARTBEAT_INTERVAL)
+
+
+@app.on_event("startup")
+def start_heartbeat():
+    nodes.require_token("a provisioning agent")
+    threading.Thread(target=heartbeat_loop, name="agent-heartbeat", daemon=True).start()
+
+
+@app.on_event("shutdown")
+def stop_heartbeat():
+    _stop.set()
+    main.golden_images.shutdown()
@@ -0,0 +1,319 @@
+"""In-memory stand-in for the Supabase REST API (PostgREST) with configurable latency.
+
+Implements the subset of PostgREST that repository.py uses - filtered
+select/insert/update/delete, `or`/`and` groups, multi-column order, limit,
+and the Postgres functions from supaabaseee/functions/migrations - so the
+API can be benchmarked without a Supabase project. Run it on its own with
+`python -m bench.fake_supabase [port]`.
+"""
+import json
+import random
+import sys
+import threading
+import time
+import uuid
+from datetime import datetime, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qsl, urlsplit
+
+# Columns filled in on insert when the row leaves them out, as the table defaults would
+DEFAULTS = {
+    "users": {"email_verified": False, "password_hash": None, "last_login": None},
+    "vm_creation_logs": {"status": "pending", "terraform_output": None, "logs": None, "ip_address": None,
+                         "tags": [], "vm_state": None, "vm_state_at": None,
+                         "linked_clone": False, "disk_saved_bytes": None},
+    "verification_codes": {"used": False},
+    "password_resets": {"used": False},
+}
+COMPOSITE_KEYS = {"vm_log_chunks"}  # tables without an `id` column
+
+
+def _now():
+    return datetime.now(timezone.utc).isoformat()
+
+
+def _split(text):
+    """Split on top-level commas, leaving (...), {...} and "..." intact"""
+    parts, depth, quoted, current = [], 0, False, ""
+    for char in text:
+        if char == '"' and not current.endswith("\\"):
+            quoted = not quoted
+        elif not quoted and char in "({":
+            depth += 1
+        elif not quoted and char in ")}":
+            depth -= 1
+        elif char == "," and depth == 0 and not quoted:
+            parts.append(current)
+            current = ""
+            continue
+        current += char
+    if current:
+        parts.append(current)
+    return parts
+
+
+def _unquote(value):
+    if len(value) >= 2 and value[0] == value[-1] == '"':
+        return value[1:-1].replace('\\"', '"').replace("\\\\", "\\")
+    return value
+
+
+def _comparable(row_value, value):
+    if isinstance(row_value, bool):
+        return str(row_value).lower(), value
+    if isinstance(row_value, (int, float)):
+        try:
+            return row_value, float(value)
+        except ValueError:
+            return str(row_value), value
+    return ("" if row_value is None else str(row_value)), value
+
+
+def _sort_key(value):
+    # NULLs sort last ascending, as in Postgres
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        return (0, value, "")
+    return (value is None, 0, "" if value is None else str(value))
+
+
+def _condition(column, op, value):
+    """Predicate for one `column.op.value` filter"""
+    if op == "in":
+        options = {_unquote(v) for v in _split(value.strip("()"))}
+        return lambda row: row.get(column) is not None and str(row.get(column)) in options
+    if op == "ov":
+        options = {_unquote(v) for v in _split(value.strip("{}"))}
+        return lambda row: bool(options & set(row.get(column) or []))
+    if op == "is":
+        target = {"null": None, "true": True, "false": False}[value]
+        return lambda row: row.get(column) is target
+    value = _unquote(value)
+    compare = {
+        "eq": lambda a, b: a == b, "neq": lambda a, b: a != b,
+        "lt": lambda a, b: a < b, "lte": lambda a, b: a <= b,
+        "gt": lambda a, b: a > b, "gte": lambda a, b: a >= b,
+    }[op]
+
+    def check(row):
+        if row.get(column) is None:
+            return False
+        return compare(*_comparable(row.get(column), value))
+    return check
+
+
+def _group(kind, body):
+    predicates = [_expression(part) for part in _split(body)]
+    if kind == "or":
+        return lambda row: any(p(row) for p in predicates)
+    return lambda row: all(p(row) for p in predicates)
+
+
+def _expression(text):
+    for kind in ("and", "or"):
+        if text.startswith(kind + "("):
+            return _group(kind, text[len(kind) + 1:-1])
+    column, op, value = text.split(".", 2)
+    return _condition(column, op, value)
+
+
+def parse_query(query):
+    """PostgREST query string -> (predicate, select, order, limit)"""
+    predicates, select, order, limit = [], "*", [], None
+    for key, value in parse_qsl(query, keep_blank_values=True):
+        if key == "select":
+            select = value
+        elif key == "order":
+            order = [part.split(".")[:2] for part in value.split(",")]
+        elif key == "limit":
+            limit = int(value)
+        elif key in ("or", "and"):
+            predicates.append(_group(key, value[1:-1]))
+        elif key != "on_conflict":
+            op, operand = value.split(".", 1)
+            predicates.append(_condition(key, op, operand))
+    return (lambda row: all(p(row) for p in predicates)), select, order, limit
+
+
+class FakeSupabase(ThreadingHTTPServer):
+    """Thread-per-request PostgREST stand-in; every call sleeps latency +/- jitter seconds first"""
+
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self, host="127.0.0.1", port=0, latency=0.005, jitter=0.002):
+        super().__init__((host, port), _Handler)
+        self.latency = latency
+        self.jitter = jitter
+        self.tables = {}
+        self.calls = {}  # "METHOD table" -> count
+        self.lock = threading.Lock()
+        self._thread = None
+
+    @property
+    def url(self):
+        return f"http://{self.server_address[0]}:{self.server_address[1]}"
+
+    def start(self):
+        self._thread = threading.Thread(target=self.serve_forever, name="fake-supabase", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
+
+    def insert(self, table, rows):
+        with self.lock:
+            return self._insert(table, rows)
+
+    def _insert(self, table, rows):
+        stored = []
+        for row in rows:
+            row = {**DEFAULTS.get(table, {}), **row}
+            if table not in COMPOSITE_KEYS:
+                row.setdefault("id", str(uuid.uuid4()))
+            row.setdefault("created_at", _now())
+            self.tables.setdefault(table, []).append(row)
+            stored.append(dict(row))
+        return stored
+
+    def select(self, table, query):
+        predicate, select, order, limit = parse_query(query)
+        with self.lock:
+            rows = [dict(row) for row in self.tables.get(table, []) if predicate(row)]
+        for column, direction in reversed(order):
+            rows.sort(key=lambda row: _sort_key(row.get(column)), reverse=direction == "desc")
+        if limit is not None:
+            rows = rows[:limit]
+        if select != "*":
+            columns = select.split(",")
+            rows = [{column: row.get(column) for column in columns} for row in rows]
+        return rows
+
+    def update(self, table, query, values):
+        predicate = parse_query(query)[0]
+        with self.lock:
+            updated = []
+            for row in self.tables.get(table, []):
+                if predicate(row):
+                    row.update(values)
+                    updated.append(dict(row))
+            return updated
+
+    def delete(self, table, query):
+        predicate = parse_query(query)[0]
+        with self.lock:
+            rows = self.tables.get(table, [])
+            self.tables[table] = [row for row in rows if not predicate(row)]
+            return [dict(row) for row in rows if predicate(row)]
+
+    # ---Postgres functions----
+
+    def rpc(self, name, params):
+        with self.lock:
+            return getattr(self, f"_rpc_{name}")(**params)
+
+    def _rpc_get_or_create_user(self, p_email, p_password_hash=None):
+        for user in self.tables.get("users", []):
+            if user["email"] == p_email:
+                user["id"] = user.get("id") or str(uuid.uuid4())
+                return [dict(user)]
+        return self._insert("users", [{"email": p_email, "password_hash": p_password_hash}])
+
+    def _rpc_verify_email_code(self, p_email, p_code):
+        all_codes = [c for c in self.tables.get("verification_codes", []) if c["email"] == p_email]
+        codes = [c for c in all_codes if not c["used"]]
+        if not codes:
+            return {"status": "used" if all_codes else "missing"}
+        code = max(codes, key=lambda c: c["created_at"])
+        if datetime.fromisoformat(code["expires_at"]) < datetime.now(timezone.utc):
+            return {"status": "expired"}
+        if code["code"] != p_code:
+            return {"status": "invalid"}
+        for c in codes:
+            c["used"] = True
+        user = self._rpc_get_or_create_user(p_email)[0]
+        for row in self.tables["users"]:
+            if row["email"] == p_email:
+                row["email_verified"] = True
+                user = dict(row)
+        return {"status": "verified", "user": user}
+
+    def _rpc_replace_vm_log_chunks(self, p_log_id, p_stream, p_chunks):
+        chunks = self.tables.get("vm_log_chunks", [])
+        self.tables["vm_log_chunks"] = [c for c in chunks if (c["log_id"], c["stream"]) != (p_log_id, p_stream)]
+        self._insert("vm_log_chunks", [{"log_id": p_log_id, "stream": p_stream, **chunk} for chunk in p_chunks])
+        return None
+
+    def _rpc_append_vm_log_chunks(self, p_log_id, p_stream, p_from_seq, p_chunks):
+        chunks = self.tables.get("vm_log_chunks", [])
+        self.tables["vm_log_chunks"] = [c for c in chunks if (c["log_id"], c["stream"]) != (p_log_id, p_stream)
+                                        or c["seq"] < p_from_seq]
+        self._insert("vm_log_chunks", [{"log_id": p_log_id, "stream": p_stream, **chunk} for chunk in p_chunks])
+        return None
+
+    def _rpc_reap_auth_rows(self, p_table, p_batch):
+        now = datetime.now(timezone.utc)
+        rows = self.tables.get(p_table, [])
+        dead = [r for r in rows if r["used"] or datetime.fromisoformat(r["expires_at"]) < now][:p_batch]
+        self.tables[p_table] = [r for r in rows if not any(r is d for d in dead)]
+        return len(dead)
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"  # keep-alive, like the real API gateway
+    disable_nagle_algorithm = True  # headers and body go out in separate writes
+
+    def log_message(self, format, *args):
+        pass
+
+    def _handle(self):
+        server = self.server
+        url = urlsplit(self.path)
+        if not url.path.startswith("/rest/v1/"):
+            return self._send(404, {"message": f"Unknown path {url.path}"})
+        table = url.path[len("/rest/v1/"):]
+        length = int(self.headers.get("Content-Length") or 0)
+        body = json.loads(self.rfile.read(length)) if length else None
+
+        with server.lock:
+            key = f"{self.command} {table}"
+            server.calls[key] = server.calls.get(key, 0) + 1
+        if server.latency or server.jitter:
+            time.sleep(max(0.0, server.latency + random.uniform(-server.jitter, server.jitter)))
+
+        try:
+            if table.startswith("rpc/"):
+                return self._send(200, server.rpc(table[4:], body or {}))
+            if self.command == "GET":
+                return self._send(200, server.select(table, url.query))
+            if self.command == "POST":
+                rows = server.insert(table, body if isinstance(body, list) else [body])
+                return self._send(201, rows)
+            if self.command == "PATCH":
+                return self._send(200, server.update(table, url.query, body))
+            if self.command == "DELETE":
+                rows = server.delete(table, url.query)
+                return self._send(200, rows)
+        except Exception as e:
+            return self._send(400, {"message": f"{type(e).__name__}: {e}"})
+        self._send(405, {"message": f"Unsupported method {self.command}"})
+
+    def _send(self, status, payload):
+        if "return=minimal" in self.headers.get("Prefer", ""):
+            payload = None
+        data = b"" if payload is None else json.dumps(payload).encode("utf-8")
+        self.send_response(status if data else (204 if status < 300 else status))
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    do_GET = do_POST = do_PATCH = do_DELETE = _handle
+
+
+if __name__ == "__main__":
+    port = int(sys.argv[1]) if len(sys.argv) > 1 else 54321
+    server = FakeSupabase(port=port)
+    print(f"Fake Supabase listening on {server.url} (SUPABASE_URL={server.url})")
+    server.serve_forever()
@@ -0,0 +1,313 @@
+"""Load driver: runs the API against local stand-ins and reports latency and throughput per flow.
+
+Starts the fake Supabase in-process and the API under uvicorn, with the stub
+terraform/vagrant from bench/bin first on PATH. It then drives each flow
+with a closed loop of N concurrent clients for a fixed time, at every
+concurrency level:
+
+    python -m bench.load --flows auth,vm-logs,create-vm --concurrency 1,4,16 --duration 10
+    python -m bench.load --save before.json
+    python -m bench.load --baseline before.json    # after a change: prints the deltas
+
+Run from Backend/. The API's own output goes to api.log in the scratch directory.
+"""
+import argparse
+import asyncio
+import json
+import os
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta, timezone
+
+import httpx
+
+from bench.fake_supabase import FakeSupabase
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+BIN_DIR = os.path.join(BACKEND_DIR, "bench", "bin")
+BENCH_EMAIL = "bench@example.com"
+BENCH_PASSWORD = "bench-password"
+FLOWS = ("auth", "vm-logs", "create-vm")
+
+
+def percentile(values, pct):
+    """Nearest-rank percentile of an unsorted list"""
+    if not values:
+        return None
+    ordered = sorted(values)
+    rank = max(1, -(-len(ordered) * pct // 100))
+    return ordered[int(rank) - 1]
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def seed(supabase, logs, rounds):
+    """One verified user with `logs` VM logs, written straight into the fake's tables"""
+    from passwords import hash_password
+
+    supabase.insert("users", [{"email": BENCH_EMAIL, "password_hash": hash_password(BENCH_PASSWORD, rounds),
+                               "email_verified": True}])
+    start = datetime.now(timezone.utc) - timedelta(days=1)
+    supabase.insert("vm_creation_logs", [{
+        "user_email": BENCH_EMAIL,
+        "box_name": "ubuntu/bionic64",
+        "vm_name": f"seed-{i}",
+        "cpus": 2,
+        "memory": 2048,
+        "status": "success",
+        "ip_address": f"10.0.{i // 250}.{i % 250 + 2}",
+        "created_at": (start + timedelta(seconds=i)).isoformat(),
+    } for i in range(logs)])
+
+
+def start_api(port, supabase_url, scratch, args):
+    env = os.environ.copy()
+    env.update({
+        "SUPABASE_URL": supabase_url,
+        "SUPABASE_SERVICE_ROLE_KEY": "bench",
+        "PATH": BIN_DIR + os.pathsep + env.get("PATH", ""),
+        "VM_WORKSPACE_ROOT": os.path.join(scratch, "vms"),
+        "VM_IP_CIDR": "10.10.0.0/16",  # room for every VM a long run creates
+        "HOST_CPUS": os.getenv("HOST_CPUS", "100000"),  # the stub VMs never release capacity during a run
+        "HOST_MEMORY_MB": os.getenv("HOST_MEMORY_MB", "100000000"),
+        "BENCH_VAGRANT_HOME": os.path.join(scratch, "vagrant-home"),
+        "BENCH_TIME_SCALE": str(args.time_scale),
+        "BCRYPT_ROUNDS": str(args.bcrypt_rounds),  # otherwise the first login rehashes the seeded user
+        "GOLDEN_IMAGE_CACHE_SIZE": "0",
+        "WARM_POOL_SIZE": "0",
+        "SMTP_HOST": "",
+    })
+    env.pop("METRICS_TOKEN", None)
+    log = open(os.path.join(scratch, "api.log"), "w")
+    process = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "main:app", "--host", "127.0.0.1", "--port", str(port),
+         "--log-level", "warning", "--no-access-log"],
+        cwd=BACKEND_DIR, env=env, stdout=log, stderr=subprocess.STDOUT,
+    )
+    deadline = time.time() + 30
+    while time.time() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f"API exited with {process.returncode}, see {log.name}")
+        try:
+            if httpx.get(f"http://127.0.0.1:{port}/metrics", timeout=1).status_code == 200:
+                return process
+        except httpx.HTTPError:
+            time.sleep(0.2)
+    process.terminate()
+    raise RuntimeError(f"API did not come up within 30s, see {log.name}")
+
+
+async def login(client):
+    response = await client.post("/auth/login", json={"email": BENCH_EMAIL, "password": BENCH_PASSWORD})
+    response.raise_for_status()
+    return response.json()["access_token"]
+
+
+class Flow:
+    """One request per iteration; subclasses may also track work that outlives the request"""
+
+    def __init__(self, client, token):
+        self.client = client
+        self.headers = {"Authorization": f"Bearer {token}"}
+
+    async def request(self, n):
+        raise NotImplementedError
+
+    async def settle(self, timeout):
+        return {}
+
+
+class AuthFlow(Flow):
+    async def request(self, n):
+        return await self.client.post("/auth/login", json={"email": BENCH_EMAIL, "password": BENCH_PASSWORD})
+
+
+class VMLogsFlow(Flow):
+    async def request(self, n):
+        return await self.client.get("/vm-logs", params={"limit": 50}, headers=self.headers)
+
+
+class CreateVMFlow(Flow):
+    """POST /create-vm; the 202 is the request, the queued job is timed separately until it finishes"""
+
+    def __init__(self, client, token):
+        super().__init__(client, token)
+        self.run_id = os.urandom(3).hex()
+        self.watchers = []
+        self.job_seconds = []
+        self.job_failures = 0
+
+    async def request(self, n):
+        started = time.perf_counter()
+        response = await self.client.post("/create-vm", headers=self.headers, json={
+            "box_name": "ubuntu/bionic64", "vm_name": f"bench-{self.run_id}-{n}", "cpus": 1, "memory": 512,
+        })
+        if response.status_code == 202:
+            self.watchers.append(asyncio.ensure_future(self.watch(response.json()["job_id"], started)))
+        return response
+
+    async def watch(self, job_id, started):
+        while True:
+            await asyncio.sleep(0.1)
+            response = await self.client.get(f"/jobs/{job_id}", headers=self.headers)
+            job = response.json()
+            if job["status"] in ("succeeded", "failed"):
+                self.job_seconds.append(time.perf_counter() - started)
+                self.job_failures += job["status"] == "failed"
+                return
+
+    async def settle(self, timeout):
+        if self.watchers:
+            await asyncio.wait(self.watchers, timeout=timeout)
+        for watcher in self.watchers:
+            watcher.cancel()
+        return {
+            "jobs": len(self.job_seconds),
+            "job_failures": self.job_failures,
+            "job_p50_s": percentile(self.job_seconds, 50),
+            "job_p99_s": percentile(self.job_seconds, 99),
+        }
+
+
+FLOW_CLASSES = {"auth": AuthFlow, "vm-logs": VMLogsFlow, "create-vm": CreateVMFlow}
+
+
+async def run_level(base_url, token, flow_name, concurrency, duration, settle_timeout):
+    limits = httpx.Limits(max_connections=concurrency + 8, max_keepalive_connections=concurrency + 8)
+    async with httpx.AsyncClient(base_url=base_url, limits=limits, timeout=60) as client:
+        flow = FLOW_CLASSES[flow_name](client, token)
+        latencies, statuses = [], {}
+        counter = iter(range(10 ** 9))
+        deadline = time.perf_counter() + duration
+
+        async def worker():
+            while time.perf_counter() < deadline:
+                started = time.perf_counter()
+                try:
+                    code = (await flow.request(next(counter))).status_code
+                except httpx.HTTPError as e:
+                    code = type(e).__name__
+                latencies.append(time.perf_counter() - started)
+                statuses[str(code)] = statuses.get(str(code), 0) + 1
+
+        started = time.perf_counter()
+        await asyncio.gather(*(worker() for _ in range(concurrency)))
+        elapsed = time.perf_counter() - started
+        extra = await flow.settle(settle_timeout)
+
+    ok = sum(count for code, count in statuses.items() if code.isdigit() and int(code) < 400)
+    return {
+        "flow": flow_name,
+        "concurrency": concurrency,
+        "requests": len(latencies),
+        "errors": len(latencies) - ok,
+        "statuses": statuses,
+        "rps": round(len(latencies) / elapsed, 1),
+        "p50_ms": round(percentile(latencies, 50) * 1000, 1) if latencies else None,
+        "p99_ms": round(percentile(latencies, 99) * 1000, 1) if latencies else None,
+        **extra,
+    }
+
+
+def report(results, baseline=None):
+    previous = {(r["flow"], r["concurrency"]): r for r in (baseline or {}).get("results", [])}
+    print(f"\n{'flow':<10} {'conc':>5} {'reqs':>7} {'errors':>7} {'rps':>8} {'p50 ms':>9} {'p99 ms':>9}  extra")
+    for r in results:
+        extra = ""
+        if "jobs" in r:
+            extra = f"jobs={r['jobs']} failed={r['job_failures']} job p50={_fmt(r['job_p50_s'])}s p99={_fmt(r['job_p99_s'])}s"
+        print(f"{r['flow']:<10} {r['concurrency']:>5} {r['requests']:>7} {r['errors']:>7} {r['rps']:>8} "
+              f"{_fmt(r['p50_ms']):>9} {_fmt(r['p99_ms']):>9}  {extra}")
+        before = previous.get((r["flow"], r["concurrency"]))
+        if before:
+            print(f"{'':<10} {'':>5} {'':>7} {'vs base':>7} {_delta(r['rps'], before['rps']):>8} "
+                  f"{_delta(r['p50_ms'], before['p50_ms']):>9} {_delta(r['p99_ms'], before['p99_ms']):>9}")
+
+
+def _fmt(value):
+    return "-" if value is None else f"{value:.2f}" if isinstance(value, float) else str(value)
+
+
+def _delta(now, before):
+    if not now or not before:
+        return "-"
+    return f"{(now - before) / before * 100:+.0f}%"
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--flows", default=",".join(FLOWS), help="comma-separated: " + ", ".join(FLOWS))
+    parser.add_argument("--concurrency", default="1,4,16,32", help="comma-separated client counts")
+    parser.add_argument("--duration", type=float, default=10, help="seconds per flow and concurrency level")
+    parser.add_argument("--db-latency-ms", type=float, default=5, help="added to every fake Supabase call")
+    parser.add_argument("--db-jitter-ms", type=float, default=2)
+    parser.add_argument("--time-scale", type=float, default=0.05,
+                        help="multiplier on simulated terraform/vagrant durations (1 = real-world timings)")
+    parser.add_argument("--bcrypt-rounds", type=int, default=12, help="cost of the seeded password hash")
+    parser.add_argument("--seed-logs", type=int, default=500, help="VM logs seeded for the bench user")
+    parser.add_argument("--settle-timeout", type=float, default=120,
+                        help="seconds to wait for create-vm jobs after each level")
+    parser.add_argument("--save", help="write results as JSON")
+    parser.add_argument("--baseline", help="JSON from an earlier --save to compare against")
+    parser.add_argument("--keep", action="store_true", help="keep the scratch directory")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    flows = [f for f in args.flows.split(",") if f]
+    unknown = [f for f in flows if f not in FLOW_CLASSES]
+    if unknown:
+        sys.exit(f"Unknown flows: {', '.join(unknown)}")
+    levels = [int(c) for c in args.concurrency.split(",")]
+    baseline = None
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+
+    scratch = tempfile.mkdtemp(prefix="vm-bench-")
+    supabase = FakeSupabase(latency=args.db_latency_ms / 1000, jitter=args.db_jitter_ms / 1000).start()
+    seed(supabase, args.seed_logs, args.bcrypt_rounds)
+    port = free_port()
+    api = start_api(port, supabase.url, scratch, args)
+    base_url = f"http://127.0.0.1:{port}"
+    print(f"API on {base_url}, fake Supabase on {supabase.url}, scratch dir {scratch}")
+
+    results = []
+    try:
+        token = asyncio.run(_login(base_url))
+        for flow in flows:
+            for concurrency in levels:
+                result = asyncio.run(run_level(base_url, token, flow, concurrency, args.duration, args.settle_timeout))
+                results.append(result)
+                print(f"{flow} x{concurrency}: {result['rps']} rps, p50 {_fmt(result['p50_ms'])} ms, "
+                      f"p99 {_fmt(result['p99_ms'])} ms, statuses {result['statuses']}")
+    finally:
+        api.terminate()
+        api.wait(10)
+        supabase.stop()
+        if not args.keep:
+            shutil.rmtree(scratch, ignore_errors=True)
+
+    report(results, baseline)
+    if args.save:
+        with open(args.save, "w") as f:
+            json.dump({"args": vars(args), "db_calls": supabase.calls, "results": results}, f, indent=2)
+        print(f"\nSaved results to {args.save}")
+
+
+async def _login(base_url):
+    async with httpx.AsyncClient(base_url=base_url, timeout=60) as client:
+        return await login(client)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,66 @@
+import asyncio
+import os
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+
+from ssh_sessions import SSHCommandTimeout
+
+# ---Fleet Exec Configuration----
+FLEET_CONCURRENCY = int(os.getenv("FLEET_CONCURRENCY", "10"))  # hosts running a fleet command at once
+FLEET_MAX_HOSTS = int(os.getenv("FLEET_MAX_HOSTS", "200"))  # per request
+
+# SSH calls block, so they run here rather than on the shared threadpool the API also needs
+_executor = ThreadPoolExecutor(max_workers=FLEET_CONCURRENCY, thread_name_prefix="fleet")
+
+
+async def fan_out(targets, run_one, concurrency=None):
+    """Run run_one(target) -> (exit_code, output) on every target, at most `concurrency` at once.
+
+    Yields (target, result) in completion order, so callers can report each
+    host as soon as it finishes; the whole run takes roughly as long as the
+    slowest host rather than the sum of all of them.
+    """
+    concurrency = max(1, min(concurrency or FLEET_CONCURRENCY, FLEET_CONCURRENCY))
+    semaphore = asyncio.Semaphore(concurrency)
+    loop = asyncio.get_running_loop()
+
+    async def one(target):
+        async with semaphore:
+            started = time.time()
+            try:
+                exit_code, output = await loop.run_in_executor(_executor, run_one, target)
+                result = {"status": "ok" if exit_code == 0 else "failed", "exit_code": exit_code, "output": output}
+            except SSHCommandTimeout as e:
+                result = {"status": "timeout", "exit_code": None, "error": str(e)}
+            except Exception as e:
+                result = {"status": "error", "exit_code": None, "error": str(e)}
+            result["duration_ms"] = round((time.time() - started) * 1000, 1)
+            return target, result
+
+    tasks = [asyncio.ensure_future(one(target)) for target in targets]
+    try:
+        for finished in asyncio.as_completed(tasks):
+            yield await finished
+    finally:
+        for task in tasks:
+            task.cancel()
+
+
+def summarize(results, started):
+    """Aggregate per-host results into counts by status and exit code"""
+    statuses = Counter(r["status"] for r in results)
+    exit_codes = Counter(str(r["exit_code"]) for r in results if r["exit_code"] is not None)
+    durations = [r["duration_ms"] for r in results]
+    return {
+        "hosts": len(results),
+        "ok": statuses["ok"],
+        "failed": statuses["failed"],
+        "timeout": statuses["timeout"],
+        "error": statuses["error"],
+        "unreachable": statuses["unreachable"],
+        "exit_codes": dict(exit_codes),
+        "slowest_ms": max(durations) if durations else 0,
+        "total_host_ms": round(sum(durations), 1),
+        "wall_ms": round((time.time() - started) * 1000, 1),
+    }
@@ -0,0 +1,164 @@
+import hashlib
+import json
+import os
+import shlex
+import shutil
+import threading
+import time
+import traceback
+from concurrent.futures import ThreadPoolExecutor
+
+from workspaces import VM_WORKSPACE_ROOT
+
+# ---Golden Image Configuration----
+GOLDEN_IMAGE_DIR = os.getenv("GOLDEN_IMAGE_DIR", os.path.join(VM_WORKSPACE_ROOT, ".golden-images"))
+GOLDEN_IMAGE_CACHE_SIZE = int(os.getenv("GOLDEN_IMAGE_CACHE_SIZE", "5"))  # 0 disables baking
+
+
+def image_key(box_name, script):
+    return hashlib.sha256(f"{box_name}\n{script}".encode("utf-8")).hexdigest()
+
+
+class GoldenImageCache:
+    """Packaged local boxes with the provisioning script already applied.
+
+    Images are keyed by a hash of base box + provisioning script and evicted
+    least-recently-used once more than max_images are cached. A miss queues a
+    background bake; the requesting VM is built from the base box meanwhile.
+
+    render_fn(box_name, vm_name, vagrant_dir) writes a provisioning Vagrantfile
+    for the builder VM and run_command runs vagrant in it. reserve_fn(vm_name),
+    when given, must return True before a builder boots, and release_fn(vm_name)
+    is called once it is destroyed.
+    """
+
+    def __init__(self, run_command, render_fn, image_dir=GOLDEN_IMAGE_DIR, max_images=GOLDEN_IMAGE_CACHE_SIZE,
+                 reserve_fn=None, release_fn=None):
+        self.run_command = run_command
+        self.render_fn = render_fn
+        self.reserve_fn = reserve_fn
+        self.release_fn = release_fn
+        self.image_dir = image_dir
+        self.max_images = max_images
+        self.index_path = os.path.join(image_dir, "index.json")
+        self._lock = threading.Lock()
+        self._baking = set()
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="golden-image")
+        self._index = self._load()
+
+    @property
+    def enabled(self):
+        return self.max_images > 0
+
+    def lookup(self, box_name, script):
+        """Name of the golden box for this base box + script, or None"""
+        if not self.enabled:
+            return None
+        key = image_key(box_name, script)
+        with self._lock:
+            entry = self._index.get(key)
+            if entry is None:
+                return None
+            entry["last_used"] = time.time()
+            entry["hits"] = entry.get("hits", 0) + 1
+            self._save()
+            return entry["golden_box"]
+
+    def request_bake(self, box_name, script):
+        """Queue a bake for this base box + script unless cached or already baking"""
+        if not self.enabled:
+            return
+        key = image_key(box_name, script)
+        with self._lock:
+            if key in self._index or key in self._baking:
+                return
+            self._baking.add(key)
+        self._executor.submit(self._bake, key, box_name, script)
+
+    def images(self):
+        with self._lock:
+            return {
+                "max_images": self.max_images,
+                "baking": len(self._baking),
+                "images": [dict(entry, key=key) for key, entry in self._index.items()],
+            }
+
+    def shutdown(self):
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+    def _bake(self, key, box_name, script):
+        builder = f"golden-{key[:12]}"
+        if self.reserve_fn and not self.reserve_fn(builder):
+            # No room for the builder VM right now; the next miss for this box queues the bake again
+            print(f"Not baking a golden image of {box_name}: no free host capacity")
+            with self._lock:
+                self._baking.discard(key)
+            return
+        golden_box = f"golden/{key[:12]}"
+        build_dir = os.path.join(self.image_dir, f"build-{key[:12]}")
+        box_path = os.path.join(self.image_dir, f"{key[:12]}.box")
+        try:
+            print(f"Baking golden image {golden_box} from {box_name}")
+            self.render_fn(box_name, builder, build_dir)
+            self.run_command("vagrant up", cwd=build_dir)
+            self.run_command(f'vagrant package --output "{box_path}"', cwd=build_dir)
+            self.run_command(f'vagrant box add --force --name {shlex.quote(golden_box)} "{box_path}"', cwd=build_dir)
+            with self._lock:
+                self._index[key] = {
+                    "box_name": box_name,
+                    "golden_box": golden_box,
+                    "path": box_path,
+                    "size_bytes": os.path.getsize(box_path),
+                    "created_at": time.time(),
+                    "last_used": time.time(),
+                    "hits": 0,
+                }
+                evicted = self._evict()
+                self._save()
+            for entry in evicted:
+                self._remove_image(entry)
+            print(f"Golden image {golden_box} ready")
+        except Exception:
+            traceback.print_exc()
+        finally:
+            try:
+                self.run_command("vagrant destroy -f", cwd=build_dir)
+            except Exception as e:
+                print(f"Could not destroy golden image builder in {build_dir}: {e}")
+            shutil.rmtree(build_dir, ignore_errors=True)
+            if self.release_fn:
+                self.release_fn(builder)
+            with self._lock:
+                self._baking.discard(key)
+
+    def _evict(self):
+        # Drop least recently used images until we are within max_images
+        evicted = []
+        while len(self._index) > self.max_images:
+            key = min(self._index, key=lambda k: self._index[k]["last_used"])
+            evicted.append(self._index.pop(key))
+        return evicted
+
+    def _remove_image(self, entry):
+        print(f"Evicting golden image {entry['golden_box']}")
+        try:
+            self.run_command(f"vagrant box remove --force {shlex.quote(entry['golden_box'])}")
+        except Exception as e:
+            print(f"Could not remove box {entry['golden_box']}: {e}")
+        try:
+            os.remove(entry["path"])
+        except FileNotFoundError:
+            pass
+
+    def _load(self):
+        if not os.path.exists(self.index_path):
+            return {}
+        with open(self.index_path) as f:
+            return json.load(f)
+
+    def _save(self):
+        os.makedirs(self.image_dir, exist_ok=True)
+        tmp_path = self.index_path + ".tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(self._index, f, indent=2)
+        os.replace(tmp_path, self.index_path)
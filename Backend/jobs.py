@@ -0,0 +1,217 @@
+import os
+import threading
+import time
+import traceback
+import uuid
+from collections import OrderedDict, deque
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from datetime import datetime, timezone
+
+from metrics import JOB_PHASE_SECONDS
+
+# ---Job Queue Configuration----
+JOB_WORKERS = int(os.getenv("JOB_WORKERS", "4"))
+JOB_QUEUE_LIMIT = int(os.getenv("JOB_QUEUE_LIMIT", "50"))
+JOB_HISTORY_LIMIT = int(os.getenv("JOB_HISTORY_LIMIT", "500"))
+# Output lines are persisted in batches of JOB_LOG_FLUSH_LINES or every JOB_LOG_FLUSH_SECONDS
+JOB_LOG_FLUSH_LINES = int(os.getenv("JOB_LOG_FLUSH_LINES", "50"))
+JOB_LOG_FLUSH_SECONDS = float(os.getenv("JOB_LOG_FLUSH_SECONDS", "2"))
+JOB_LOG_LIMIT = int(os.getenv("JOB_LOG_LIMIT", "1000"))  # most recent entries kept per job
+
+TERMINAL_STATES = ("succeeded", "failed")
+
+
+class QueueFullError(Exception):
+    pass
+
+
+def _now():
+    return datetime.now(timezone.utc).isoformat()
+
+
+class Job:
+    """A single provisioning job and the phases it has gone through"""
+
+    def __init__(self, kind, user_email, vm_log_id=None, payload=None):
+        self.id = str(uuid.uuid4())
+        self.kind = kind
+        self.user_email = user_email
+        self.vm_log_id = vm_log_id
+        self.payload = payload or {}
+        self.status = "queued"
+        self.current_phase = None
+        self.phases = deque(maxlen=JOB_LOG_LIMIT)
+        self.entry_count = 0  # entries ever logged, including those phases has dropped
+        self.result = None
+        self.error = None
+        self.created_at = _now()
+        self.started_at = None
+        self.finished_at = None
+        self._on_update = None
+        self._unflushed = 0
+        self._last_flush = time.monotonic()
+
+    def log(self, level, message, phase=None):
+        self._append(level, message, phase)
+        self._notify()
+
+    def output(self, line):
+        """Record a line of subprocess output, persisting them in batches"""
+        self._append("output", line, None)
+        self._unflushed += 1
+        if (self._unflushed >= JOB_LOG_FLUSH_LINES
+                or time.monotonic() - self._last_flush >= JOB_LOG_FLUSH_SECONDS):
+            self._notify()
+
+    def _append(self, level, message, phase):
+        self.phases.append({
+            "timestamp": _now(),
+            "level": level,
+            "phase": phase or self.current_phase,
+            "message": message,
+        })
+        self.entry_count += 1
+
+    @contextmanager
+    def phase(self, name):
+        """Record the start and end of a pipeline phase"""
+        self.current_phase = name
+        self.log("info", f"{name} started", phase=name)
+        started = time.monotonic()
+        try:
+            yield
+        except Exception as e:
+            JOB_PHASE_SECONDS.observe(time.monotonic() - started, kind=self.kind, phase=name, outcome="error")
+            self.log("error", f"{name} failed: {e}", phase=name)
+            raise
+        JOB_PHASE_SECONDS.observe(time.monotonic() - started, kind=self.kind, phase=name, outcome="ok")
+        self.log("success", f"{name} complete", phase=name)
+
+    def _notify(self):
+        self._unflushed = 0
+        self._last_flush = time.monotonic()
+        if self._on_update is None:
+            return
+        try:
+            self._on_update(self)
+        except Exception as e:
+            print(f"Error recording job {self.id} update: {e}")
+
+    def to_dict(self):
+        return {
+            "id": self.id,
+            "kind": self.kind,
+            "status": self.status,
+            "vm_log_id": self.vm_log_id,
+            "current_phase": self.current_phase,
+            "phases": list(self.phases),
+            "entry_count": self.entry_count,
+            "result": self.result,
+            "error": self.error,
+            "created_at": self.created_at,
+            "started_at": self.started_at,
+            "finished_at": self.finished_at,
+        }
+
+
+class JobQueue:
+    """Bounded worker pool that runs provisioning pipelines off the request path"""
+
+    def __init__(self, max_workers=JOB_WORKERS, max_pending=JOB_QUEUE_LIMIT,
+                 history_limit=JOB_HISTORY_LIMIT, on_update=None):
+        self.max_workers = max_workers
+        self.max_pending = max_pending
+        self.history_limit = history_limit
+        self.on_update = on_update
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="vm-job")
+        self._jobs = OrderedDict()
+        self._lock = threading.Lock()
+        self._waiting = 0
+        self._queued = 0
+        self._running = 0
+
+    def submit(self, kind, user_email, fn, vm_log_id=None, payload=None, gate=None):
+        """Queue fn(job) to run on a worker, raising QueueFullError when saturated.
+
+        With a gate the job stays "waiting" until gate(job, start) calls start();
+        an exception from gate drops the job and propagates.
+        """
+        job = Job(kind, user_email, vm_log_id=vm_log_id, payload=payload)
+        job._on_update = self.on_update
+        with self._lock:
+            if self._queued >= self.max_pending:
+                raise QueueFullError(f"Job queue is full ({self.max_pending} pending)")
+            self._jobs[job.id] = job
+            self._trim_history()
+            if gate is None:
+                self._queued += 1
+            else:
+                job.status = "waiting"
+                self._waiting += 1
+        if gate is None:
+            self._executor.submit(self._run, job, fn)
+            return job
+        try:
+            gate(job, lambda: self._start(job, fn))
+        except Exception:
+            with self._lock:
+                self._waiting -= 1
+                self._jobs.pop(job.id, None)
+            raise
+        return job
+
+    def _start(self, job, fn):
+        with self._lock:
+            self._waiting -= 1
+            self._queued += 1
+        job.status = "queued"
+        self._executor.submit(self._run, job, fn)
+
+    def get(self, job_id):
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def stats(self):
+        with self._lock:
+            return {
+                "workers": self.max_workers,
+                "waiting": self._waiting,
+                "queued": self._queued,
+                "running": self._running,
+                "tracked": len(self._jobs),
+            }
+
+    def shutdown(self, wait=False):
+        self._executor.shutdown(wait=wait, cancel_futures=True)
+
+    def _run(self, job, fn):
+        with self._lock:
+            self._queued -= 1
+            self._running += 1
+        job.status = "running"
+        job.started_at = _now()
+        job._notify()
+        try:
+            job.result = fn(job)
+            job.status = "succeeded"
+        except Exception as e:
+            traceback.print_exc()
+            job.error = str(e)
+            job.status = "failed"
+        finally:
+            job.finished_at = _now()
+            job.current_phase = None
+            with self._lock:
+                self._running -= 1
+            job._notify()
+
+    def _trim_history(self):
+        # Drop the oldest finished jobs once we track more than history_limit
+        if len(self._jobs) <= self.history_limit:
+            return
+        for job_id in list(self._jobs):
+            if len(self._jobs) <= self.history_limit:
+                break
+            if self._jobs[job_id].status in TERMINAL_STATES:
+                del self._jobs[job_id]
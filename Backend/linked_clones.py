@@ -0,0 +1,188 @@
+import json
+import os
+import threading
+import traceback
+
+# ---Linked Clone Configuration----
+LINKED_CLONES = os.getenv("LINKED_CLONES", "false").lower() == "true"  # fast-create for requests that do not choose
+VAGRANT_HOME = os.getenv("VAGRANT_HOME") or os.path.join(os.path.expanduser("~"), ".vagrant.d")
+VBOXMANAGE = os.getenv("VBOXMANAGE", "VBoxManage")
+DISK_EXTENSIONS = (".vmdk", ".vdi")
+
+
+def box_dir(box_name):
+    """VirtualBox directory of the newest installed version of a box, or None"""
+    root = os.path.join(VAGRANT_HOME, "boxes", box_name.replace("/", "-VAGRANTSLASH-"))
+    if not os.path.isdir(root):
+        return None
+    candidates = [os.path.join(root, version, "virtualbox") for version in os.listdir(root)]
+    candidates = [path for path in candidates if os.path.isdir(path)]
+    return max(candidates, key=os.path.getmtime) if candidates else None
+
+
+def _disk_bytes(paths):
+    total = 0
+    for path in paths:
+        try:
+            total += os.path.getsize(path)
+        except OSError:
+            pass
+    return total
+
+
+class LinkedCloneMasters:
+    """Reference counts on the master VM behind each box's linked clones.
+
+    With `vb.linked_clone = true` the first `vagrant up` of a box imports it
+    once as a master VM and snapshots it; later VMs get a differencing disk
+    on that snapshot instead of a full copy of the box disk. Vagrant never
+    deletes masters, so clones are counted here per box and a master is
+    unregistered once its last clone is destroyed. Counts, master ids and
+    per-VM disk savings are persisted to state_file.
+    """
+
+    def __init__(self, run_command, state_file=None):
+        self.run_command = run_command
+        self.state_file = state_file
+        self._lock = threading.Lock()
+        self._box_locks = {}
+        self._clones = {}  # workspace key -> box
+        self._masters = {}  # box -> VirtualBox id of its master VM
+        self._saved = {}  # workspace key -> bytes not copied thanks to the clone
+        self._load()
+
+    def box_lock(self, box):
+        """Serialises clone bookkeeping of a box against the removal of its master"""
+        with self._lock:
+            return self._box_locks.setdefault(box, threading.Lock())
+
+    def acquire(self, key, box):
+        """Count the VM in workspace key as a clone of box's master"""
+        with self.box_lock(box):
+            with self._lock:
+                self._clones[key] = box
+                self._save()
+
+    def is_clone(self, key):
+        with self._lock:
+            return key in self._clones
+
+    def built(self, key, vagrant_dir):
+        """Record the master's id and the disk space the clone saved once its VM is up; returns the bytes saved"""
+        with self._lock:
+            box = self._clones.get(key)
+        if box is None:
+            return None
+        directory = box_dir(box)
+        base_bytes = 0
+        if directory:
+            base_bytes = _disk_bytes(os.path.join(directory, name) for name in os.listdir(directory)
+                                     if name.endswith(DISK_EXTENSIONS))
+            master_id_file = os.path.join(directory, "master_id")
+            if os.path.exists(master_id_file):
+                with open(master_id_file) as f:
+                    master_id = f.read().strip()
+                with self._lock:
+                    self._masters[box] = master_id
+        saved = max(base_bytes - (self.clone_disk_bytes(vagrant_dir) or 0), 0)
+        with self._lock:
+            self._saved[key] = saved
+            self._save()
+        return saved
+
+    def saved_bytes(self, key):
+        with self._lock:
+            return self._saved.get(key)
+
+    def clone_disk_bytes(self, vagrant_dir):
+        """Current size of a VM's own disks (the differencing images of a clone), None when unknown"""
+        id_file = os.path.join(vagrant_dir, ".vagrant", "machines", "default", "virtualbox", "id")
+        if not os.path.exists(id_file):
+            return None
+        with open(id_file) as f:
+            vm_id = f.read().strip()
+        lines = []
+        try:
+            self.run_command(f"{VBOXMANAGE} showvminfo {vm_id} --machinereadable", on_line=lines.append)
+        except Exception as e:
+            print(f"Could not read the disks of VM {vm_id}: {e}")
+            return None
+        # Attached media look like "SATA Controller-0-0"="C:\...\disk.vmdk"
+        paths = [line.split("=", 1)[1].strip().strip('"') for line in lines if "=" in line]
+        return _disk_bytes(path for path in paths if path.lower().endswith(DISK_EXTENSIONS))
+
+    def rekey(self, old_key, new_key):
+        """Move a clone to a renamed workspace"""
+        with self._lock:
+            if old_key in self._clones:
+                self._clones[new_key] = self._clones.pop(old_key)
+                if old_key in self._saved:
+                    self._saved[new_key] = self._saved.pop(old_key)
+                self._save()
+
+    def release(self, key):
+        """Forget a destroyed clone, unregistering its box's master when no clone is left"""
+        with self._lock:
+            box = self._clones.get(key)
+        if box is None:
+            return
+        with self.box_lock(box):
+            with self._lock:
+                self._clones.pop(key, None)
+                self._saved.pop(key, None)
+                remaining = sum(1 for b in self._clones.values() if b == box)
+                master_id = self._masters.pop(box, None) if remaining == 0 else None
+                self._save()
+            if master_id:
+                self._remove_master(box, master_id)
+
+    def stats(self):
+        with self._lock:
+            boxes = {}
+            for key, box in self._clones.items():
+                entry = boxes.setdefault(box, {"clones": 0, "master_id": self._masters.get(box), "saved_bytes": 0})
+                entry["clones"] += 1
+                entry["saved_bytes"] += self._saved.get(key) or 0
+            return {
+                "default": LINKED_CLONES,
+                "boxes": boxes,
+                "clones": len(self._clones),
+                "saved_bytes": sum(v or 0 for v in self._saved.values()),
+            }
+
+    def _remove_master(self, box, master_id):
+        print(f"Removing linked clone master {master_id} of {box}: no clones left")
+        try:
+            self.run_command(f"{VBOXMANAGE} unregistervm {master_id} --delete")
+        except Exception:
+            # Still in use (e.g. by a clone built outside this API); the next release tries again
+            traceback.print_exc()
+            with self._lock:
+                self._masters.setdefault(box, master_id)
+                self._save()
+            return
+        # Without the id file Vagrant imports a fresh master for the next clone
+        directory = box_dir(box)
+        if directory:
+            try:
+                os.remove(os.path.join(directory, "master_id"))
+            except FileNotFoundError:
+                pass
+
+    def _load(self):
+        if not self.state_file or not os.path.exists(self.state_file):
+            return
+        with open(self.state_file) as f:
+            state = json.load(f)
+        self._clones = state.get("clones", {})
+        self._masters = state.get("masters", {})
+        self._saved = state.get("saved", {})
+
+    def _save(self):
+        if not self.state_file:
+            return
+        os.makedirs(os.path.dirname(self.state_file), exist_ok=True)
+        tmp_path = self.state_file + ".tmp"
+        with open(tmp_path, "w") as f:
+            json.dump({"clones": self._clones, "masters": self._masters, "saved": self._saved}, f, indent=2)
+        os.replace(tmp_path, self.state_file)
@@ -0,0 +1,177 @@
+import base64
+import codecs
+import json
+import os
+import threading
+import zlib
+from datetime import datetime, timedelta, timezone
+
+import repository as db
+
+try:
+    import zstandard
+except ImportError:  # optional; gzip is always available
+    zstandard = None
+
+# ---Log Store Configuration----
+LOG_CODEC = os.getenv("LOG_CODEC", "zstd" if zstandard else "gzip")
+LOG_CHUNK_BYTES = int(os.getenv("LOG_CHUNK_BYTES", "65536"))  # compressed bytes per chunk row
+LOG_READ_BATCH = int(os.getenv("LOG_READ_BATCH", "16"))  # chunks fetched per round trip when reading
+LOG_RETENTION_DAYS = float(os.getenv("LOG_RETENTION_DAYS", "30"))  # 0 keeps output forever
+LOG_RETENTION_INTERVAL = float(os.getenv("LOG_RETENTION_INTERVAL", "3600"))  # seconds between prunes
+
+OUTPUT_STREAM = "output"  # terraform/vagrant output text
+LOGS_STREAM = "logs"  # JSON list of job log entries
+
+if LOG_CODEC == "zstd" and zstandard is None:
+    print("LOG_CODEC=zstd but the zstandard package is not installed, falling back to gzip")
+    LOG_CODEC = "gzip"
+
+
+class LogStoreError(Exception):
+    pass
+
+
+def compress(data, codec=LOG_CODEC):
+    if codec == "zstd":
+        return zstandard.ZstdCompressor(level=3).compress(data)
+    if codec == "gzip":
+        compressor = zlib.compressobj(6, zlib.DEFLATED, 31)  # wbits 31 = gzip framing
+        return compressor.compress(data) + compressor.flush()
+    raise LogStoreError(f"Unknown log codec: {codec}")
+
+
+def _stream_compressor(codec):
+    """Compress function for data appended over time; each call's output ends on a flushed block,
+    so everything returned so far decompresses to everything passed in so far"""
+    if codec == "zstd":
+        compressor = zstandard.ZstdCompressor(level=3).compressobj()
+        return lambda data: compressor.compress(data) + compressor.flush(zstandard.COMPRESSOBJ_FLUSH_BLOCK)
+    if codec == "gzip":
+        compressor = zlib.compressobj(6, zlib.DEFLATED, 31)
+        return lambda data: compressor.compress(data) + compressor.flush(zlib.Z_SYNC_FLUSH)
+    raise LogStoreError(f"Unknown log codec: {codec}")
+
+
+def _decompressor(codec):
+    """Incremental decompress function for chunks written with codec"""
+    if codec == "zstd":
+        if zstandard is None:
+            raise LogStoreError("Install zstandard to read zstd-compressed logs")
+        return zstandard.ZstdDecompressor().decompressobj().decompress
+    if codec == "gzip":
+        return zlib.decompressobj(31).decompress
+    raise LogStoreError(f"Unknown log codec: {codec}")
+
+
+async def write(log_id, stream, text):
+    """Replace a log's stream with text, compressed and split into LOG_CHUNK_BYTES chunks"""
+    blob = compress(text.encode("utf-8")) if text else b""
+    await db.replace_log_chunks(log_id, stream, _chunks(blob, 0, LOG_CODEC))
+
+
+def _chunks(blob, first_seq, codec):
+    return [
+        {
+            "seq": first_seq + index,
+            "codec": codec,
+            "data": base64.b64encode(blob[offset:offset + LOG_CHUNK_BYTES]).decode("ascii"),
+        }
+        for index, offset in enumerate(range(0, len(blob), LOG_CHUNK_BYTES))
+    ]
+
+
+class StreamAppender:
+    """Grows a stream flush by flush without rewriting what is already stored.
+
+    The stream is one compressed blob that is never finished: each append
+    adds a flushed block to it, rewrites the last partial chunk and inserts
+    any new ones. A final write() replaces it with a finished blob.
+    """
+
+    def __init__(self, log_id, stream, codec=LOG_CODEC):
+        self.log_id = log_id
+        self.stream = stream
+        self.codec = codec
+        self.lock = threading.Lock()  # callers hold it around append
+        self._compress = _stream_compressor(codec)
+        self._seq = 0  # first chunk not yet full in the database
+        self._tail = b""  # its bytes, plus anything a failed append did not store
+
+    async def append(self, text):
+        if not text:
+            return
+        self._tail += self._compress(text.encode("utf-8"))
+        # The first append also clears whatever an earlier run left in the stream
+        await db.append_log_chunks(self.log_id, self.stream, self._seq, _chunks(self._tail, self._seq, self.codec))
+        full = len(self._tail) // LOG_CHUNK_BYTES
+        self._seq += full
+        self._tail = self._tail[full * LOG_CHUNK_BYTES:]
+
+
+class LogsAppender(StreamAppender):
+    """Appends job log entries to the logs stream as an unclosed JSON list"""
+
+    def __init__(self, log_id, codec=LOG_CODEC):
+        super().__init__(log_id, LOGS_STREAM, codec)
+        self.entries = 0  # entries of the job covered so far, counting any it dropped unwritten
+        self._opened = False
+
+    async def append_entries(self, entries, covered):
+        """Append entries, after which the first covered entries of the job are stored"""
+        self.entries = covered
+        if not entries:
+            return
+        text = ",".join(json.dumps(entry, default=str) for entry in entries)
+        prefix = "," if self._opened else "["
+        self._opened = True
+        await self.append(prefix + text)
+
+
+async def read_stream(log_id, stream):
+    """Yield a stream's text piece by piece, decompressing chunks as they arrive"""
+    decoder = codecs.getincrementaldecoder("utf-8")(errors="replace")
+    decompress = None
+    seq = -1
+    while True:
+        rows = await db.list_log_chunks(log_id, stream, after_seq=seq, limit=LOG_READ_BATCH)
+        for row in rows:
+            if decompress is None:
+                decompress = _decompressor(row["codec"])
+            text = decoder.decode(decompress(base64.b64decode(row["data"])))
+            if text:
+                yield text
+            seq = row["seq"]
+        if len(rows) < LOG_READ_BATCH:
+            break
+    tail = decoder.decode(b"", final=True)
+    if tail:
+        yield tail
+
+
+async def read_text(log_id, stream):
+    """Whole stream as one string, or None when nothing is stored for it"""
+    pieces = [piece async for piece in read_stream(log_id, stream)]
+    return "".join(pieces) if pieces else None
+
+
+async def write_logs(log_id, entries):
+    await write(log_id, LOGS_STREAM, json.dumps(entries, default=str))
+
+
+async def read_logs(log_id):
+    text = await read_text(log_id, LOGS_STREAM)
+    if text is None:
+        return None
+    if text.startswith("[") and not text.endswith("]"):
+        text += "]"  # still being appended to by a running job
+    return json.loads(text)
+
+
+async def prune_expired():
+    """Drop chunks older than the retention window; returns the cutoff used, or None"""
+    if LOG_RETENTION_DAYS <= 0:
+        return None
+    cutoff = (datetime.now(timezone.utc) - timedelta(days=LOG_RETENTION_DAYS)).isoformat()
+    await db.delete_log_chunks_before(cutoff)
+    return cutoff
@@ -0,0 +1,103 @@
+import asyncio
+import os
+import threading
+from collections import OrderedDict, deque
+
+# ---Log Streaming Configuration----
+LOG_STREAM_BUFFER = int(os.getenv("LOG_STREAM_BUFFER", "500"))  # lines replayed to late subscribers
+LOG_STREAM_QUEUE = int(os.getenv("LOG_STREAM_QUEUE", "1000"))  # per-subscriber backlog before lines are dropped
+LOG_STREAM_CHANNELS = int(os.getenv("LOG_STREAM_CHANNELS", "200"))  # finished channels kept for replay
+
+
+class _Channel:
+    def __init__(self):
+        self.history = deque(maxlen=LOG_STREAM_BUFFER)
+        self.subscribers = []  # (loop, asyncio.Queue)
+        self.closed = False
+
+
+class LogBroker:
+    """Fans subprocess output lines from worker threads out to asyncio subscribers"""
+
+    END = None  # sentinel pushed to subscribers when a channel closes
+
+    def __init__(self):
+        self._channels = OrderedDict()
+        self._lock = threading.Lock()
+
+    def known(self, key):
+        with self._lock:
+            return key in self._channels
+
+    def open(self, key):
+        with self._lock:
+            self._channel(key)
+
+    def publish(self, key, line):
+        with self._lock:
+            channel = self._channel(key)
+            channel.history.append(line)
+            subscribers = list(channel.subscribers)
+        for loop, queue in subscribers:
+            loop.call_soon_threadsafe(self._offer, queue, line)
+
+    def close(self, key):
+        with self._lock:
+            channel = self._channels.get(key)
+            if channel is None or channel.closed:
+                return
+            channel.closed = True
+            subscribers = list(channel.subscribers)
+            channel.subscribers.clear()
+        for loop, queue in subscribers:
+            loop.call_soon_threadsafe(self._offer, queue, self.END)
+
+    async def subscribe(self, key):
+        """Yield buffered lines for key, then live ones until the channel closes"""
+        loop = asyncio.get_running_loop()
+        queue = asyncio.Queue(maxsize=LOG_STREAM_QUEUE)
+        with self._lock:
+            channel = self._channel(key)
+            history = list(channel.history)
+            closed = channel.closed
+            if not closed:
+                channel.subscribers.append((loop, queue))
+        try:
+            for line in history:
+                yield line
+            if closed:
+                return
+            while True:
+                line = await queue.get()
+                if line is self.END:
+                    return
+                yield line
+        finally:
+            with self._lock:
+                if (loop, queue) in channel.subscribers:
+                    channel.subscribers.remove((loop, queue))
+
+    def _channel(self, key):
+        channel = self._channels.get(key)
+        if channel is None:
+            channel = self._channels[key] = _Channel()
+            self._trim()
+        return channel
+
+    def _trim(self):
+        # Forget the oldest finished channels once we hold more than LOG_STREAM_CHANNELS
+        for key in list(self._channels):
+            if len(self._channels) <= LOG_STREAM_CHANNELS:
+                break
+            if self._channels[key].closed:
+                del self._channels[key]
+
+    @staticmethod
+    def _offer(queue, line):
+        if line is LogBroker.END:
+            # Always make room for the end marker so subscribers can finish
+            while queue.full():
+                queue.get_nowait()
+        elif queue.full():
+            return
+        queue.put_nowait(line)
@@ -1,21 +1,49 @@
 from fastapi.middleware.cors import CORSMiddleware
-from supabase import create_client
 from fastapi import FastAPI, HTTPException
 from fastapi import Depends, status
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
-from pydantic import BaseModel
+from pydantic import BaseModel, Field
 import jwt
-import bcrypt
 from datetime import datetime, timedelta, timezone
 import os
 import subprocess
 import traceback
 from dotenv import load_dotenv
+load_dotenv()
 from fastapi import APIRouter, HTTPException, Request
 from pydantic import BaseModel
-from supaabaseee.functions.sendmail.send_email import send_email
+from supaabaseee.functions.sendmail.outbox import MailOutbox, OutboxFullError
 import uuid
+import threading
+import time
+import asyncio
+import base64
+import hashlib
+import json
+import shlex
+from collections import deque
+from fastapi.responses import Response, StreamingResponse
+from starlette.concurrency import run_in_threadpool
 from typing import Optional, List
+import repository as db
+import log_store
+import reaper
+from passwords import PasswordHasher, HashingSaturatedError, PASSWORD_RETRY_AFTER
+from tokens import TokenVerifier, RevokedTokenError, REVOCATION_REFRESH_SECONDS
+from jobs import TERMINAL_STATES, Job, JobQueue, QueueFullError
+from workspaces import WorkspaceAllocator, IPPoolExhaustedError
+from log_stream import LogBroker
+from golden_images import GoldenImageCache
+from warm_pool import WarmPool, WARM_POOL_OWNER
+from reconciler import VMReconciler
+from scheduler import HostScheduler, CapacityError, SchedulerFullError
+from linked_clones import LinkedCloneMasters, LINKED_CLONES
+import fleet
+import metrics
+import nodes
+from nodes import NodeRegistry, NoNodeError
+from ssh_sessions import SSHSessionPool, SSHCommandTimeout, SSH_MAX_COMMAND_TIMEOUT
+from terraform_cache import apply_if_changed, ensure_initialized, terraform_env, write_if_changed
 
 
 app = FastAPI()
@@ -26,20 +54,46 @@ class EmailRequest(BaseModel):
     subject: str
     body: str
 
-@router.post("/send-email")
+mail_outbox = MailOutbox()
+
+@app.on_event("startup")
+def start_mail_outbox():
+    mail_outbox.start()
+
+@app.on_event("shutdown")
+def stop_mail_outbox():
+    mail_outbox.stop()
+
+@router.post("/send-email", status_code=status.HTTP_202_ACCEPTED)
 async def handle_send_email(req: EmailRequest):
+    if not mail_outbox.enabled:
+        raise HTTPException(status_code=503, detail="SMTP is not configured")
     try:
-        send_email(req.to, req.subject, req.body)
-        return {"message": "Email sent"}
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))
+        message_id = mail_outbox.enqueue(req.to, req.subject, req.body)
+        return {"message": "Email queued", "id": message_id}
+    except OutboxFullError as e:
+        raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": "5"})
+
+def queue_code_email(email: str, template: str, code: str):
+    """Queue a templated code email when SMTP is configured; codes are also printed for local runs"""
+    if not mail_outbox.enabled:
+        return
+    try:
+        mail_outbox.enqueue_template(email, template, f"Your code is {code}", code=code)
+    except OutboxFullError as e:
+        print(f"Could not queue {template} email for {email}: {e}")
     
 
-load_dotenv()
-
 SUPABASE_URL = os.getenv("SUPABASE_URL")
 SUPABASE_SERVICE_ROLE_KEY = os.getenv("SUPABASE_SERVICE_ROLE_KEY")
-supabase = create_client(SUPABASE_URL, SUPABASE_SERVICE_ROLE_KEY)
+
+@app.on_event("startup")
+async def open_db_pool():
+    db.init_client(SUPABASE_URL, SUPABASE_SERVICE_ROLE_KEY)
+
+@app.on_event("shutdown")
+async def close_db_pool():
+    await db.close_client()
 
 app.add_middleware(
     CORSMiddleware,
@@ -52,14 +106,52 @@ app.add_middleware(
 
 app.include_router(router)
 
+# Supabase round trips per endpoint, so a change that adds queries to a route shows up here
+db_round_trips = {}
+
+@app.middleware("http")
+async def instrument_requests(request: Request, call_next):
+    """Count Supabase round trips and time the request, keyed by route template"""
+    counter = db.count_round_trips()
+    started = time.perf_counter()
+    response = await call_next(request)
+    route = request.scope.get("route")
+    metrics.HTTP_REQUEST_SECONDS.observe(
+        time.perf_counter() - started,
+        method=request.method, route=route.path if route else "unmatched", status=response.status_code
+    )
+    key = f"{request.method} {route.path if route else request.url.path}"
+    stats = db_round_trips.setdefault(key, {"requests": 0, "round_trips": 0, "max": 0, "last": 0})
+    stats["requests"] += 1
+    stats["round_trips"] += counter[0]
+    stats["max"] = max(stats["max"], counter[0])
+    stats["last"] = counter[0]
+    response.headers["X-DB-Round-Trips"] = str(counter[0])
+    return response
+
 # ---JWT Configuration----
 JWT_SECRET = os.getenv(
     "JWT_SECRET", "your-super-secure-jwt-secret-key-change-in-production")
 JWT_ALGORITHM = "HS256"
 JWT_EXPIRES_HOURS = 24*7  # 7 days
 
+# ---Command Output---
+COMMAND_OUTPUT_TAIL = int(os.getenv("COMMAND_OUTPUT_TAIL", "200"))  # lines of output kept per command
+
+# ---VM Log Listing---
+VM_LOGS_PAGE_SIZE = int(os.getenv("VM_LOGS_PAGE_SIZE", "50"))
+VM_LOGS_MAX_PAGE_SIZE = int(os.getenv("VM_LOGS_MAX_PAGE_SIZE", "200"))
+VM_LOG_FIELDS = ["id", "user_email", "box_name", "vm_name", "cpus", "memory", "status", "ip_address", "tags", "vm_state",
+                 "linked_clone", "disk_saved_bytes", "created_at"]
+VM_LOG_HEAVY_FIELDS = ["terraform_output", "logs"]  # only returned when asked for via fields=
+
+# ---Batch Creation---
+BATCH_MAX_VMS = int(os.getenv("BATCH_MAX_VMS", "20"))  # per /create-vms request
+BATCH_PARALLELISM = int(os.getenv("BATCH_PARALLELISM", "4"))  # VMs booted at once (terraform -parallelism)
+
 # ---Security---
 security = HTTPBearer()
+token_verifier = TokenVerifier(JWT_SECRET, JWT_ALGORITHM)
 
 #  Input Models
 
@@ -87,8 +179,10 @@ class VMLogCreate(BaseModel):
     vm_name:str
     cpus:int
     memory:int
+    tags: List[str] = []
 class VMLogUpdate(BaseModel):
     status: Optional[str] = None
+    tags: Optional[List[str]] = None
     logs: Optional[List[dict]] = None
     terraform_output: Optional[str] =None
 class VMLogResponse(BaseModel):
@@ -101,39 +195,71 @@ class VMLogResponse(BaseModel):
     status: str
     terraform_output: Optional[str]
     created_at: str
+# vm_name becomes the guest hostname and, like box_name, lands in the Vagrantfile and in shell commands
+VM_NAME_PATTERN = r"^[A-Za-z0-9]([A-Za-z0-9-]{0,61}[A-Za-z0-9])?$"
+BOX_NAME_PATTERN = r"^[A-Za-z0-9][A-Za-z0-9_.-]*(/[A-Za-z0-9][A-Za-z0-9_.-]*)?$"
 class VMRequest(BaseModel):
-    box_name: str
-    vm_name: str
+    box_name: str = Field(pattern=BOX_NAME_PATTERN)
+    vm_name: str = Field(pattern=VM_NAME_PATTERN)
     cpus: int
     memory: int
+    tags: List[str] = []  # labels for selecting VMs in fleet commands
+    linked_clone: Optional[bool] = None  # boot from the box's master snapshot, LINKED_CLONES when omitted
+class VMBatchRequest(BaseModel):
+    vms: List[VMRequest]
+    parallelism: Optional[int] = None  # VMs booted at once, capped at BATCH_PARALLELISM
 class VMDestroyRequest(BaseModel):
     vm_name: str
 
+class VMExecRequest(BaseModel):
+    command: str
+    timeout: Optional[float] = Field(None, gt=0, le=SSH_MAX_COMMAND_TIMEOUT)  # seconds, SSH_COMMAND_TIMEOUT when omitted
+    stream: bool = False  # stream output as server-sent events
+
+class FleetExecRequest(BaseModel):
+    command: str  # a single command or a multi-line shell script
+    ids: Optional[List[str]] = None  # vm_creation_logs ids
+    tags: Optional[List[str]] = None  # VMs carrying any of these tags
+    timeout: Optional[float] = Field(None, gt=0, le=SSH_MAX_COMMAND_TIMEOUT)  # per host, SSH_COMMAND_TIMEOUT when omitted
+    concurrency: Optional[int] = None  # hosts at a time, capped at FLEET_CONCURRENCY
+    stream: bool = False  # one server-sent event per host as it finishes, then the summary
+
 class SSHRequest(BaseModel):
     vm_ip: str = "192.168.56.10"  # Default for Vagrant private_network
+    vm_name: Optional[str] = None  # Resolves the VM's own workspace and IP when given
+
+class NodeRegistration(BaseModel):
+    node_id: str
+    url: str  # where the controller reaches the agent
+    cpus: int  # vCPUs the host hands out
+    memory_mb: int  # RAM the host hands out
 
 # JWT utility functions
 
 def create_access_token(data: dict):
     to_encode = data.copy()
     expire = datetime.utcnow() + timedelta(hours=JWT_EXPIRES_HOURS)
-    to_encode.update({"exp": expire, "iat": datetime.utcnow()})
+    to_encode.update({"exp": expire, "iat": datetime.utcnow(), "jti": uuid.uuid4().hex})
     encoded_jwt = jwt.encode(to_encode, JWT_SECRET, algorithm=JWT_ALGORITHM)
     return encoded_jwt
 
-def verify_token(credentials: HTTPAuthorizationCredentials = Depends(security)):
+async def verify_token(credentials: HTTPAuthorizationCredentials = Depends(security)):
     try:
-        payload = jwt.decode(credentials.credentials,
-                             JWT_SECRET, algorithms=[JWT_ALGORITHM])
-        user_id: str = payload.get("user_id")
-        email: str = payload.get("email")
-        if user_id is None or email is None:
+        # Cached by token digest until exp, so repeat requests skip jwt.decode
+        claims = token_verifier.verify(credentials.credentials)
+        if claims["user_id"] is None or claims["email"] is None:
             raise HTTPException(
                 status_code=status.HTTP_401_UNAUTHORIZED,
                 detail="Invalid authentication credentials",
                 headers={"WWW-Authenticate": "Bearer"},
             )
-        return {"user_id": user_id, "email": email}
+        return claims
+    except RevokedTokenError:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Token has been revoked",
+            headers={"WWW-Authenticate": "Bearer"},
+        )
     except jwt.ExpiredSignatureError:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
@@ -147,69 +273,131 @@ def verify_token(credentials: HTTPAuthorizationCredentials = Depends(security)):
             headers={"WWW-Authenticate": "Bearer"},
         )
 
-def hash_password(password: str) -> str:
-    return bcrypt.hashpw(password.encode('utf-8'), bcrypt.gensalt()).decode('utf-8')
+async def sync_revocations():
+    """Pull newly revoked tokens (possibly revoked by another worker) into token_verifier"""
+    rows = await db.list_revoked_tokens(since=token_verifier.last_synced)
+    token_verifier.load_revocations(rows)
+
+async def revocation_sync_loop():
+    while True:
+        try:
+            await sync_revocations()
+        except Exception as e:
+            print(f"Error syncing revoked tokens: {e}")
+        await asyncio.sleep(REVOCATION_REFRESH_SECONDS)
+
+@app.on_event("startup")
+async def start_revocation_sync():
+    app.state.revocation_sync = asyncio.create_task(revocation_sync_loop())
+
+@app.on_event("shutdown")
+async def stop_revocation_sync():
+    app.state.revocation_sync.cancel()
+
+async def log_retention_loop():
+    while True:
+        try:
+            cutoff = await log_store.prune_expired()
+            if cutoff:
+                print(f"Pruned stored VM log output older than {cutoff}")
+        except Exception as e:
+            print(f"Error pruning stored VM log output: {e}")
+        await asyncio.sleep(log_store.LOG_RETENTION_INTERVAL)
+
+@app.on_event("startup")
+async def start_log_retention():
+    app.state.log_retention = asyncio.create_task(log_retention_loop())
+
+@app.on_event("shutdown")
+async def stop_log_retention():
+    app.state.log_retention.cancel()
+
+async def auth_reaper_loop():
+    while True:
+        try:
+            deleted = await reaper.reap_expired()
+            if any(deleted.values()):
+                print(f"Reaped expired auth rows: {deleted}")
+        except Exception as e:
+            print(f"Error reaping expired auth rows: {e}")
+        await asyncio.sleep(reaper.REAPER_INTERVAL)
+
+@app.on_event("startup")
+async def start_auth_reaper():
+    app.state.auth_reaper = asyncio.create_task(auth_reaper_loop())
+
+@app.on_event("shutdown")
+async def stop_auth_reaper():
+    app.state.auth_reaper.cancel()
+
+password_hasher = PasswordHasher()
+
+@app.on_event("startup")
+def start_password_hasher():
+    password_hasher.start()
+
+@app.on_event("shutdown")
+def stop_password_hasher():
+    password_hasher.shutdown()
+
+def password_busy(e: HashingSaturatedError) -> HTTPException:
+    return HTTPException(status_code=503, detail=str(e), headers={"Retry-After": str(PASSWORD_RETRY_AFTER)})
+
+async def hash_password(password: str) -> str:
+    try:
+        return await password_hasher.hash(password)
+    except HashingSaturatedError as e:
+        raise password_busy(e)
 
-def verify_password(password: str, hashed: str) -> bool:
-    return bcrypt.checkpw(password.encode('utf-8'), hashed.encode('utf-8'))
+async def verify_password(password: str, hashed: str) -> bool:
+    try:
+        return await password_hasher.verify(password, hashed)
+    except HashingSaturatedError as e:
+        raise password_busy(e)
+
+async def rehash_if_needed(email: str, password: str, hashed: str):
+    """Upgrade a stored hash to the configured bcrypt cost after a successful login"""
+    if not password_hasher.needs_rehash(hashed):
+        return
+    try:
+        await db.update_user(email, {"password_hash": await password_hasher.hash(password)})
+    except Exception as e:
+        # Best effort: the login already succeeded, try again next time
+        print(f"Could not rehash password for {email}: {e}")
 
-def get_or_create_user(email: str, password_hash: str = None) -> dict:
+async def get_or_create_user(email: str, password_hash: str = None) -> dict:
     """Get existing user or create new one, ensuring we have a user_id"""
     try:
-        # Try to get existing user
-        res = supabase.table("users").select("*").eq("email", email).execute()
-        
-        if res.data and len(res.data) > 0:
-            user = res.data[0]
-            # Ensure user has an ID
-            if not user.get('id'):
-                # Update user with UUID if missing
-                user_id = str(uuid.uuid4())
-                supabase.table("users").update({"id": user_id}).eq("email", email).execute()
-                user['id'] = user_id
-            return user
-        else:
-            # Create new user
-            user_id = str(uuid.uuid4())
-            new_user = {
-                "id": user_id,
-                "email": email,
-                "email_verified": False,
-                "created_at": datetime.now(timezone.utc).isoformat()
-            }
-            if password_hash:
-                new_user["password_hash"] = password_hash
-            
-            result = supabase.table("users").insert(new_user).execute()
-            return result.data[0] if result.data else new_user
+        # A single upsert; an existing user's password is left untouched
+        return await db.get_or_create_user(email, password_hash)
     except Exception as e:
         print(f"Error in get_or_create_user: {e}")
         raise
 
 @app.post("/auth/register")
-def register_user(user_data: UserRegister):
+async def register_user(user_data: UserRegister):
     try:
         # Check if user already exists
-        res = supabase.table("users").select("*").eq("email", user_data.email).execute()
-        if res.data and len(res.data) > 0:
+        if await db.get_user_by_email(user_data.email):
             raise HTTPException(status_code=400, detail="User already exists")
         
         # Hash password and create user
-        hashed_password = hash_password(user_data.password)
-        user = get_or_create_user(user_data.email, hashed_password)
+        hashed_password = await hash_password(user_data.password)
+        user = await get_or_create_user(user_data.email, hashed_password)
 
         # Generate verification code
         import random
         verification_code = str(random.randint(100000, 999999))
-        supabase.table("verification_codes").insert({
+        await db.insert_verification_code({
             "email": user_data.email,
             "code": verification_code,
             "expires_at": (datetime.now(timezone.utc) + timedelta(minutes=10)).isoformat(),
             "used": False,
             "created_at": datetime.now(timezone.utc).isoformat()
-        }).execute()
+        })
 
         print(f"Verification code for {user_data.email}: {verification_code}")
+        queue_code_email(user_data.email, "verification", verification_code)
 
         return {
             "message": "User registered, check console for verification code.", 
@@ -223,10 +411,9 @@ def register_user(user_data: UserRegister):
         raise HTTPException(status_code=500, detail=str(e))
 
 @app.post("/auth/login")
-def login_user(user_data: UserLogin):
+async def login_user(user_data: UserLogin):
     try:
-        res = supabase.table("users").select("*").eq("email", user_data.email).execute()
-        user = res.data[0] if res.data else None
+        user = await db.get_user_for_login(user_data.email)
         
         if not user:
             raise HTTPException(status_code=401, detail="Invalid email or password")
@@ -234,13 +421,14 @@ def login_user(user_data: UserLogin):
         if not user.get("email_verified", False):
             raise HTTPException(status_code=401, detail="Email is not verified")
         
-        if not verify_password(user_data.password, user["password_hash"]):
+        if not await verify_password(user_data.password, user["password_hash"]):
             raise HTTPException(status_code=401, detail="Invalid email or password")
+        await rehash_if_needed(user_data.email, user_data.password, user["password_hash"])
 
         # Ensure user has an ID
         if not user.get('id'):
             user_id = str(uuid.uuid4())
-            supabase.table("users").update({"id": user_id}).eq("email", user_data.email).execute()
+            await db.update_user(user_data.email, {"id": user_id})
             user['id'] = user_id
 
         # Create JWT with both user_id and email
@@ -267,7 +455,7 @@ def login_user(user_data: UserLogin):
         raise HTTPException(status_code=500, detail=str(e))
 
 @app.post("/auth/send-verification")
-def send_verification_code(request: dict):
+async def send_verification_code(request: dict):
     try:
         email = request.get("email")
         if not email:
@@ -275,56 +463,42 @@ def send_verification_code(request: dict):
 
         import random
         verification_code = str(random.randint(100000, 999999))
-        supabase.table("verification_codes").insert({
+        await db.insert_verification_code({
             "email": email,
             "code": verification_code,
             "expires_at": (datetime.now(timezone.utc) + timedelta(minutes=10)).isoformat(),
             "used": False,
             "created_at": datetime.now(timezone.utc).isoformat()
-        }).execute()
+        })
 
         print(f"Verification code for {email}: {verification_code}")
+        queue_code_email(email, "verification", verification_code)
 
         return {
             "message": "Verification code is sent. Check console.",
             "demo_code": verification_code
         }
 
+    except HTTPException:
+        raise
     except Exception as e:
         traceback.print_exc()
         raise HTTPException(status_code=500, detail=str(e))
 
 @app.post("/auth/verify-code")
-def verify_code_and_login(request: VerificationRequest):
+async def verify_code_and_login(request: VerificationRequest):
     try:
-        # Get verification code
-        res = supabase.table("verification_codes").select("*").eq("email", request.email).order("created_at", desc=True).limit(1).execute()
-        code_record = res.data[0] if res.data else None
-        
-        if not code_record:
-            raise HTTPException(status_code=400, detail="No verification code found")
-
-        if code_record["used"]:
-            raise HTTPException(status_code=400, detail="Verification code already used")
-            
-        expires_at = datetime.fromisoformat(code_record["expires_at"])
-        now_utc = datetime.now(timezone.utc)
-        
-        if now_utc > expires_at:
-            raise HTTPException(status_code=400, detail="Verification code expired")
-
-        if code_record["code"] != request.code:
-            raise HTTPException(status_code=400, detail="Invalid verification code")
-
-        # Mark code as used
-        supabase.table("verification_codes").update({"used": True}).eq("id", code_record["id"]).execute()
-
-        # Get or create user and ensure they have an ID
-        user = get_or_create_user(request.email)
-        
-        # Update user as verified
-        supabase.table("users").update({"email_verified": True}).eq("email", request.email).execute()
-        user["email_verified"] = True
+        # Check the code, mark it used and verify the user in one transaction
+        result = await db.verify_email_code(request.email, request.code)
+        errors = {
+            "missing": "No verification code found",
+            "used": "Verification code already used",
+            "expired": "Verification code expired",
+            "invalid": "Invalid verification code",
+        }
+        if result["status"] in errors:
+            raise HTTPException(status_code=400, detail=errors[result["status"]])
+        user = result["user"]
 
         # Create JWT with both user_id and email
         access_token = create_access_token({
@@ -351,23 +525,23 @@ def verify_code_and_login(request: VerificationRequest):
         raise HTTPException(status_code=500, detail=str(e))
 
 @app.post("/auth/forgot-password")
-def forgot_password(request: PasswordResetRequest):
+async def forgot_password(request: PasswordResetRequest):
     try:
-        res = supabase.table("users").select("*").eq("email", request.email).execute()
-        if not res.data:
+        if not await db.get_user_by_email(request.email):
             raise HTTPException(status_code=404, detail="User not found")
 
         import random
         reset_token = str(random.randint(100000, 999999))
-        supabase.table("password_resets").insert({
+        await db.insert_password_reset({
             "email": request.email,
             "token": reset_token,
             "expires_at": (datetime.now(timezone.utc) + timedelta(minutes=15)).isoformat(),
             "used": False,
             "created_at": datetime.now(timezone.utc).isoformat()
-        }).execute()
+        })
 
         print(f"Password reset code for {request.email}: {reset_token}")
+        queue_code_email(request.email, "password_reset", reset_token)
 
         return {
             "message": "Password reset code sent. Check console.",
@@ -381,17 +555,16 @@ def forgot_password(request: PasswordResetRequest):
         raise HTTPException(status_code=500, detail=str(e))
 
 @app.post("/auth/reset-password")
-def reset_password(request: PasswordResetConfirm):
+async def reset_password(request: PasswordResetConfirm):
     try:
-        res = supabase.table("password_resets").select("*").eq("email", request.email).order("created_at", desc=True).limit(1).execute()
-        reset_record = res.data[0] if res.data else None
+        reset_record = await db.latest_password_reset(request.email)
         
+        # Only unused resets are looked up; tell a reused token apart from no request at all
         if not reset_record:
+            if await db.has_used_password_reset(request.email):
+                raise HTTPException(status_code=400, detail="Reset token already used")
             raise HTTPException(status_code=400, detail="No reset request found")
 
-        if reset_record["used"]:
-            raise HTTPException(status_code=400, detail="Reset token already used")
-
         expires_at = datetime.fromisoformat(reset_record["expires_at"])
         now_utc = datetime.now(timezone.utc)
         
@@ -401,13 +574,12 @@ def reset_password(request: PasswordResetConfirm):
         if reset_record["token"] != request.token:
             raise HTTPException(status_code=400, detail="Invalid reset token")
 
-        res_user = supabase.table("users").select("*").eq("email", request.email).execute()
-        if not res_user.data:
+        if not await db.get_user_by_email(request.email):
             raise HTTPException(status_code=404, detail="User not found")
 
-        hashed_new_password = hash_password(request.new_password)
-        supabase.table("users").update({"password_hash": hashed_new_password}).eq("email", request.email).execute()
-        supabase.table("password_resets").update({"used": True}).eq("id", reset_record["id"]).execute()
+        hashed_new_password = await hash_password(request.new_password)
+        await db.update_user(request.email, {"password_hash": hashed_new_password})
+        await db.mark_password_resets_used(request.email)
 
         return {"message": "Password reset successfully"}
 
@@ -417,11 +589,27 @@ def reset_password(request: PasswordResetConfirm):
         traceback.print_exc()
         raise HTTPException(status_code=500, detail=str(e))
 
+@app.post("/auth/logout")
+async def logout_user(current_user: dict = Depends(verify_token)):
+    """Revoke the presented token for the rest of its lifetime"""
+    try:
+        expires_at = datetime.fromtimestamp(current_user["exp"], timezone.utc)
+        await db.insert_revoked_token({
+            "jti": current_user["jti"],
+            "user_email": current_user["email"],
+            "expires_at": expires_at.isoformat(),
+            "revoked_at": datetime.now(timezone.utc).isoformat()
+        })
+        token_verifier.revoke(current_user["jti"], current_user["exp"])
+        return {"message": "Logged out"}
+    except Exception as e:
+        traceback.print_exc()
+        raise HTTPException(status_code=500, detail=str(e))
+
 @app.get("/auth/me")
-def get_current_user(current_user: dict = Depends(verify_token)):
+async def get_current_user(current_user: dict = Depends(verify_token)):
     try:
-        res = supabase.table("users").select("*").eq("email", current_user["email"]).execute()
-        user = res.data[0] if res.data else None
+        user = await db.get_user_by_email(current_user["email"])
         
         if not user:
             raise HTTPException(status_code=404, detail="User not found")
@@ -429,7 +617,7 @@ def get_current_user(current_user: dict = Depends(verify_token)):
         # Ensure user has an ID
         if not user.get('id'):
             user_id = str(uuid.uuid4())
-            supabase.table("users").update({"id": user_id}).eq("email", current_user["email"]).execute()
+            await db.update_user(current_user["email"], {"id": user_id})
             user['id'] = user_id
         
         return {
@@ -445,7 +633,7 @@ def get_current_user(current_user: dict = Depends(verify_token)):
         raise HTTPException(status_code=500, detail=str(e))
     
 @app.post("/vm-logs", response_model=VMLogResponse)
-def create_vm_log(log_data: VMLogCreate, current_user: dict = Depends(verify_token)):
+async def create_vm_log(log_data: VMLogCreate, current_user: dict = Depends(verify_token)):
     '''This Creates a New VM creation logs entry'''
     try:
         vm_log ={
@@ -454,14 +642,15 @@ def create_vm_log(log_data: VMLogCreate, current_user: dict = Depends(verify_tok
             "vm_name": log_data.vm_name,
             "cpus": log_data.cpus,
             "memory": log_data.memory,
+            "tags": log_data.tags,
             "status": "pending",
             "created_at": datetime.now(timezone.utc).isoformat()
         } 
         
-        result = supabase.table("vm_creation_logs").insert(vm_log).execute()
+        result = await db.insert_vm_log(vm_log)
         
-        if result.data:
-            return result.data[0]
+        if result:
+            return result
         else:
             raise HTTPException(status_code=500, detail="Failed to create VM log")
         
@@ -469,58 +658,159 @@ def create_vm_log(log_data: VMLogCreate, current_user: dict = Depends(verify_tok
         traceback.print_exc()
         raise HTTPException(status_code=500, detail= str(e))
     
+def vm_log_columns(fields: Optional[str]) -> List[str]:
+    """Columns for a fields= projection; id and created_at are always kept for the cursor"""
+    if not fields:
+        return VM_LOG_FIELDS
+    requested = [f.strip() for f in fields.split(",") if f.strip()]
+    unknown = [f for f in requested if f not in VM_LOG_FIELDS + VM_LOG_HEAVY_FIELDS]
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"Unknown fields: {', '.join(unknown)}")
+    return ["id", "created_at"] + [f for f in requested if f not in ("id", "created_at")]
+
+def encode_cursor(row: dict) -> str:
+    raw = json.dumps([row["created_at"], row["id"]]).encode("utf-8")
+    return base64.urlsafe_b64encode(raw).decode("ascii")
+
+def decode_cursor(cursor: str):
+    try:
+        created_at, log_id = json.loads(base64.urlsafe_b64decode(cursor.encode("ascii")))
+        # Both parts end up in a PostgREST or=(...) filter, so neither may carry filter syntax
+        return datetime.fromisoformat(created_at).isoformat(), str(uuid.UUID(log_id))
+    except Exception:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+def etag_response(request: Request, body) -> Response:
+    """JSON response with an ETag; answers 304 when the client already has this body"""
+    payload = json.dumps(body, separators=(",", ":"), default=str).encode("utf-8")
+    etag = f'"{hashlib.sha1(payload).hexdigest()}"'
+    headers = {"ETag": etag, "Cache-Control": "private, no-cache"}
+    if_none_match = request.headers.get("if-none-match", "")
+    if if_none_match.strip() == "*" or etag in [tag.strip() for tag in if_none_match.split(",")]:
+        return Response(status_code=304, headers=headers)
+    return Response(content=payload, media_type="application/json", headers=headers)
+
+async def load_vm_log_output(log: dict) -> dict:
+    """Fill terraform_output/logs from the compressed log store; older rows keep their inline columns"""
+    if "terraform_output" in log:
+        output = await log_store.read_text(log["id"], log_store.OUTPUT_STREAM)
+        if output is not None:
+            log["terraform_output"] = output
+    if "logs" in log:
+        entries = await log_store.read_logs(log["id"])
+        if entries is not None:
+            log["logs"] = entries
+    return log
+
+async def save_vm_log(log_id: str, values: dict, output: Optional[str] = None):
+    """Update a VM log row, keeping its output in the compressed log store instead of the row"""
+    if output is not None:
+        await log_store.write(log_id, log_store.OUTPUT_STREAM, output)
+    if values:
+        await db.update_vm_log(log_id, values)
+
 @app.get("/vm-logs")
-def get_vm_logs(current_user: dict = Depends(verify_token)):
-    """Get all VM logs for the current user"""
+async def get_vm_logs(request: Request, limit: int = VM_LOGS_PAGE_SIZE, cursor: Optional[str] = None,
+                      fields: Optional[str] = None, current_user: dict = Depends(verify_token)):
+    """Page through the current user's VM logs, newest first, without the heavy output columns by default"""
     try:
-        result= supabase.table("vm_creation_logs").select("*").eq("user_email", current_user["email"]).order("created_at", desc=True).execute()
-        # only return in the format the frontend wants ig
-        return{
-            "logs": result.data if result.data else []
-        }
-        
+        columns = vm_log_columns(fields)
+        limit = max(1, min(limit, VM_LOGS_MAX_PAGE_SIZE))
+        before = decode_cursor(cursor) if cursor else None
+        # One extra row tells us whether there is a next page
+        rows = await db.list_vm_logs(current_user["email"], columns=",".join(columns),
+                                     limit=limit + 1, before=before)
+        next_cursor = encode_cursor(rows[limit - 1]) if len(rows) > limit else None
+        rows = rows[:limit]
+        if any(column in VM_LOG_HEAVY_FIELDS for column in columns):
+            rows = await asyncio.gather(*(load_vm_log_output(row) for row in rows))
+        return etag_response(request, {"logs": rows, "next_cursor": next_cursor})
+
+    except HTTPException:
+        raise
     except Exception as e:
         traceback.print_exc()
         raise HTTPException(status_code=500, detail=str(e))
     
 @app.put("/vm-logs/{log_id}")
-def update_vm_log(log_id: str, log_update: VMLogUpdate, current_user: dict = Depends(verify_token)):
+async def update_vm_log(log_id: str, log_update: VMLogUpdate, current_user: dict = Depends(verify_token)):
     """Update a VM log entry"""
     try:
-        existing_log = supabase.table("vm_creation_logs").select("*").eq("id", log_id).eq("user_email", current_user["email"]).execute()
-        
-        if not existing_log.data:
-            raise HTTPException(status_code=404, detail= "VM log not found")
-        
         update_data={}
         if log_update.status is not None:
             update_data["status"] = log_update.status
+        if log_update.tags is not None:
+            update_data["tags"] = log_update.tags
+
+        # The filtered update doubles as the ownership check; only fall back to a lookup when there is nothing to set
+        if update_data:
+            existing_log = await db.update_vm_log(log_id, update_data, user_email=current_user["email"])
+        else:
+            existing_log = await db.get_vm_log(log_id, current_user["email"], columns="id")
+
+        if not existing_log:
+            raise HTTPException(status_code=404, detail= "VM log not found")
+
         if log_update.terraform_output is not None:
-            update_data["terraform_output"] = log_update.terraform_output
+            await log_store.write(log_id, log_store.OUTPUT_STREAM, log_update.terraform_output)
         if log_update.logs is not None:
-            update_data["terraform_output"] = str (log_update.logs)
-            
-        #Update the log
-        result = supabase.table("vm_creation_logs").update(update_data).eq("id", log_id).execute()
+            await log_store.write_logs(log_id, log_update.logs)
         
         return {"message": "VM log updated successfully"}
     
+    except HTTPException:
+        raise
     except Exception as e:
         traceback.print_exc()
         raise HTTPException(status_code=500, detail=str(e))
     
+@app.get("/vm-logs/{log_id}/output")
+async def get_vm_log_output(log_id: str, request: Request, current_user: dict = Depends(verify_token)):
+    """Terraform output and log entries of one VM log, loaded on demand"""
+    try:
+        log = await db.get_vm_log(log_id, current_user["email"], columns="id,status,terraform_output,logs")
+        if not log:
+            raise HTTPException(status_code=404, detail="VM log not found")
+        return etag_response(request, await load_vm_log_output(log))
+
+    except HTTPException:
+        raise
+    except Exception as e:
+        traceback.print_exc()
+        raise HTTPException(status_code=500, detail=str(e))
+
+@app.get("/vm-logs/{log_id}/output/raw")
+async def get_vm_log_output_raw(log_id: str, current_user: dict = Depends(verify_token)):
+    """Terraform output of one VM log as plain text, decompressed while it is sent"""
+    log = await db.get_vm_log(log_id, current_user["email"], columns="id,terraform_output")
+    if not log:
+        raise HTTPException(status_code=404, detail="VM log not found")
+
+    async def body():
+        found = False
+        async for piece in log_store.read_stream(log_id, log_store.OUTPUT_STREAM):
+            found = True
+            yield piece
+        if not found and log.get("terraform_output"):
+            yield log["terraform_output"]
+
+    return StreamingResponse(body(), media_type="text/plain")
+
+@app.get("/vm-logs/{log_id}/stream")
+async def stream_vm_log(log_id: str, current_user: dict = Depends(verify_token)):
+    """Server-sent events feed of the terraform/vagrant output behind a VM log"""
+    if not await db.get_vm_log(log_id, current_user["email"], columns="id"):
+        raise HTTPException(status_code=404, detail="VM log not found")
+    return StreamingResponse(sse_events(log_id), media_type="text/event-stream")
+
 @app.delete("/vm-logs/{log_id}")
-def delete_vm_log(log_id: str, current_user: dict = Depends(verify_token)):
+async def delete_vm_log(log_id: str, current_user: dict = Depends(verify_token)):
     """Delete a VM log entry"""
     try:
-        existing_log = supabase.table("vm_creation_logs").select("*").eq("id", log_id).eq("user_email", current_user["email"]).execute()
-        
-        if not existing_log.data:
+        #Delete the log, scoped to its owner
+        if not await db.delete_vm_log(log_id, user_email=current_user["email"]):
             raise HTTPException(status_code=404, detail="VM log not found")
         
-        #Delete the log
-        supabase.table("vm_creation_logs").delete().eq("id", log_id).execute()
-        
         return {"message": "VM log deleted successfully"}
     
     except HTTPException:
@@ -531,32 +821,41 @@ def delete_vm_log(log_id: str, current_user: dict = Depends(verify_token)):
 
 # Utility Functions
 
-def write_vagrantfile(box_name, vm_name, memory, cpus, vagrant_dir):
-    print(f"DEBUG: write_vagrantfile() called with -> box_name: '{box_name}', vm_name: '{vm_name}', memory: {memory}, cpus: {cpus}")
+# Guest provisioning baked into golden images, so it is kept separate from the Vagrantfile template
+PROVISION_SCRIPT = """sudo apt-get update
+sudo apt-get install -y nginx
+sudo systemctl enable nginx
+sudo systemctl start nginx"""
+
+def write_vagrantfile(box_name, vm_name, memory, cpus, vagrant_dir, ip="192.168.56.10", provision=True, linked_clone=False):
+    print(f"DEBUG: write_vagrantfile() called with -> box_name: '{box_name}', vm_name: '{vm_name}', memory: {memory}, cpus: {cpus}, ip: {ip}, provision: {provision}, linked_clone: {linked_clone}")
+
+    network_block = f'''
+  config.vm.network "private_network", ip: "{ip}"''' if ip else ""
+    provision_block = ""
+    if provision:
+        script = "\n".join(f"    {line}" for line in PROVISION_SCRIPT.splitlines())
+        provision_block = f'''
+  config.vm.provision "shell", inline: <<-SHELL
+{script}
+  SHELL'''
+    # A linked clone gets a differencing disk on the box's master snapshot instead of a full disk copy
+    linked_clone_line = """
+    vb.linked_clone = true""" if linked_clone else ""
 
     vagrantfile_content = f'''Vagrant.configure("2") do |config|
   config.vm.box = "{box_name}"
-  config.vm.hostname = "{vm_name}"
-  config.vm.network "private_network", ip: "192.168.56.10"
+  config.vm.hostname = "{vm_name}"{network_block}
 
   config.vm.provider "virtualbox" do |vb|
     vb.name = "{vm_name}"
     vb.memory = "{memory}"
-    vb.cpus = {cpus}
-  end
-  config.vm.provision "shell", inline: <<-SHELL
-    sudo apt-get update
-    sudo apt-get install -y nginx
-    sudo systemctl enable nginx
-    sudo systemctl start nginx
-  SHELL
+    vb.cpus = {cpus}{linked_clone_line}
+  end{provision_block}
 end'''
 
-    os.makedirs(vagrant_dir, exist_ok=True)
     vagrantfile_path = os.path.join(vagrant_dir, "Vagrantfile")
-
-    with open(vagrantfile_path, "w") as vf:
-        vf.write(vagrantfile_content.strip())
+    write_if_changed(vagrantfile_path, vagrantfile_content.strip())
 
     print("DEBUG: Vagrantfile content written:\n", vagrantfile_content.strip())
     print(f"Vagrantfile written to {vagrantfile_path}")
@@ -580,8 +879,9 @@ resource "null_resource" "vagrant_up" {
     working_dir = "${path.module}/vagrant"
   }
 
+  # Content-addressed: re-run vagrant up only when the rendered Vagrantfile changes
   triggers = {
-    always_run = timestamp()
+    vagrantfile = filesha256("${path.module}/vagrant/Vagrantfile")
   }
 }
 
@@ -593,66 +893,673 @@ resource "null_resource" "vagrant_destroy"{
     }
 }
 '''
-    os.makedirs(terraform_dir, exist_ok=True)
     tf_path = os.path.join(terraform_dir, "main.tf")
 
-    with open(tf_path, "w") as f:
-        f.write(terraform_code.strip())
+    # Leave an identical main.tf untouched so the init fingerprint stays valid
+    if write_if_changed(tf_path, terraform_code.strip()):
+        print(f"Terraform config written to {tf_path}")
+    else:
+        print(f"Terraform config unchanged at {tf_path}")
+
+def write_batch_terraform_config(batch_dir, workspaces):
+    """One for_each config booting every workspace's Vagrantfile; a workspace left out is destroyed"""
+    machines = []
+    for workspace in workspaces:
+        with open(os.path.join(workspace.vagrant_dir, "Vagrantfile"), "rb") as f:
+            vagrantfile = hashlib.sha256(f.read()).hexdigest()
+        vagrant_dir = workspace.vagrant_dir.replace("\\", "/")
+        machines.append(f'    {json.dumps(workspace.key)} = {{ vagrant_dir = {json.dumps(vagrant_dir)}, vagrantfile = "{vagrantfile}" }}')
+    machines_block = "\n".join(machines)
+
+    terraform_code = f'''
+terraform {{
+  required_providers {{
+    null = {{
+      source  = "hashicorp/null"
+      version = "~> 3.0"
+    }}
+  }}
+}}
 
-    print(f"Terraform config written to {tf_path}")
+provider "null" {{}}
 
-def run_command(command, cwd=None):
-    try:
-        print(f"Running command: {command} (in {cwd})")
-        result = subprocess.run(
-            command,
-            shell=True,
-            cwd=cwd,
-            check=True,
-            stdout=subprocess.PIPE,
-            stderr=subprocess.PIPE,
-            text=True
-        )
-        return result.stdout
-    except subprocess.CalledProcessError as e:
-        error_msg = f"Command failed:\n{command}\nSTDOUT:\n{e.stdout}\nSTDERR:\n{e.stderr}"
+locals {{
+  machines = {{
+{machines_block}
+  }}
+}}
+
+resource "null_resource" "vm" {{
+  for_each = local.machines
+
+  # Content-addressed: re-run vagrant up only when that machine's Vagrantfile changes
+  triggers = {{
+    vagrant_dir = each.value.vagrant_dir
+    vagrantfile = each.value.vagrantfile
+  }}
+
+  provisioner "local-exec" {{
+    command     = "vagrant up"
+    working_dir = each.value.vagrant_dir
+  }}
+
+  provisioner "local-exec" {{
+    when        = destroy
+    command     = "vagrant destroy -f"
+    working_dir = self.triggers.vagrant_dir
+  }}
+}}
+'''
+    tf_path = os.path.join(batch_dir, "main.tf")
+    if write_if_changed(tf_path, terraform_code.strip()):
+        print(f"Batch terraform config written to {tf_path} ({len(workspaces)} machines)")
+
+def run_command(command, cwd=None, on_line=None, env=None, ok_codes=(0,), with_exit_code=False):
+    """Run command, handing each output line to on_line as it is produced.
+
+    Only the last COMMAND_OUTPUT_TAIL lines are kept and returned, so a chatty
+    terraform/vagrant run does not sit in memory until it exits. Exit codes
+    outside ok_codes raise; with_exit_code returns (output, exit_code).
+    """
+    print(f"Running command: {command} (in {cwd})")
+    name = metrics.command_name(command)
+    stages = metrics.VagrantStageTimer()
+    started = time.monotonic()
+    tail = deque(maxlen=COMMAND_OUTPUT_TAIL)
+    process = subprocess.Popen(
+        command,
+        shell=True,
+        cwd=cwd,
+        env=env,
+        stdout=subprocess.PIPE,
+        stderr=subprocess.STDOUT,
+        text=True,
+        errors="replace",
+        bufsize=1
+    )
+    with process:
+        for line in process.stdout:
+            line = line.rstrip("\r\n")
+            tail.append(line)
+            stages.feed(line)
+            if on_line:
+                on_line(line)
+    stages.finish()
+    metrics.SUBPROCESS_SECONDS.observe(time.monotonic() - started, command=name)
+    metrics.SUBPROCESS_EXITS.inc(command=name, exit_code=process.returncode)
+    output = "\n".join(tail)
+    if process.returncode not in ok_codes:
+        metrics.SUBPROCESS_FAILURES.inc(command=name)
+        error_msg = f"Command failed (exit {process.returncode}):\n{command}\nOUTPUT:\n{output}"
         print(error_msg)
         raise RuntimeError(error_msg)
+    if with_exit_code:
+        return output, process.returncode
+    return output
 
 # SSH Helper
 
-def ssh_into_vagrant_vm(vm_ip, vagrant_dir):
+ssh_pool = SSHSessionPool()
+
+@app.on_event("startup")
+def start_ssh_pool():
+    ssh_pool.start()
+
+@app.on_event("shutdown")
+def stop_ssh_pool():
+    ssh_pool.stop()
+
+def vagrant_private_key(vagrant_dir):
     private_key_path = os.path.join(vagrant_dir, ".vagrant", "machines", "default", "virtualbox", "private_key")
 
     if not os.path.exists(private_key_path):
         raise FileNotFoundError(f"SSH private key not found at: {private_key_path}")
+    return private_key_path
 
-    ssh_command = [
-        "ssh",
-        "-i", private_key_path,
-        f"vagrant@{vm_ip}",
-        "-o", "StrictHostKeyChecking=no",
-        "echo 'SSH connection successful!'"
-    ]
+def ssh_into_vagrant_vm(vm_ip, vagrant_dir):
+    """Check a VM answers over SSH, reusing the pooled session when there is one"""
+    exit_code, output = ssh_pool.run(vm_ip, vagrant_private_key(vagrant_dir), "echo 'SSH connection successful!'")
+
+    if exit_code != 0:
+        raise RuntimeError(f"SSH failed:\n{output}")
+
+    return output.strip()
+
+# ========== Provisioning Jobs ==========
+
+log_appenders = {}  # job id -> LogsAppender while the job has not finished
+log_appenders_lock = threading.Lock()
+
+def record_job_update(job):
+    """Mirror a job's phase log into its vm_creation_logs row.
+
+    While the job runs only the entries logged since the last flush are
+    appended; once it finishes the log is rewritten whole, trimmed to the
+    entries the job still holds.
+    """
+    if not job.vm_log_id:
+        return
+    if job.status in TERMINAL_STATES:
+        with log_appenders_lock:
+            log_appenders.pop(job.id, None)
+        db.run_sync(log_store.write_logs(job.vm_log_id, list(job.phases)))
+        return
+    with log_appenders_lock:
+        appender = log_appenders.get(job.id)
+        if appender is None:
+            appender = log_appenders[job.id] = log_store.LogsAppender(job.vm_log_id)
+    with appender.lock:
+        count = job.entry_count
+        entries = list(job.phases)
+        new = min(count - appender.entries, len(entries))
+        if new > 0:
+            db.run_sync(appender.append_entries(entries[-new:], count))
+
+job_queue = JobQueue(on_update=record_job_update)
+workspace_allocator = WorkspaceAllocator()
+log_broker = LogBroker()
+scheduler = HostScheduler(state_file=os.path.join(workspace_allocator.root, "reservations.json"))
+node_registry = NodeRegistry(scheduler if nodes.LOCAL_NODE else None, state_dir=workspace_allocator.root)
+
+@app.on_event("startup")
+def check_node_token():
+    # Without a token no agent can register, so a controller with no local node could build nothing
+    if node_registry.local is None:
+        nodes.require_token("a controller (LOCAL_NODE=false)")
+linked_clones = LinkedCloneMasters(run_command, state_file=os.path.join(workspace_allocator.root, "linked_clones.json"))
+
+def wants_linked_clone(req):
+    return LINKED_CLONES if req.linked_clone is None else req.linked_clone
+
+def stream_key(job):
+    return job.vm_log_id or job.id
+
+def job_output(job):
+    """on_line callback feeding a job's log and its live stream subscribers"""
+    def on_line(line):
+        job.output(line)
+        log_broker.publish(stream_key(job), line)
+    return on_line
+
+def submit_job(kind, user_email, pipeline, vm_log_id=None, payload=None, resources=None, host_scheduler=None):
+    """Queue pipeline(job) and open its live log stream.
+
+    With resources ({workspace key: (cpus, memory)}) the job first waits for
+    host_scheduler (this host's by default) to reserve them.
+    """
+    waiting_since = []
+
+    def gate(job, start):
+        if not (host_scheduler or scheduler).request(resources, start):
+            waiting_since.append(time.monotonic())
+
+    def run(job):
+        if waiting_since:
+            job.log("info", f"Waited {time.monotonic() - waiting_since[0]:.1f}s for host capacity")
+        try:
+            return pipeline(job)
+        finally:
+            log_broker.close(stream_key(job))
+
+    job = job_queue.submit(kind, user_email, run, vm_log_id=vm_log_id, payload=payload,
+                           gate=gate if resources else None)
+    log_broker.open(stream_key(job))
+    return job
+
+async def sse_events(key):
+    if log_broker.known(key):
+        async for line in log_broker.subscribe(key):
+            yield f"data: {line}\n\n"
+    yield "event: end\ndata: \n\n"
+
+@app.on_event("shutdown")
+def shutdown_job_queue():
+    job_queue.shutdown()
+    warm_pool.stop()
+    golden_images.shutdown()
+
+def build_vm(job, workspace, box_name, vm_name, memory, cpus, linked_clone=False):
+    """Render configs into a workspace and run terraform init/apply, returning both outputs"""
+    terraform_dir = workspace.terraform_dir
+    with workspace_allocator.lock(workspace.key):
+        # Step 1: Write Vagrantfile and Terraform configs
+        with job.phase("render"):
+            render_vm(job, workspace, box_name, vm_name, memory, cpus, linked_clone=linked_clone)
+            write_terraform_config(terraform_dir)
 
-    print(f"Running SSH command: {' '.join(ssh_command)}")
-    result = subprocess.run(ssh_command, stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True)
+        # Step 2: Terraform Init
+        with job.phase("terraform_init"):
+            print("Running terraform init...")
+            init_output, skipped = ensure_initialized(terraform_dir, run_command, on_line=job_output(job))
+            if skipped:
+                job.log("info", init_output)
+            print("Terraform init complete.\n", init_output)
 
-    if result.returncode != 0:
-        raise RuntimeError(f"SSH failed:\n{result.stderr}")
+        # Step 3: Terraform Apply
+        with job.phase("terraform_apply"):
+            print("Running terraform apply...")
+            apply_output, skipped = apply_if_changed(terraform_dir, run_command, on_line=job_output(job))
+            if skipped:
+                job.log("info", apply_output)
+            print("Terraform apply complete.\n", apply_output)
+
+        if linked_clone:
+            saved = linked_clones.built(workspace.key, workspace.vagrant_dir)
+            if saved is not None:
+                job.log("info", f"Linked clone saved {saved // (1024 * 1024)} MB of disk")
+
+    return init_output, apply_output
+
+def provision_vm(job, req, workspace):
+    """Build a fresh VM for a queued create job"""
+    try:
+        init_output, apply_output = build_vm(job, workspace, req.box_name, req.vm_name, req.memory, req.cpus,
+                                             linked_clone=wants_linked_clone(req))
+
+        #Update VM log with success
+        if job.vm_log_id:
+            db.run_sync(save_vm_log(job.vm_log_id, {
+                "status": "success",
+                "ip_address": workspace.ip,
+                "disk_saved_bytes": linked_clones.saved_bytes(workspace.key)
+            }, output=apply_output))
+            reconciler.track(job.user_email, req.vm_name, job.vm_log_id)
+
+        return {
+            "message": "🎉 VM created and provisioned successfully.",
+            "terraform_init": init_output,
+            "terraform_apply": apply_output,
+            "vm_log_id": job.vm_log_id,
+            "vm_ip": workspace.ip
+        }
+
+    except Exception as e:
+        if job.vm_log_id:
+            db.run_sync(save_vm_log(job.vm_log_id, {"status": "error"}, output=str(e)))
+        # Capacity and the clone count go back now instead of when the user destroys the failed VM
+        scheduler.release(workspace.key)
+        linked_clones.release(workspace.key)
+        raise
+
+def adopt_warm_vm(job, req, workspace):
+    """Re-tag a VM claimed from the warm pool with the user's VM name"""
+    try:
+        with workspace_allocator.lock(workspace.key):
+            with job.phase("retag"):
+                write_vagrantfile(req.box_name, req.vm_name, req.memory, req.cpus, workspace.vagrant_dir, ip=workspace.ip,
+                                  linked_clone=linked_clones.is_clone(workspace.key))
+                retag_output = run_command(
+                    f'vagrant ssh -c "sudo hostnamectl set-hostname {shlex.quote(req.vm_name)}"',
+                    cwd=workspace.vagrant_dir, on_line=job_output(job)
+                )
+
+            # Bring the moved workspace's terraform state in line with the re-tagged Vagrantfile,
+            # so later applies and destroys run against it; vagrant up on the running VM is a no-op
+            with job.phase("terraform_apply"):
+                apply_output, skipped = apply_if_changed(workspace.terraform_dir, run_command, on_line=job_output(job))
+                if skipped:
+                    job.log("info", apply_output)
+
+        if job.vm_log_id:
+            db.run_sync(save_vm_log(job.vm_log_id, {
+                "status": "success",
+                "ip_address": workspace.ip,
+                "disk_saved_bytes": linked_clones.saved_bytes(workspace.key)
+            }, output="Claimed pre-booted VM from the warm pool"))
+            reconciler.track(job.user_email, req.vm_name, job.vm_log_id)
+
+        return {
+            "message": "🎉 VM created and provisioned successfully (warm pool).",
+            "terraform_init": "skipped (warm pool)",
+            "terraform_apply": retag_output,
+            "vm_log_id": job.vm_log_id,
+            "vm_ip": workspace.ip
+        }
+
+    except Exception as e:
+        if job.vm_log_id:
+            db.run_sync(save_vm_log(job.vm_log_id, {"status": "error"}, output=str(e)))
+        raise
+
+def replay_entry(job):
+    """on_entry callback copying a remote agent's job log entries into job"""
+    on_line = job_output(job)
+
+    def on_entry(entry):
+        if entry["level"] == "output":
+            on_line(entry["message"])
+        else:
+            job.log(entry["level"], entry["message"], phase=entry["phase"])
+    return on_entry
 
-    return result.stdout.strip()
+def provision_remote_vm(job, req, node):
+    """Build a VM on the agent of the node it was placed on"""
+    try:
+        with job.phase("remote_build"):
+            job.log("info", f"Building on node {node.id}")
+            payload = {"owner": job.user_email, **req.dict(), "linked_clone": wants_linked_clone(req)}
+            result = nodes.call_agent(node, "/agent/vms", payload, replay_entry(job))
+
+        if job.vm_log_id:
+            db.run_sync(save_vm_log(job.vm_log_id, {
+                "status": "success",
+                "ip_address": result["vm_ip"],
+                "disk_saved_bytes": result.get("disk_saved_bytes")
+            }, output=result["terraform_apply"]))
+
+        return {
+            "message": f"🎉 VM created and provisioned successfully on node {node.id}.",
+            "terraform_init": result["terraform_init"],
+            "terraform_apply": result["terraform_apply"],
+            "vm_log_id": job.vm_log_id,
+            "vm_ip": result["vm_ip"],
+            "node": node.id
+        }
+
+    except Exception as e:
+        if job.vm_log_id:
+            db.run_sync(save_vm_log(job.vm_log_id, {"status": "error"}, output=str(e)))
+        # The agent drops its own clone count; the reservation and placement are held here.
+        # Without the placement the next create with this name is placed afresh, not pinned to this node
+        key = workspace_allocator.key_for(job.user_email, req.vm_name)
+        node.scheduler.release(key)
+        node_registry.unassign(key)
+        raise
+
+def render_vm(job, workspace, box_name, vm_name, memory, cpus, linked_clone=False):
+    """Write a VM's Vagrantfile, booting from the golden image when one is baked"""
+    golden_box = golden_images.lookup(box_name, PROVISION_SCRIPT)
+    if golden_box:
+        job.log("info", f"Using golden image {golden_box} for {box_name}")
+    else:
+        golden_images.request_bake(box_name, PROVISION_SCRIPT)
+    box = golden_box or box_name
+    if linked_clone:
+        # Counted before the boot so the master cannot be removed while this clone is being made
+        linked_clones.acquire(workspace.key, box)
+        job.log("info", f"Creating a linked clone of the {box} master snapshot")
+    write_vagrantfile(box, vm_name, memory, cpus, workspace.vagrant_dir, ip=workspace.ip,
+                      provision=not golden_box, linked_clone=linked_clone)
+
+def batch_created(batch_dir):
+    """Workspace keys whose VM is in the batch's terraform state and not tainted by a failed boot"""
+    output = run_command("terraform show -json", cwd=batch_dir, env=terraform_env())
+    state = json.loads(output or "{}")
+    resources = state.get("values", {}).get("root_module", {}).get("resources", [])
+    return {r["index"] for r in resources if r.get("name") == "vm" and not r.get("tainted")}
+
+def provision_batch(job, reqs, workspaces, vm_log_ids, batch_dir, parallelism):
+    """Boot a batch of VMs from one for_each terraform config, `parallelism` at a time"""
+    on_line = job_output(job)
+    try:
+        with workspace_allocator.batch_lock(batch_dir):
+            with job.phase("render"):
+                for req, workspace in zip(reqs, workspaces):
+                    render_vm(job, workspace, req.box_name, req.vm_name, req.memory, req.cpus,
+                              linked_clone=wants_linked_clone(req))
+                write_batch_terraform_config(batch_dir, workspaces)
+
+            # One init for the whole batch instead of one per VM
+            with job.phase("terraform_init"):
+                init_output, skipped = ensure_initialized(batch_dir, run_command, on_line=on_line)
+                if skipped:
+                    job.log("info", init_output)
+
+            # A VM that fails to boot is left tainted in the state; the others still come up
+            with job.phase("terraform_apply"):
+                apply_output, exit_code = run_command(
+                    f"terraform apply -auto-approve -input=false -parallelism={parallelism}",
+                    cwd=batch_dir, on_line=on_line, env=terraform_env(), ok_codes=(0, 1), with_exit_code=True
+                )
+                created = batch_created(batch_dir)
+                for workspace in workspaces:
+                    if workspace.key in created:
+                        linked_clones.built(workspace.key, workspace.vagrant_dir)
+
+            # Tear down VMs that failed to boot now: a tainted one would be rebooted by every later apply
+            failed = [workspace for workspace in workspaces if workspace.key not in created]
+            if failed:
+                with job.phase("cleanup_failed"):
+                    write_batch_terraform_config(batch_dir, [w for w in workspaces if w.key in created])
+                    run_command("terraform apply -auto-approve -input=false", cwd=batch_dir, on_line=on_line, env=terraform_env())
+                    for workspace in failed:
+                        workspace_allocator.release(workspace)
+                        scheduler.release(workspace.key)
+                        linked_clones.release(workspace.key)
+                    if not created:
+                        workspace_allocator.release_batch(batch_dir)
+
+    except Exception as e:
+        ids = [log_id for log_id in vm_log_ids if log_id]
+        if ids:
+            db.run_sync(db.update_vm_logs(ids, {"status": "error"}))
+        # Tear down whatever part of the batch came up, then give back everything it held
+        try:
+            run_command("terraform destroy -auto-approve -input=false", cwd=batch_dir, on_line=on_line, env=terraform_env())
+        except Exception:
+            traceback.print_exc()
+        for workspace in workspaces:
+            workspace_allocator.release(workspace)
+            scheduler.release(workspace.key)
+            linked_clones.release(workspace.key)
+        workspace_allocator.release_batch(batch_dir)
+        raise
+
+    results = []
+    for req, workspace, log_id in zip(reqs, workspaces, vm_log_ids):
+        ok = workspace.key in created
+        if log_id:
+            values = {"status": "success", "ip_address": workspace.ip,
+                      "disk_saved_bytes": linked_clones.saved_bytes(workspace.key)} if ok else {"status": "error"}
+            db.run_sync(save_vm_log(log_id, values, output=apply_output))
+            if ok:
+                reconciler.track(job.user_email, req.vm_name, log_id)
+        results.append({"vm_name": req.vm_name, "vm_log_id": log_id, "vm_ip": workspace.ip,
+                        "status": "success" if ok else "error"})
+
+    if not created:
+        raise RuntimeError(f"No VM in the batch came up (terraform exit {exit_code}):\n{apply_output}")
+
+    return {
+        "message": f"🎉 {len(created)} of {len(reqs)} VMs created and provisioned.",
+        "terraform_init": init_output,
+        "terraform_apply": apply_output,
+        "vms": results
+    }
+
+def build_warm_vm(workspace, profile, vm_name):
+    box_name, cpus, memory = profile
+    build_vm(Job("warm-pool", WARM_POOL_OWNER), workspace, box_name, vm_name, memory, cpus, linked_clone=LINKED_CLONES)
+
+def discard_warm_vm(key, workspace):
+    # Best effort: a failed build may have left a half-booted VM behind
+    if workspace is not None and os.path.exists(os.path.join(workspace.vagrant_dir, ".vagrant")):
+        try:
+            run_command("vagrant destroy -f", cwd=workspace.vagrant_dir)
+        except Exception:
+            traceback.print_exc()
+    scheduler.release(key)
+    linked_clones.release(key)
+
+def reserve_warm_vm(key, profile):
+    # Warm VMs only take capacity that no queued request is waiting for
+    _, cpus, memory = profile
+    return scheduler.try_reserve(key, cpus, memory)
+
+def claim_warm_vm(old, new):
+    # The claimed VM's reservation and clone count move to the user's workspace key
+    scheduler.rekey(old.key, new.key)
+    linked_clones.rekey(old.key, new.key)
+
+warm_pool = WarmPool(workspace_allocator, build_warm_vm, reserve_fn=reserve_warm_vm, on_claim=claim_warm_vm,
+                     discard_fn=discard_warm_vm)
+
+GOLDEN_BUILDER_CPUS = 1
+GOLDEN_BUILDER_MEMORY = 1024
+
+def render_golden_builder(box_name, vm_name, vagrant_dir):
+    # Builder VMs get no private_network so the packaged box carries no static IP config
+    write_vagrantfile(box_name, vm_name, GOLDEN_BUILDER_MEMORY, GOLDEN_BUILDER_CPUS, vagrant_dir, ip=None)
+
+# Builder VMs take host capacity like any other VM, but only what no queued request is waiting for
+golden_images = GoldenImageCache(
+    run_command, render_golden_builder,
+    reserve_fn=lambda vm_name: scheduler.try_reserve(vm_name, GOLDEN_BUILDER_CPUS, GOLDEN_BUILDER_MEMORY),
+    release_fn=scheduler.release
+)
+
+@app.on_event("startup")
+def start_warm_pool():
+    # Warm VMs are booted on this host, so there is no pool when it only controls remote nodes
+    if node_registry.local:
+        warm_pool.start()
+
+def record_vm_states(changes):
+    """Write reconciled state changes back to their vm_creation_logs rows"""
+    for entry, old_state, new_state in changes:
+        print(f"VM {entry['vm_name']} ({entry['user_email']}): {old_state} -> {new_state}")
+    db.run_sync(db.set_vm_states(
+        {entry["log_id"]: new_state for entry, _, new_state in changes},
+        datetime.now(timezone.utc).isoformat()
+    ))
+
+reconciler = VMReconciler(run_command, workspace_allocator, record_vm_states)
+
+@app.on_event("startup")
+async def start_reconciler():
+    try:
+        # VMs on agents do not exist here; polling them would record them as not_created
+        reconciler.load(await db.list_tracked_vms(), skip=node_registry.is_remote)
+    except Exception as e:
+        print(f"Error loading tracked VMs: {e}")
+    reconciler.start()
+
+@app.on_event("shutdown")
+def stop_reconciler():
+    reconciler.stop()
+
+def leave_batch(job, batch_dir, workspace):
+    """Re-render a batch without workspace and apply, which destroys only that VM"""
+    with workspace_allocator.batch_lock(batch_dir):
+        remaining = [w for w in workspace_allocator.batch_members(batch_dir) if w.key != workspace.key]
+        write_batch_terraform_config(batch_dir, remaining)
+        output = run_command("terraform apply -auto-approve -input=false", cwd=batch_dir, on_line=job_output(job), env=terraform_env())
+        if not remaining:
+            workspace_allocator.release_batch(batch_dir)
+    return output
+
+def destroy_vm_job(job, req, workspace):
+    """Run terraform destroy for a queued destroy job and reclaim its workspace"""
+    batch_dir = workspace_allocator.batch_of(workspace)
+    with workspace_allocator.lock(workspace.key):
+        with job.phase("terraform_destroy"):
+            print("Running terraform destroy...")
+            if batch_dir:
+                destroy_output = leave_batch(job, batch_dir, workspace)
+            else:
+                destroy_output = run_command("terraform destroy -auto-approve -input=false", cwd=workspace.terraform_dir, on_line=job_output(job), env=terraform_env())
+            print("Terraform destroy complete.\n", destroy_output)
+
+        with job.phase("release_workspace"):
+            ssh_pool.drop(workspace.ip)
+            reconciler.forget(job.user_email, req.vm_name)
+            workspace_allocator.release(workspace)
+            scheduler.release(workspace.key)
+            linked_clones.release(workspace.key)
+            print(f"Released workspace {workspace.key} and IP {workspace.ip}")
+
+    return {
+        "message": "🗑️ VM destroyed successfully.",
+        "terraform_destroy": destroy_output
+    }
+
+def destroy_remote_vm(job, req, node):
+    """Destroy a VM through its node's agent and free its reservation there"""
+    key = workspace_allocator.key_for(job.user_email, req.vm_name)
+    with job.phase("remote_destroy"):
+        result = nodes.call_agent(node, "/agent/vms/destroy", {"owner": job.user_email, "vm_name": req.vm_name},
+                                  replay_entry(job))
+
+    with job.phase("release_placement"):
+        node.scheduler.release(key)
+        node_registry.unassign(key)
+        print(f"Released {key} on node {node.id}")
+
+    return {
+        "message": f"🗑️ VM destroyed successfully on node {node.id}.",
+        "terraform_destroy": result["terraform_destroy"],
+        "node": node.id
+    }
+
+def capacity_error(e):
+    """HTTP error for a VM no node could ever run (400) or for having no node at all (503)"""
+    if isinstance(e, NoNodeError):
+        return HTTPException(status_code=503, detail=str(e), headers={"Retry-After": "30"})
+    return HTTPException(status_code=400, detail=str(e))
+
+def remote_vm_error(user_email, vm_name):
+    """409 for a VM placed on a remote node, which SSH, exec and the state index do not reach; None otherwise"""
+    node = node_registry.node_for(workspace_allocator.key_for(user_email, vm_name))
+    if node is None:
+        return None
+    return HTTPException(status_code=409, detail=f"VM '{vm_name}' runs on node {node.id}; SSH, exec and live "
+                                                 f"state only cover VMs on the API host")
+
+def job_accepted(job):
+    return {
+        "message": f"{job.kind} job queued",
+        "job_id": job.id,
+        "status": job.status,
+        "vm_log_id": job.vm_log_id,
+        "status_url": f"/jobs/{job.id}"
+    }
 
 # ========== API Endpoints ==========
 
-@app.post("/create-vm")
-def create_vm(req: VMRequest, current_user: dict = Depends(verify_token)):
+@app.post("/create-vm", status_code=status.HTTP_202_ACCEPTED)
+async def create_vm(req: VMRequest, current_user: dict = Depends(verify_token)):
     print("Received VM creation request:", req)
     print("Request body as dict:", req.dict())
     print("Authenticated user:", current_user)
 
-    terraform_dir = r"C:\Users\Arin Raut\v-t-vm"
-    vagrant_dir = os.path.join(terraform_dir, "vagrant")
+    try:
+        node_registry.check(req.cpus, req.memory)
+    except (CapacityError, NoNodeError) as e:
+        raise capacity_error(e)
+
+    # Prefer a pre-booted VM from the warm pool (its capacity is already reserved), fall back to a cold build.
+    # pipeline(job, req, target) gets the VM's workspace, or its node for a build on a remote agent
+    key = workspace_allocator.key_for(current_user["email"], req.vm_name)
+    # What the VM already had, so a refused submit only undoes what this request took
+    existing_workspace = workspace_allocator.find(current_user["email"], req.vm_name)
+    existing_node = node_registry.node_for(key)
+    node = node_registry.local
+    target = warm_pool.claim(req.box_name, req.cpus, req.memory, current_user["email"], req.vm_name) if node else None
+    pipeline = adopt_warm_vm
+    resources = None
+    if target is None:
+        resources = {key: (req.cpus, req.memory)}
+        # A VM that already has a workspace here is rebuilt in place; otherwise bin-pack it onto a node
+        if node is None or not existing_workspace:
+            try:
+                node = node_registry.place(key, req.cpus, req.memory)
+            except (CapacityError, NoNodeError) as e:
+                raise capacity_error(e)
+        if node.is_local:
+            pipeline = provision_vm
+            try:
+                target = workspace_allocator.acquire(current_user["email"], req.vm_name)
+            except IPPoolExhaustedError as e:
+                raise HTTPException(status_code=503, detail=str(e))
+        else:
+            pipeline = provision_remote_vm
+            target = node
+            node_registry.assign(key, node.id)
+    if node.is_local:
+        print(f"Using workspace {target.terraform_dir} with IP {target.ip}")
+    else:
+        print(f"Placing VM on node {node.id} ({node.url})")
+    linked_clone = linked_clones.is_clone(target.key) if pipeline is adopt_warm_vm else wants_linked_clone(req)
     
     #Create VM log log entry at start
     vm_log_data ={
@@ -661,82 +1568,270 @@ def create_vm(req: VMRequest, current_user: dict = Depends(verify_token)):
         "vm_name": req.vm_name,
         "cpus": req.cpus,
         "memory": req.memory,
+        "tags": req.tags,
+        "linked_clone": linked_clone,
         "status":"pending",
         "created_at": datetime.now(timezone.utc).isoformat()
     }
     
-    vm_log_result = supabase.table("vm_creation_logs").insert(vm_log_data).execute()
-    vm_log_id= vm_log_result.data[0]["id"] if vm_log_result.data else None
+    vm_log_result = await db.insert_vm_log(vm_log_data)
+    vm_log_id= vm_log_result["id"] if vm_log_result else None
 
     try:
-        # Step 1: Write Vagrantfile and Terraform configs
-        write_vagrantfile(req.box_name, req.vm_name, req.memory, req.cpus, vagrant_dir)
-        write_terraform_config(terraform_dir)
-
-        # Step 2: Terraform Init
-        print("Running terraform init...")
-        init_output = run_command("terraform init", cwd=terraform_dir)
-        print("Terraform init complete.\n", init_output)
-
-        # Step 3: Terraform Apply
-        print("Running terraform apply...")
-        apply_output = run_command("terraform apply -auto-approve", cwd=terraform_dir)
-        print("Terraform apply complete.\n", apply_output)
-        
-        #Update VM log with success
+        job = submit_job(
+            "create-vm", current_user["email"],
+            lambda job: pipeline(job, req, target),
+            vm_log_id=vm_log_id,
+            payload=req.dict(),
+            resources=resources,
+            host_scheduler=node.scheduler
+        )
+    except (QueueFullError, SchedulerFullError) as e:
         if vm_log_id:
-            supabase.table("vm_creation_logs").update({
-                "status": "success",
-                "terraform_output": apply_output
-            }).eq("id", vm_log_id).execute()
+            await save_vm_log(vm_log_id, {"status": "error"}, output=str(e))
+        if pipeline is adopt_warm_vm:
+            warm_pool.give_back(target, req.box_name, req.cpus, req.memory)
+        elif pipeline is provision_vm and not existing_workspace:
+            workspace_allocator.release(target)
+        elif pipeline is provision_remote_vm and not existing_node:
+            node_registry.unassign(key)
+        raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": "30"})
+
+    return job_accepted(job)
+
+@app.post("/create-vms", status_code=status.HTTP_202_ACCEPTED)
+async def create_vms(req: VMBatchRequest, current_user: dict = Depends(verify_token)):
+    """Create several VMs from one batch terraform config, booting them in parallel"""
+    email = current_user["email"]
+    names = [vm.vm_name for vm in req.vms]
+    if not names:
+        raise HTTPException(status_code=400, detail="No VMs given")
+    if len(names) > BATCH_MAX_VMS:
+        raise HTTPException(status_code=400, detail=f"At most {BATCH_MAX_VMS} VMs per batch")
+    if len(set(names)) != len(names):
+        raise HTTPException(status_code=400, detail="VM names in a batch must be unique")
+    # Batches share one terraform config, so they are always built on this host
+    if node_registry.local is None:
+        raise HTTPException(status_code=400, detail="Batch creation needs LOCAL_NODE; create the VMs one by one")
+    existing = [name for name in names
+                if workspace_allocator.find(email, name) or node_registry.node_for(workspace_allocator.key_for(email, name))]
+    if existing:
+        raise HTTPException(status_code=409, detail=f"VMs already exist: {', '.join(existing)}")
+    parallelism = max(1, min(req.parallelism or BATCH_PARALLELISM, BATCH_PARALLELISM))
+    try:
+        for vm in req.vms:
+            scheduler.check(vm.cpus, vm.memory)
+        # The whole batch is admitted at once, so it has to fit on the host as a whole
+        scheduler.check(sum(vm.cpus for vm in req.vms), sum(vm.memory for vm in req.vms))
+    except CapacityError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    workspaces = []
+    try:
+        for vm in req.vms:
+            workspaces.append(workspace_allocator.acquire(email, vm.vm_name))
+    except IPPoolExhaustedError as e:
+        for workspace in workspaces:
+            workspace_allocator.release(workspace)
+        raise HTTPException(status_code=503, detail=str(e))
+    batch_dir = workspace_allocator.create_batch(workspaces)
+    print(f"Batch of {len(workspaces)} VMs in {batch_dir}, {parallelism} at a time")
+
+    #Create every VM log entry in one insert
+    created_at = datetime.now(timezone.utc).isoformat()
+    rows = await db.insert_vm_logs([{
+        "user_email": email,
+        "box_name": vm.box_name,
+        "vm_name": vm.vm_name,
+        "cpus": vm.cpus,
+        "memory": vm.memory,
+        "tags": vm.tags,
+        "linked_clone": wants_linked_clone(vm),
+        "status": "pending",
+        "created_at": created_at
+    } for vm in req.vms])
+    log_ids = {row["vm_name"]: row["id"] for row in rows}
+    vm_log_ids = [log_ids.get(name) for name in names]
 
-        return {
-            "message": "🎉 VM created and provisioned successfully.",
-            "terraform_init": init_output,
-            "terraform_apply": apply_output,
-            "vm_log_id":vm_log_id
-        }
+    try:
+        job = submit_job(
+            "create-vms", email,
+            lambda job: provision_batch(job, req.vms, workspaces, vm_log_ids, batch_dir, parallelism),
+            payload=req.dict(),
+            resources={workspace.key: (vm.cpus, vm.memory) for vm, workspace in zip(req.vms, workspaces)}
+        )
+    except (QueueFullError, SchedulerFullError) as e:
+        await db.update_vm_logs(list(log_ids.values()), {"status": "error"})
+        for workspace in workspaces:
+            workspace_allocator.release(workspace)
+        workspace_allocator.release_batch(batch_dir)
+        raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": "30"})
 
-    except Exception as e:
-        
-        if vm_log_id:
-            supabase.table("vm_creation_logs").update({
-                "status": "error",
-                "terraform_output": str(e)
-            }).eq("id", vm_log_id).execute()
-        traceback.print_exc()
-        raise HTTPException(status_code=500, detail=str(e))
+    return {**job_accepted(job), "vm_log_ids": vm_log_ids}
 
-@app.post("/destroy-vm")
+@app.post("/destroy-vm", status_code=status.HTTP_202_ACCEPTED)
 def destroy_vm(req: VMDestroyRequest, current_user: dict = Depends(verify_token)):
     print("Received VM destruction request:", req)
     print("Authenticated user:", current_user)
 
-    terraform_dir = r"C:\Users\Arin Raut\v-t-vm"
-    vagrant_dir = os.path.join(terraform_dir, "vagrant")
+    workspace = workspace_allocator.find(current_user["email"], req.vm_name)
+    pipeline = lambda job: destroy_vm_job(job, req, workspace)
+    if not workspace:
+        node = node_registry.node_for(workspace_allocator.key_for(current_user["email"], req.vm_name))
+        if not node:
+            raise HTTPException(status_code=404, detail=f"No workspace found for VM '{req.vm_name}'")
+        pipeline = lambda job: destroy_remote_vm(job, req, node)
 
     try:
-        # Step 1: Terraform Destroy
-        print("Running terraform destroy...")
-        destroy_output = run_command("terraform destroy -auto-approve", cwd=terraform_dir)
-        print("Terraform destroy complete.\n", destroy_output)
+        job = submit_job(
+            "destroy-vm", current_user["email"],
+            pipeline,
+            payload=req.dict()
+        )
+    except QueueFullError as e:
+        raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": "30"})
+
+    return job_accepted(job)
+
+@app.get("/warm-pool")
+def get_warm_pool(current_user: dict = Depends(verify_token)):
+    """Warm pool occupancy, hit rate and refill lag"""
+    return warm_pool.stats()
+
+@app.get("/host-capacity")
+def get_host_capacity(current_user: dict = Depends(verify_token)):
+    """Reserved and free vCPUs/RAM on the host and the requests waiting for capacity"""
+    return scheduler.stats()
+
+@app.post("/nodes/register")
+def register_node(req: NodeRegistration, request: Request):
+    """Register a provisioning agent, or refresh its heartbeat and capacity"""
+    if not nodes.NODE_TOKEN:
+        raise HTTPException(status_code=403, detail="Remote nodes are disabled: set NODE_TOKEN to accept agents")
+    if not nodes.authorized(request.headers):
+        raise HTTPException(status_code=401, detail="Invalid node token")
+    try:
+        node = node_registry.register(req.node_id, req.url, req.cpus, req.memory_mb)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return {"node_id": node.id, "heartbeat_timeout": nodes.NODE_HEARTBEAT_TIMEOUT}
+
+@app.get("/nodes")
+def list_nodes(current_user: dict = Depends(verify_token)):
+    """Provisioning hosts with their capacity, utilisation, waiting requests and placed VMs"""
+    return node_registry.stats()
+
+@app.get("/golden-images")
+def get_golden_images(current_user: dict = Depends(verify_token)):
+    """Cached golden boxes and their usage"""
+    return golden_images.images()
+
+@app.get("/linked-clones")
+def get_linked_clones(current_user: dict = Depends(verify_token)):
+    """Linked clones per box master snapshot and the disk space they saved"""
+    return linked_clones.stats()
+
+@app.get("/cache-stats")
+def get_cache_stats(current_user: dict = Depends(verify_token)):
+    """Hit/miss counters for the in-process user and token caches, password hashing load and the VM state index"""
+    return {"users": db.user_cache.stats(), "tokens": token_verifier.stats(), "passwords": password_hasher.stats(),
+            "vm_states": reconciler.stats()}
+
+@app.get("/outbox")
+def get_outbox(current_user: dict = Depends(verify_token)):
+    """Mail outbox depth, delivery counters and SMTP connection reuse"""
+    return mail_outbox.stats()
+
+@app.get("/db-round-trips")
+def get_db_round_trips(current_user: dict = Depends(verify_token)):
+    """Supabase round trips per endpoint: totals, average, worst and most recent request"""
+    return {
+        endpoint: {**stats, "avg": round(stats["round_trips"] / stats["requests"], 2)}
+        for endpoint, stats in sorted(db_round_trips.items())
+    }
 
-        return {
-            "message": "🗑️ VM destroyed successfully.",
-            "terraform_destroy": destroy_output
-        }
-    except Exception as e:
-        traceback.print_exc()
-        raise HTTPException(status_code=500, detail=str(e))
+def vm_status(entry):
+    return {
+        "vm_name": entry["vm_name"],
+        "vm_log_id": entry["log_id"],
+        "state": entry["state"],
+        "provider": entry["provider"],
+        "machine_id": entry["machine_id"],
+        "changed_at": entry["changed_at"],
+    }
+
+@app.get("/vms")
+def list_vms(current_user: dict = Depends(verify_token)):
+    """Live state of the user's VMs, served from the reconciler's index"""
+    return {
+        "vms": [vm_status(entry) for entry in reconciler.for_user(current_user["email"])],
+        "polled_at": reconciler.last_poll,
+    }
+
+@app.get("/vms/{vm_name}")
+def get_vm(vm_name: str, current_user: dict = Depends(verify_token)):
+    """Live state of one VM, served from the reconciler's index"""
+    entry = reconciler.get(current_user["email"], vm_name)
+    if not entry:
+        raise remote_vm_error(current_user["email"], vm_name) or HTTPException(
+            status_code=404, detail=f"VM '{vm_name}' not found")
+    return {**vm_status(entry), "polled_at": reconciler.last_poll}
+
+metrics.Gauge("vm_jobs_running", "Provisioning jobs running now", fn=lambda: job_queue.stats()["running"])
+metrics.Gauge("vm_jobs_queued", "Provisioning jobs waiting for a worker", fn=lambda: job_queue.stats()["queued"])
+metrics.Gauge("vm_jobs_waiting_capacity", "Provisioning jobs waiting for host capacity", fn=lambda: job_queue.stats()["waiting"])
+metrics.Gauge("host_cpus_reserved", "vCPUs reserved by VMs per provisioning node", labels=("node",),
+              fn=lambda: {(node["id"],): node["reserved"]["cpus"] for node in node_registry.stats()["nodes"]})
+metrics.Gauge("host_memory_reserved_mb", "RAM reserved by VMs per provisioning node", labels=("node",),
+              fn=lambda: {(node["id"],): node["reserved"]["memory_mb"] for node in node_registry.stats()["nodes"]})
+metrics.Gauge("nodes_alive", "Provisioning nodes taking new VMs",
+              fn=lambda: sum(node["alive"] for node in node_registry.stats()["nodes"]))
+metrics.Gauge("linked_clones", "VMs running as linked clones of a box master", fn=lambda: linked_clones.stats()["clones"])
+metrics.Gauge("linked_clone_disk_saved_bytes", "Disk space linked clones did not copy from their box",
+              fn=lambda: linked_clones.stats()["saved_bytes"])
+metrics.Gauge("mail_outbox_queued", "Emails waiting in the outbox", fn=lambda: mail_outbox.stats()["queued"])
+metrics.Gauge("password_hashes_pending", "bcrypt hashes queued or running", fn=lambda: password_hasher.stats()["pending"])
+metrics.Gauge("vm_states", "Tracked VMs by reconciled state", labels=("state",),
+              fn=lambda: {(state,): count for state, count in reconciler.stats()["states"].items()})
+
+@app.get("/metrics")
+def get_metrics(request: Request):
+    """Prometheus text exposition of request, job phase, subprocess and Supabase metrics"""
+    if metrics.METRICS_TOKEN and request.headers.get("authorization") != f"Bearer {metrics.METRICS_TOKEN}":
+        raise HTTPException(status_code=401, detail="Invalid metrics token")
+    return Response(content=metrics.render(), media_type=metrics.CONTENT_TYPE)
+
+@app.get("/jobs/{job_id}")
+def get_job(job_id: str, current_user: dict = Depends(verify_token)):
+    """Report the progress of a queued provisioning job"""
+    job = job_queue.get(job_id)
+    if not job or job.user_email != current_user["email"]:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job.to_dict()
+
+@app.get("/jobs/{job_id}/stream")
+def stream_job(job_id: str, current_user: dict = Depends(verify_token)):
+    """Server-sent events feed of a job's terraform/vagrant output"""
+    job = job_queue.get(job_id)
+    if not job or job.user_email != current_user["email"]:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return StreamingResponse(sse_events(stream_key(job)), media_type="text/event-stream")
 
 @app.post("/ssh-into-vm")
 def ssh_vm(request: SSHRequest, current_user: dict = Depends(verify_token)):
     print("SSH request from user:", current_user)
-    terraform_dir = r"C:\Users\Arin Raut\v-t-vm"
-    vagrant_dir = os.path.join(terraform_dir, "vagrant")
+    vm_ip = request.vm_ip
+    vagrant_dir = os.path.join(workspace_allocator.root, "vagrant")
+    if request.vm_name:
+        workspace = workspace_allocator.find(current_user["email"], request.vm_name)
+        if not workspace:
+            raise remote_vm_error(current_user["email"], request.vm_name) or HTTPException(
+                status_code=404, detail=f"No workspace found for VM '{request.vm_name}'")
+        vm_ip = workspace.ip
+        vagrant_dir = workspace.vagrant_dir
 
     try:
-        output = ssh_into_vagrant_vm(request.vm_ip, vagrant_dir)
+        output = ssh_into_vagrant_vm(vm_ip, vagrant_dir)
         return {
             "message": "SSH successful!",
             "output": output
@@ -745,6 +1840,132 @@ def ssh_vm(request: SSHRequest, current_user: dict = Depends(verify_token)):
         traceback.print_exc()
         raise HTTPException(status_code=500, detail=str(e))
 
+async def stream_lines(run):
+    """Run run(on_line) in a worker thread, yielding its lines as they arrive, then its return value"""
+    loop = asyncio.get_running_loop()
+    lines = asyncio.Queue()
+    future = loop.run_in_executor(None, run, lambda line: loop.call_soon_threadsafe(lines.put_nowait, line))
+    future.add_done_callback(lambda _: lines.put_nowait(None))
+    while True:
+        line = await lines.get()
+        if line is None:
+            break
+        yield line
+    yield await future
+
+@app.post("/vms/{vm_name}/exec")
+async def exec_on_vm(vm_name: str, req: VMExecRequest, current_user: dict = Depends(verify_token)):
+    """Run a command on one of the user's VMs over its pooled SSH session"""
+    workspace = workspace_allocator.find(current_user["email"], vm_name)
+    if not workspace:
+        raise remote_vm_error(current_user["email"], vm_name) or HTTPException(
+            status_code=404, detail=f"No workspace found for VM '{vm_name}'")
+    try:
+        key_path = vagrant_private_key(workspace.vagrant_dir)
+    except FileNotFoundError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+
+    def run(on_line=None):
+        started = time.time()
+        exit_code, output = ssh_pool.run(workspace.ip, key_path, req.command, timeout=req.timeout, on_line=on_line)
+        return {"exit_code": exit_code, "output": output, "duration_ms": round((time.time() - started) * 1000, 1)}
+
+    if req.stream:
+        async def events():
+            # Output lines as data events, then one `exit` event carrying the exit code
+            try:
+                async for item in stream_lines(run):
+                    if isinstance(item, dict):
+                        yield f"event: exit\ndata: {item['exit_code']}\n\n"
+                    else:
+                        yield f"data: {item}\n\n"
+            except SSHCommandTimeout as e:
+                yield f"event: error\ndata: {e}\n\n"
+            except Exception as e:
+                traceback.print_exc()
+                yield f"event: error\ndata: {e}\n\n"
+        return StreamingResponse(events(), media_type="text/event-stream")
+
+    try:
+        return await run_in_threadpool(run)
+    except SSHCommandTimeout as e:
+        raise HTTPException(status_code=504, detail=str(e))
+    except Exception as e:
+        traceback.print_exc()
+        raise HTTPException(status_code=500, detail=str(e))
+
+async def resolve_fleet(user_email: str, ids: Optional[List[str]], tags: Optional[List[str]]):
+    """(targets, unreachable) for the user's VMs picked by ids/tags; one target per VM name"""
+    rows = await db.list_fleet_vms(user_email, ids=ids, tags=tags)
+    targets, unreachable, seen = [], [], set()
+    for row in rows:
+        # Recreated VMs leave older rows behind; the newest one describes the live VM
+        if row["vm_name"] in seen:
+            continue
+        seen.add(row["vm_name"])
+        host = {"id": row["id"], "vm_name": row["vm_name"], "tags": row.get("tags") or []}
+        workspace = workspace_allocator.find(user_email, row["vm_name"])
+        try:
+            if not workspace:
+                remote = remote_vm_error(user_email, row["vm_name"])
+                raise FileNotFoundError(remote.detail if remote else f"No workspace found for VM '{row['vm_name']}'")
+            host["key_path"] = vagrant_private_key(workspace.vagrant_dir)
+            host["ip"] = workspace.ip or row.get("ip_address")
+            targets.append(host)
+        except FileNotFoundError as e:
+            unreachable.append((host, {"status": "unreachable", "exit_code": None, "error": str(e), "duration_ms": 0}))
+    return targets, unreachable
+
+def fleet_result(host, result):
+    return {"id": host["id"], "vm_name": host["vm_name"], "ip": host.get("ip"), **result}
+
+@app.post("/vms/exec")
+async def exec_on_fleet(req: FleetExecRequest, current_user: dict = Depends(verify_token)):
+    """Run a command on several of the user's VMs at once, picked by ids and/or tags"""
+    if not req.ids and not req.tags:
+        raise HTTPException(status_code=400, detail="Give ids or tags to pick the VMs")
+    try:
+        ids = [str(uuid.UUID(i)) for i in req.ids or []]
+    except ValueError:
+        raise HTTPException(status_code=400, detail="ids must be VM log UUIDs")
+
+    started = time.time()
+    try:
+        targets, unreachable = await resolve_fleet(current_user["email"], ids, req.tags)
+    except Exception as e:
+        traceback.print_exc()
+        raise HTTPException(status_code=500, detail=str(e))
+    if not targets and not unreachable:
+        raise HTTPException(status_code=404, detail="No running VMs match")
+    if len(targets) + len(unreachable) > fleet.FLEET_MAX_HOSTS:
+        raise HTTPException(status_code=400, detail=f"At most {fleet.FLEET_MAX_HOSTS} VMs per fleet command")
+
+    def run_one(host):
+        return ssh_pool.run(host["ip"], host["key_path"], req.command, timeout=req.timeout)
+
+    async def results():
+        for host, result in unreachable:
+            yield fleet_result(host, result)
+        async for host, result in fleet.fan_out(targets, run_one, req.concurrency):
+            yield fleet_result(host, result)
+
+    if req.stream:
+        async def events():
+            collected = []
+            async for result in results():
+                collected.append(result)
+                yield f"event: result\ndata: {json.dumps(result)}\n\n"
+            yield f"event: summary\ndata: {json.dumps(fleet.summarize(collected, started))}\n\n"
+        return StreamingResponse(events(), media_type="text/event-stream")
+
+    collected = [result async for result in results()]
+    return {"results": collected, "summary": fleet.summarize(collected, started)}
+
+@app.get("/ssh-sessions")
+def get_ssh_sessions(current_user: dict = Depends(verify_token)):
+    """Pooled SSH sessions and how often they were reused"""
+    return ssh_pool.stats()
+
 if __name__ == "__main__":
     import uvicorn 
     uvicorn.run(app, host="0.0.0.0", port=8000)
\ No newline at end of file
@@ -0,0 +1,195 @@
+import bisect
+import os
+import threading
+import time
+
+# ---Metrics Configuration----
+METRICS_TOKEN = os.getenv("METRICS_TOKEN")  # when set, /metrics wants `Authorization: Bearer <token>`
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+PHASE_BUCKETS = (0.1, 0.5, 1, 5, 10, 30, 60, 120, 300, 600, 1200, 1800)
+CONTENT_TYPE = "text/plain; version=0.0.4"
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _labels(names, values, extra=None):
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _number(value):
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class _Metric:
+    kind = None
+
+    def __init__(self, name, help, labels=()):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labels)
+        self._values = {}  # label values -> value
+        self._lock = threading.Lock()
+        REGISTRY.append(self)
+
+    def _key(self, labels):
+        return tuple(str(labels.get(name, "")) for name in self.labelnames)
+
+    def samples(self):
+        with self._lock:
+            return [(self.name, key, None, value) for key, value in sorted(self._values.items())]
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+        for name, key, extra, value in self.samples():
+            lines.append(f"{name}{_labels(self.labelnames, key, extra)} {_number(value)}")
+        return "\n".join(lines)
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+
+class Gauge(_Metric):
+    """Read at scrape time from fn() -> number or {label values tuple: number}"""
+    kind = "gauge"
+
+    def __init__(self, name, help, fn, labels=()):
+        super().__init__(name, help, labels)
+        self.fn = fn
+
+    def samples(self):
+        values = self.fn()
+        if not isinstance(values, dict):
+            values = {(): values}
+        return [(self.name, key, None, value) for key, value in sorted(values.items())]
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name, help, labels=(), buckets=LATENCY_BUCKETS):
+        super().__init__(name, help, labels)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._values.get(key)
+            if series is None:
+                # per-bucket (not cumulative) counts, the +Inf bucket last, then the sum
+                series = self._values[key] = [0] * (len(self.buckets) + 1) + [0.0]
+            series[index] += 1
+            series[-1] += value
+
+    def samples(self):
+        with self._lock:
+            items = [(key, list(series)) for key, series in sorted(self._values.items())]
+        samples = []
+        for key, series in items:
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), series):
+                cumulative += count
+                samples.append((f"{self.name}_bucket", key, f'le="{_number(bound)}"', cumulative))
+            samples.append((f"{self.name}_sum", key, None, round(series[-1], 6)))
+            samples.append((f"{self.name}_count", key, None, cumulative))
+        return samples
+
+
+REGISTRY = []
+
+
+def render():
+    """Every registered metric in the Prometheus text exposition format"""
+    return "\n".join(metric.render() for metric in REGISTRY) + "\n"
+
+
+# ---Metrics---
+
+HTTP_REQUEST_SECONDS = Histogram(
+    "http_request_duration_seconds", "API request latency by route template",
+    labels=("method", "route", "status"))
+JOB_PHASE_SECONDS = Histogram(
+    "vm_job_phase_duration_seconds", "Provisioning job phase duration",
+    labels=("kind", "phase", "outcome"), buckets=PHASE_BUCKETS)
+VAGRANT_STAGE_SECONDS = Histogram(
+    "vagrant_stage_duration_seconds", "vagrant up stages per machine: box import, boot, guest configuration, provisioning",
+    labels=("stage",), buckets=PHASE_BUCKETS)
+SUBPROCESS_SECONDS = Histogram(
+    "subprocess_duration_seconds", "terraform/vagrant command duration",
+    labels=("command",), buckets=PHASE_BUCKETS)
+SUBPROCESS_EXITS = Counter(
+    "subprocess_exits_total", "terraform/vagrant commands by exit code", labels=("command", "exit_code"))
+SUBPROCESS_FAILURES = Counter(
+    "subprocess_failures_total", "terraform/vagrant commands exiting outside their accepted codes", labels=("command",))
+DB_REQUEST_SECONDS = Histogram(
+    "supabase_request_duration_seconds", "PostgREST call latency", labels=("table", "op"))
+DB_ERRORS = Counter(
+    "supabase_errors_total", "PostgREST calls that failed or answered 4xx/5xx", labels=("table", "op"))
+
+
+def command_name(command):
+    """Low-cardinality label for a shell command: the program and its subcommand"""
+    words = command.split()
+    name = words[:1]
+    for word in words[1:]:
+        if not word.startswith("-"):
+            name.append(word)
+            break
+    return " ".join(name)
+
+
+# Output markers that start each stage of `vagrant up`
+VAGRANT_STAGES = (
+    ("Importing base box", "import_box"),
+    ("Booting VM", "boot"),
+    ("Machine booted and ready", "configure"),
+    ("Running provisioner", "provision"),
+)
+
+
+class VagrantStageTimer:
+    """Times `vagrant up` stages from output lines, also when terraform interleaves several machines.
+
+    Terraform prefixes local-exec output with the resource address, which is
+    what keeps machines in a batch apply apart; a machine's last stage ends
+    at its `Creation complete` line or when the command exits.
+    """
+
+    def __init__(self):
+        self._open = {}  # machine -> (stage, started)
+
+    def feed(self, line):
+        if "Creation complete" in line:
+            self._close(line.split(": Creation complete", 1)[0], time.monotonic())
+            return
+        for marker, stage in VAGRANT_STAGES:
+            if marker in line:
+                machine = line.split(" (local-exec)", 1)[0] if " (local-exec)" in line else ""
+                now = time.monotonic()
+                self._close(machine, now)
+                self._open[machine] = (stage, now)
+                return
+
+    def finish(self):
+        now = time.monotonic()
+        for machine in list(self._open):
+            self._close(machine, now)
+
+    def _close(self, machine, now):
+        opened = self._open.pop(machine, None)
+        if opened:
+            stage, started = opened
+            VAGRANT_STAGE_SECONDS.observe(now - started, stage=stage)
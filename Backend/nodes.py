@@ -0,0 +1,219 @@
+import hmac
+import json
+import os
+import re
+import threading
+import time
+
+import httpx
+
+from scheduler import CapacityError, HostScheduler
+
+# ---Node Configuration----
+NODE_TOKEN = os.getenv("NODE_TOKEN")  # shared by controller and agents, sent as `Authorization: Bearer <token>`; required for remote nodes
+NODE_HEARTBEAT_TIMEOUT = float(os.getenv("NODE_HEARTBEAT_TIMEOUT", "60"))  # seconds before a silent agent gets no new VMs
+NODE_CONNECT_TIMEOUT = float(os.getenv("NODE_CONNECT_TIMEOUT", "10"))
+LOCAL_NODE = os.getenv("LOCAL_NODE", "true").lower() != "false"  # also build VMs on the API host itself
+LOCAL_NODE_ID = "local"
+
+
+class NoNodeError(Exception):
+    pass
+
+
+def node_headers():
+    return {"Authorization": f"Bearer {NODE_TOKEN}"} if NODE_TOKEN else {}
+
+
+def authorized(request_headers):
+    """Whether a controller/agent request carries the shared node token; always False without one"""
+    if not NODE_TOKEN:
+        return False
+    presented = request_headers.get("authorization", "").encode("utf-8")
+    return hmac.compare_digest(presented, f"Bearer {NODE_TOKEN}".encode("utf-8"))
+
+
+def require_token(role):
+    """Refuse to run as controller or agent without NODE_TOKEN: node requests carry owners' VM builds"""
+    if not NODE_TOKEN:
+        raise RuntimeError(f"NODE_TOKEN must be set to run as {role}")
+
+
+class Node:
+    """A hypervisor host: the API host itself (url None) or a registered agent"""
+
+    def __init__(self, node_id, url, scheduler):
+        self.id = node_id
+        self.url = url
+        self.scheduler = scheduler
+        self.last_seen = time.time()
+
+    @property
+    def is_local(self):
+        return self.url is None
+
+    def alive(self):
+        return self.is_local or time.time() - self.last_seen <= NODE_HEARTBEAT_TIMEOUT
+
+    def to_dict(self):
+        return {
+            "id": self.id,
+            "url": self.url,
+            "alive": self.alive(),
+            "last_seen_age": None if self.is_local else round(time.time() - self.last_seen, 1),
+            **self.scheduler.stats(),
+        }
+
+
+class NodeRegistry:
+    """Hosts VMs can be built on, and which host each remote VM was placed on.
+
+    Agents register their capacity and re-register as a heartbeat. Each node
+    gets its own HostScheduler, so reservations, waiting requests and
+    utilisation are tracked per host; placements (workspace key -> node id)
+    are persisted so destroys still find their host after a restart.
+    """
+
+    def __init__(self, local_scheduler=None, state_dir=None):
+        self.state_dir = state_dir
+        self._lock = threading.Lock()
+        self._nodes = {}
+        self.local = None
+        if local_scheduler is not None:
+            self.local = self._nodes[LOCAL_NODE_ID] = Node(LOCAL_NODE_ID, None, local_scheduler)
+        self._placements = {}
+        self._load()
+
+    def register(self, node_id, url, cpus, memory_mb):
+        """Add an agent or refresh its heartbeat and capacity"""
+        if node_id == LOCAL_NODE_ID or not re.fullmatch(r"[A-Za-z0-9_.-]+", node_id):
+            raise ValueError(f"Invalid node id '{node_id}'")
+        with self._lock:
+            node = self._nodes.get(node_id)
+            if node is None:
+                state_file = os.path.join(self.state_dir, "nodes", f"{node_id}.json") if self.state_dir else None
+                node = self._nodes[node_id] = Node(node_id, url, HostScheduler(
+                    cpus, memory_mb, overcommit=1, reserved_memory_mb=0, state_file=state_file))
+                print(f"Node {node_id} registered at {url} ({cpus} vCPUs / {memory_mb} MB)")
+            node.url = url
+            node.last_seen = time.time()
+        if (node.scheduler.cpu_capacity, node.scheduler.memory_capacity) != (cpus, memory_mb):
+            node.scheduler.resize(cpus, memory_mb)
+        return node
+
+    def get(self, node_id):
+        with self._lock:
+            return self._nodes.get(node_id)
+
+    def check(self, cpus, memory):
+        """Raise CapacityError for a size no live node could ever run, NoNodeError when there is no node"""
+        nodes = self._alive()
+        if not nodes:
+            raise NoNodeError("No provisioning node is available")
+        fits = [n for n in nodes if cpus <= n.scheduler.cpu_capacity and memory <= n.scheduler.memory_capacity]
+        if not fits and len(nodes) > 1:
+            raise CapacityError(f"{cpus} vCPUs / {memory} MB exceeds the capacity of every node")
+        (fits or nodes)[0].scheduler.check(cpus, memory)
+
+    def place(self, key, cpus, memory):
+        """Pick the node for a VM: where it already lives, else best fit on free vCPUs and RAM.
+
+        Best fit is the node left with the least spare capacity after the VM,
+        which keeps large holes free for large VMs. When no node has room
+        now, the VM queues on the node with the fewest waiting requests.
+        """
+        with self._lock:
+            node = self._nodes.get(self._placements.get(key))
+        if node is not None:
+            return node
+        self.check(cpus, memory)
+        candidates = [n for n in self._alive()
+                      if cpus <= n.scheduler.cpu_capacity and memory <= n.scheduler.memory_capacity]
+        fitting = []
+        for n in candidates:
+            if n.scheduler.can_admit(cpus, memory):
+                free_cpus, free_memory = n.scheduler.free()
+                spare = ((free_cpus - cpus) / n.scheduler.cpu_capacity
+                         + (free_memory - memory) / n.scheduler.memory_capacity)
+                fitting.append((spare, n.id, n))
+        if fitting:
+            return min(fitting)[2]
+        return min(candidates, key=lambda n: (n.scheduler.stats()["waiting"], n.id))
+
+    def assign(self, key, node_id):
+        with self._lock:
+            if self._placements.get(key) != node_id:
+                self._placements[key] = node_id
+                self._save()
+
+    def node_for(self, key):
+        """Remote node a VM was placed on, or None"""
+        with self._lock:
+            return self._nodes.get(self._placements.get(key))
+
+    def is_remote(self, key):
+        """Whether a VM was placed on an agent, even one that has not re-registered since a restart"""
+        with self._lock:
+            return self._placements.get(key, LOCAL_NODE_ID) != LOCAL_NODE_ID
+
+    def unassign(self, key):
+        with self._lock:
+            if self._placements.pop(key, None) is not None:
+                self._save()
+
+    def stats(self):
+        with self._lock:
+            nodes = list(self._nodes.values())
+            placements = {}
+            for node_id in self._placements.values():
+                placements[node_id] = placements.get(node_id, 0) + 1
+        return {"nodes": [{**node.to_dict(), "placed_vms": placements.get(node.id, 0)} for node in nodes]}
+
+    def _alive(self):
+        with self._lock:
+            return [node for node in self._nodes.values() if node.alive()]
+
+    def _load(self):
+        path = self._placements_file()
+        if not path or not os.path.exists(path):
+            return
+        with open(path) as f:
+            self._placements = json.load(f)
+
+    def _save(self):
+        path = self._placements_file()
+        if not path:
+            return
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = path + ".tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(self._placements, f, indent=2)
+        os.replace(tmp_path, path)
+
+    def _placements_file(self):
+        return os.path.join(self.state_dir, "nodes", "placements.json") if self.state_dir else None
+
+
+def call_agent(node, path, payload, on_entry):
+    """POST to an agent and feed its streamed job log entries to on_entry; returns the agent's result.
+
+    Agents answer with one JSON object per line: {"entry": <job log entry>}
+    while the pipeline runs, then {"result": ...} or {"error": ...}.
+    """
+    timeout = httpx.Timeout(NODE_CONNECT_TIMEOUT, read=None)  # a vagrant up can be silent for minutes
+    with httpx.stream("POST", f"{node.url.rstrip('/')}{path}", json=payload, headers=node_headers(),
+                      timeout=timeout) as response:
+        if response.status_code >= 400:
+            response.read()
+            raise RuntimeError(f"Node {node.id} answered {response.status_code}: {response.text}")
+        for line in response.iter_lines():
+            if not line:
+                continue
+            event = json.loads(line)
+            if "entry" in event:
+                on_entry(event["entry"])
+            elif "error" in event:
+                raise RuntimeError(f"Node {node.id}: {event['error']}")
+            elif "result" in event:
+                return event["result"]
+    raise RuntimeError(f"Node {node.id} closed the connection before finishing")
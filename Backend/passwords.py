@@ -0,0 +1,90 @@
+import asyncio
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import bcrypt
+
+# ---Password Hashing Configuration----
+PASSWORD_HASH_WORKERS = int(os.getenv("PASSWORD_HASH_WORKERS", str(min(os.cpu_count() or 2, 4))))
+# Hashes running or queued before new ones are turned away with 503
+PASSWORD_HASH_QUEUE = int(os.getenv("PASSWORD_HASH_QUEUE", str(PASSWORD_HASH_WORKERS * 4)))
+BCRYPT_ROUNDS = int(os.getenv("BCRYPT_ROUNDS", "12"))
+PASSWORD_RETRY_AFTER = int(os.getenv("PASSWORD_RETRY_AFTER", "2"))  # seconds
+
+
+class HashingSaturatedError(Exception):
+    pass
+
+
+# These run inside the worker processes, so they must stay importable module-level functions
+
+def hash_password(password: str, rounds: int = BCRYPT_ROUNDS) -> str:
+    return bcrypt.hashpw(password.encode('utf-8'), bcrypt.gensalt(rounds)).decode('utf-8')
+
+
+def verify_password(password: str, hashed: str) -> bool:
+    return bcrypt.checkpw(password.encode('utf-8'), hashed.encode('utf-8'))
+
+
+def hash_cost(hashed: str) -> int:
+    # "$2b$12$<salt+hash>" -> 12
+    return int(hashed.split("$")[2])
+
+
+class PasswordHasher:
+    """Runs bcrypt on a dedicated process pool with a bounded queue.
+
+    Keeps password hashing off the event loop and the shared threadpool; once
+    `max_pending` hashes are in flight further calls fail fast with
+    HashingSaturatedError instead of queueing behind a login storm.
+    """
+
+    def __init__(self, workers=PASSWORD_HASH_WORKERS, max_pending=PASSWORD_HASH_QUEUE, rounds=BCRYPT_ROUNDS):
+        self.workers = workers
+        self.max_pending = max_pending
+        self.rounds = rounds
+        self._executor = None
+        self._pending = 0
+        self.rejected = 0
+
+    def start(self):
+        if self._executor is None:
+            self._executor = ProcessPoolExecutor(max_workers=self.workers)
+
+    def shutdown(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+    async def hash(self, password):
+        return await self._submit(hash_password, password, self.rounds)
+
+    async def verify(self, password, hashed):
+        return await self._submit(verify_password, password, hashed)
+
+    def needs_rehash(self, hashed):
+        try:
+            return hash_cost(hashed) != self.rounds
+        except (IndexError, ValueError):
+            return False
+
+    def stats(self):
+        return {
+            "workers": self.workers,
+            "pending": self._pending,
+            "max_pending": self.max_pending,
+            "rounds": self.rounds,
+            "rejected": self.rejected,
+        }
+
+    async def _submit(self, fn, *args):
+        # Only touched from the event loop thread, so a plain counter is enough
+        if self._pending >= self.max_pending:
+            self.rejected += 1
+            raise HashingSaturatedError("Password hashing is saturated, retry shortly")
+        self.start()
+        self._pending += 1
+        try:
+            return await asyncio.get_running_loop().run_in_executor(self._executor, fn, *args)
+        finally:
+            self._pending -= 1
@@ -0,0 +1,29 @@
+import asyncio
+import os
+
+import repository as db
+
+# ---Auth Row Reaper Configuration----
+REAPER_INTERVAL = float(os.getenv("REAPER_INTERVAL", "300"))  # seconds between runs
+REAPER_BATCH_SIZE = int(os.getenv("REAPER_BATCH_SIZE", "500"))  # rows deleted per statement
+REAPER_MAX_BATCHES = int(os.getenv("REAPER_MAX_BATCHES", "20"))  # per table per run; the rest waits for the next run
+REAPER_BATCH_PAUSE = float(os.getenv("REAPER_BATCH_PAUSE", "0.1"))  # seconds between batches
+REAPED_TABLES = ["verification_codes", "password_resets"]
+
+
+async def reap_table(table):
+    """Delete used/expired rows from table in bounded batches; returns how many went"""
+    deleted = 0
+    for _ in range(REAPER_MAX_BATCHES):
+        count = await db.reap_expired_rows(table, REAPER_BATCH_SIZE)
+        deleted += count
+        if count < REAPER_BATCH_SIZE:
+            break
+        # Short transactions with gaps in between keep lock time and WAL bursts small
+        await asyncio.sleep(REAPER_BATCH_PAUSE)
+    return deleted
+
+
+async def reap_expired():
+    """One reaper pass over every auth table; returns {table: rows deleted}"""
+    return {table: await reap_table(table) for table in REAPED_TABLES}
@@ -0,0 +1,197 @@
+import os
+import threading
+import time
+import traceback
+
+# ---VM Reconciler Configuration----
+VM_RECONCILE_INTERVAL = float(os.getenv("VM_RECONCILE_INTERVAL", "30"))  # seconds between global-status polls
+VM_RECONCILE_MAX_BACKOFF = float(os.getenv("VM_RECONCILE_MAX_BACKOFF", "600"))  # longest wait after failed polls
+# No --prune: it drops VMs whose directory moved (claimed warm VMs), which would read as not_created
+GLOBAL_STATUS_COMMAND = "vagrant global-status --machine-readable"
+
+UNKNOWN_STATE = "unknown"  # tracked, but not polled yet
+GONE_STATE = "not_created"
+
+
+def parse_global_status(lines):
+    """Machines from `vagrant global-status --machine-readable` output lines, keyed by normalised machine home.
+
+    Machine-readable lines are `timestamp,target,type,data...`; each machine
+    starts with a `machine-id` line followed by its provider, home and state.
+    """
+    machines = {}
+    current = None
+    for line in lines:
+        parts = line.split(",", 3)
+        if len(parts) < 4:
+            continue
+        kind, data = parts[2], parts[3].replace("%!(VAGRANT_COMMA)", ",").strip()
+        if kind == "machine-id":
+            current = {"machine_id": data}
+        elif current is None:
+            continue
+        elif kind == "provider-name":
+            current["provider"] = data
+        elif kind == "machine-home":
+            current["home"] = data
+        elif kind == "state":
+            current["state"] = data
+        if current and {"home", "state"} <= current.keys():
+            machines[_normalise(current["home"])] = current
+            current = None
+    return machines
+
+
+def _normalise(path):
+    return os.path.normcase(os.path.normpath(path))
+
+
+class VMReconciler:
+    """In-memory index of live VM states, refreshed from one global-status call per interval.
+
+    VMs are tracked by workspace key with the vm_creation_logs row that
+    describes them. Each poll diffs the new states against the index and
+    hands only the changes to on_changes([(entry, old_state, new_state)]),
+    so the database sees one write per state change rather than per poll.
+    """
+
+    def __init__(self, run_command, allocator, on_changes, interval=VM_RECONCILE_INTERVAL):
+        self.run_command = run_command
+        self.allocator = allocator
+        self.on_changes = on_changes
+        self.interval = interval
+        self._lock = threading.Lock()
+        self._index = {}  # workspace key -> entry
+        self._by_user = {}  # user_email -> {vm_name: workspace key}
+        self._stop = threading.Event()
+        self._thread = None
+        self.last_poll = None
+        self.last_error = None
+        self.failures = 0  # polls failed in a row
+        self.polls = 0
+        self.changes = 0
+
+    def start(self):
+        if self._thread:
+            return
+        self._thread = threading.Thread(target=self._poll_loop, name="vm-reconciler", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+
+    def track(self, user_email, vm_name, log_id, state=UNKNOWN_STATE):
+        """Start following a VM; its newest vm_creation_logs row receives state changes"""
+        key = self.allocator.key_for(user_email, vm_name)
+        with self._lock:
+            entry = self._index.get(key)
+            if entry is None:
+                entry = {"key": key, "user_email": user_email, "vm_name": vm_name, "state": state or UNKNOWN_STATE,
+                         "machine_id": None, "provider": None, "changed_at": None}
+                self._index[key] = entry
+                self._by_user.setdefault(user_email, {})[vm_name] = key
+            entry["log_id"] = log_id
+
+    def load(self, rows, skip=None):
+        """Track VMs from vm_creation_logs rows (newest first); the newest row per VM wins.
+
+        skip(key) returning True leaves out VMs this host does not run, e.g. ones placed on other nodes.
+        """
+        seen = set()
+        for row in rows:
+            key = self.allocator.key_for(row["user_email"], row["vm_name"])
+            if key in seen:
+                continue
+            seen.add(key)
+            if skip and skip(key):
+                continue
+            # Already recorded as destroyed: nothing left to watch
+            if row.get("vm_state") != GONE_STATE:
+                self.track(row["user_email"], row["vm_name"], row["id"], row.get("vm_state"))
+
+    def forget(self, user_email, vm_name):
+        """Stop following a destroyed VM, recording it as gone"""
+        key = self.allocator.key_for(user_email, vm_name)
+        with self._lock:
+            entry = self._index.pop(key, None)
+            self._by_user.get(user_email, {}).pop(vm_name, None)
+        if entry and entry["state"] != GONE_STATE:
+            old_state, entry["state"] = entry["state"], GONE_STATE
+            self.on_changes([(entry, old_state, GONE_STATE)])
+
+    def get(self, user_email, vm_name):
+        with self._lock:
+            entry = self._index.get(self.allocator.key_for(user_email, vm_name))
+            return dict(entry) if entry else None
+
+    def for_user(self, user_email):
+        with self._lock:
+            keys = list(self._by_user.get(user_email, {}).values())
+            return [dict(self._index[key]) for key in keys if key in self._index]
+
+    def poll(self):
+        """One global-status pass; returns the list of (entry, old_state, new_state) it applied"""
+        with self._lock:
+            keys = list(self._index)
+        if not keys:
+            return []  # nothing to match, so no need to run vagrant
+        # Collected line by line: run_command only returns the tail, which a large fleet would overflow
+        lines = []
+        self.run_command(GLOBAL_STATUS_COMMAND, on_line=lines.append)
+        machines = parse_global_status(lines)
+        homes = {key: [_normalise(home) for home in self.allocator.vagrant_homes(key)] for key in keys}
+        changes = []
+        now = time.time()
+        with self._lock:
+            for key, entry in self._index.items():
+                if key not in homes:
+                    continue  # tracked while this poll ran; the next one covers it
+                found = [machines[home] for home in homes[key] if home in machines]
+                machine = found[0] if found else {}
+                state = machine.get("state", GONE_STATE)
+                entry["machine_id"] = machine.get("machine_id")
+                entry["provider"] = machine.get("provider")
+                if state != entry["state"]:
+                    changes.append((entry, entry["state"], state))
+                    entry["state"] = state
+                    entry["changed_at"] = now
+            self.last_poll = now
+            self.polls += 1
+            self.changes += len(changes)
+        if changes:
+            self.on_changes([(dict(entry), old, new) for entry, old, new in changes])
+        return changes
+
+    def stats(self):
+        with self._lock:
+            states = {}
+            for entry in self._index.values():
+                states[entry["state"]] = states.get(entry["state"], 0) + 1
+            return {
+                "tracked": len(self._index),
+                "states": states,
+                "polls": self.polls,
+                "changes": self.changes,
+                "last_poll_age": round(time.time() - self.last_poll, 1) if self.last_poll else None,
+                "last_error": self.last_error,
+                "failures": self.failures,
+            }
+
+    def _poll_loop(self):
+        while not self._stop.is_set():
+            delay = self.interval
+            try:
+                self.poll()
+                if self.failures:
+                    print(f"VM reconciler recovered after {self.failures} failed polls")
+                self.failures = 0
+                self.last_error = None
+            except Exception as e:
+                self.failures += 1
+                self.last_error = str(e)
+                # Only the first failure of a run is logged; the rest back off quietly (see /cache-stats)
+                if self.failures == 1:
+                    print(f"VM reconciler poll failed, backing off: {e}")
+                    traceback.print_exc()
+                delay = min(self.interval * 2 ** self.failures, max(VM_RECONCILE_MAX_BACKOFF, self.interval))
+            self._stop.wait(delay)
@@ -0,0 +1,378 @@
+import asyncio
+import contextvars
+import os
+import time
+from datetime import datetime, timezone
+
+import httpx
+
+from cache import TTLCache
+from metrics import DB_ERRORS, DB_REQUEST_SECONDS
+
+# ---Database Pool Configuration----
+DB_MAX_CONNECTIONS = int(os.getenv("DB_MAX_CONNECTIONS", "50"))
+DB_MAX_KEEPALIVE = int(os.getenv("DB_MAX_KEEPALIVE", "20"))
+DB_KEEPALIVE_EXPIRY = float(os.getenv("DB_KEEPALIVE_EXPIRY", "30"))  # seconds an idle connection is kept
+DB_TIMEOUT = float(os.getenv("DB_TIMEOUT", "10"))
+
+# ---User Cache Configuration----
+USER_CACHE_SIZE = int(os.getenv("USER_CACHE_SIZE", "1000"))  # 0 disables the cache
+USER_CACHE_TTL = float(os.getenv("USER_CACHE_TTL", "60"))  # seconds
+
+
+class RepositoryError(Exception):
+    pass
+
+
+# PostgREST calls made on behalf of the current HTTP request, see count_round_trips()
+_round_trips = contextvars.ContextVar("db_round_trips", default=None)
+
+
+def count_round_trips():
+    """Start counting round trips for the current request; returns a one-item list holding the count"""
+    counter = [0]
+    _round_trips.set(counter)
+    return counter
+
+
+class PostgrestClient:
+    """Async PostgREST client sharing one keep-alive connection pool"""
+
+    def __init__(self, url, key, max_connections=DB_MAX_CONNECTIONS, max_keepalive=DB_MAX_KEEPALIVE,
+                 keepalive_expiry=DB_KEEPALIVE_EXPIRY, timeout=DB_TIMEOUT):
+        self._client = httpx.AsyncClient(
+            base_url=f"{url.rstrip('/')}/rest/v1",
+            headers={
+                "apikey": key,
+                "Authorization": f"Bearer {key}",
+                "Content-Type": "application/json",
+            },
+            limits=httpx.Limits(
+                max_connections=max_connections,
+                max_keepalive_connections=max_keepalive,
+                keepalive_expiry=keepalive_expiry,
+            ),
+            timeout=timeout,
+        )
+
+    async def close(self):
+        await self._client.aclose()
+
+    async def select(self, table, filters=None, columns="*", order=None, desc=False, limit=None):
+        params = _filter_params(filters)
+        params["select"] = columns
+        if order:
+            # order may name several columns ("created_at,id") to get a stable sort for keyset paging
+            direction = 'desc' if desc else 'asc'
+            params["order"] = ",".join(f"{column}.{direction}" for column in order.split(","))
+        if limit is not None:
+            params["limit"] = str(limit)
+        return await self._request("GET", table, params=params)
+
+    async def insert(self, table, rows):
+        return await self._request("POST", table, json=rows, prefer="return=representation")
+
+    async def rpc(self, function, params):
+        """Call a Postgres function exposed by PostgREST"""
+        return await self._request("POST", f"rpc/{function}", json=params)
+
+    async def update(self, table, values, filters):
+        return await self._request("PATCH", table, params=_filter_params(filters), json=values,
+                                   prefer="return=representation")
+
+    async def delete(self, table, filters, returning=True):
+        return await self._request("DELETE", table, params=_filter_params(filters),
+                                   prefer="return=representation" if returning else "return=minimal")
+
+    async def _request(self, method, table, params=None, json=None, prefer=None):
+        counter = _round_trips.get()
+        if counter is not None:
+            counter[0] += 1
+        headers = {"Prefer": prefer} if prefer else None
+        name, op = (table[4:], "rpc") if table.startswith("rpc/") else (table, _OPERATIONS[method])
+        started = time.perf_counter()
+        try:
+            response = await self._client.request(method, f"/{table}", params=params, json=json, headers=headers)
+        except httpx.HTTPError:
+            DB_ERRORS.inc(table=name, op=op)
+            raise
+        finally:
+            DB_REQUEST_SECONDS.observe(time.perf_counter() - started, table=name, op=op)
+        if response.status_code >= 400:
+            DB_ERRORS.inc(table=name, op=op)
+            raise RepositoryError(f"{method} {table} failed ({response.status_code}): {response.text}")
+        if not response.content:
+            return []
+        return response.json()
+
+
+_OPERATIONS = {"GET": "select", "POST": "insert", "PATCH": "update", "DELETE": "delete"}
+
+
+def _filter_params(filters):
+    # {"email": "a@b"} -> email=eq.a@b; {"created_at": ("lt", x)} -> created_at=lt.x
+    params = {}
+    for column, value in (filters or {}).items():
+        if column in ("or", "and"):
+            # Logical groups are passed through as-is: {"or": "(a.lt.1,b.eq.2)"}
+            params[column] = value
+            continue
+        op, value = value if isinstance(value, tuple) else ("eq", value)
+        if isinstance(value, bool):
+            value = str(value).lower()
+        params[column] = f"{op}.{value}"
+    return params
+
+
+_client = None
+_loop = None
+
+
+def init_client(url, key):
+    """Create the shared client; call from the app's startup so it binds to the running loop"""
+    global _client, _loop
+    _client = PostgrestClient(url, key)
+    _loop = asyncio.get_running_loop()
+
+
+async def close_client():
+    global _client
+    if _client is not None:
+        await _client.close()
+        _client = None
+
+
+def client():
+    if _client is None:
+        raise RepositoryError("Database client is not initialised")
+    return _client
+
+
+def run_sync(coro):
+    """Run a repository coroutine from a worker thread on the app's event loop"""
+    if _loop is None:
+        raise RepositoryError("Database client is not initialised")
+    return asyncio.run_coroutine_threadsafe(coro, _loop).result()
+
+
+def _first(rows):
+    return rows[0] if rows else None
+
+
+# ---users---
+
+# Users keyed by ("email", email); writes below keep it current.
+# Rows are cached without password_hash, which login reads fresh (get_user_for_login).
+user_cache = TTLCache(USER_CACHE_SIZE, USER_CACHE_TTL)
+
+
+def _without_password(user):
+    return {column: value for column, value in user.items() if column != "password_hash"} if user else user
+
+
+def _cache_user(user):
+    if not user:
+        return
+    user_cache.set(("email", user["email"]), _without_password(user))
+
+
+def invalidate_user(email):
+    user_cache.pop(("email", email))
+
+
+async def get_user_by_email(email):
+    """User row without password_hash, served from the cache when possible"""
+    cached = user_cache.get(("email", email))
+    if cached is not None:
+        return dict(cached)
+    user = _first(await client().select("users", {"email": email}))
+    _cache_user(user)
+    return _without_password(user)
+
+
+async def get_user_for_login(email):
+    """User row with its password_hash, always read from the database"""
+    user = _first(await client().select("users", {"email": email}))
+    _cache_user(user)
+    return user
+
+
+async def get_or_create_user(email, password_hash=None):
+    """Insert the user unless the email exists, returning the row either way (one round trip)"""
+    invalidate_user(email)
+    user = _first(await client().rpc("get_or_create_user", {"p_email": email, "p_password_hash": password_hash}))
+    _cache_user(user)
+    return user
+
+
+async def update_user(email, values):
+    invalidate_user(email)
+    row = _first(await client().update("users", values, {"email": email}))
+    _cache_user(row)
+    return row
+
+
+# ---verification_codes---
+
+async def insert_verification_code(row):
+    return _first(await client().insert("verification_codes", row))
+
+
+async def verify_email_code(email, code):
+    """Check the latest unused code, use up the email's codes and verify the user in one transaction.
+
+    Returns {"status": "missing" | "used" | "expired" | "invalid" | "verified", "user": row};
+    "used" means only already-used codes are left.
+    """
+    result = await client().rpc("verify_email_code", {"p_email": email, "p_code": code})
+    if result.get("user"):
+        invalidate_user(email)
+        _cache_user(result["user"])
+    return result
+
+
+# ---password_resets---
+
+async def insert_password_reset(row):
+    return _first(await client().insert("password_resets", row))
+
+
+async def latest_password_reset(email):
+    """Newest unused reset for email (served by the partial (email, created_at DESC) index)"""
+    return _first(await client().select("password_resets", {"email": email, "used": False},
+                                        order="created_at", desc=True, limit=1))
+
+
+async def has_used_password_reset(email):
+    """Whether email has used resets left (until the reaper deletes them); only asked after a failed lookup"""
+    return bool(await client().select("password_resets", {"email": email, "used": True}, columns="id", limit=1))
+
+
+async def mark_password_resets_used(email):
+    """Use up every outstanding reset for email, so older tokens cannot be replayed"""
+    await client().update("password_resets", {"used": True}, {"email": email, "used": False})
+
+
+# ---expired auth rows---
+
+async def reap_expired_rows(table, batch_size):
+    """Delete up to batch_size used or expired rows from verification_codes/password_resets"""
+    return await client().rpc("reap_auth_rows", {"p_table": table, "p_batch": batch_size})
+
+
+# ---revoked_tokens---
+
+async def insert_revoked_token(row):
+    return _first(await client().insert("revoked_tokens", row))
+
+
+async def list_revoked_tokens(since=None):
+    """Unexpired revocations, only those revoked after `since` when given"""
+    filters = {"expires_at": ("gt", datetime.now(timezone.utc).isoformat())}
+    if since:
+        filters["revoked_at"] = ("gt", since)
+    return await client().select("revoked_tokens", filters, columns="jti,expires_at,revoked_at",
+                                 order="revoked_at")
+
+
+# ---vm_creation_logs---
+
+async def insert_vm_log(row):
+    return _first(await client().insert("vm_creation_logs", row))
+
+
+async def insert_vm_logs(rows):
+    """Insert several logs in one request, returning the rows in the same order"""
+    return await client().insert("vm_creation_logs", rows)
+
+
+async def list_vm_logs(user_email, columns="*", limit=None, before=None):
+    """Newest first; `before` is the (created_at, id) of the last row of the previous page"""
+    filters = {"user_email": user_email}
+    if before:
+        created_at, log_id = before
+        filters["or"] = f'(created_at.lt."{created_at}",and(created_at.eq."{created_at}",id.lt.{log_id}))'
+    return await client().select("vm_creation_logs", filters, columns=columns,
+                                 order="created_at,id", desc=True, limit=limit)
+
+
+async def list_fleet_vms(user_email, ids=None, tags=None):
+    """Successfully created VMs of a user matching any of ids or carrying any of tags, newest first"""
+    filters = {"user_email": user_email, "status": "success"}
+    selectors = []
+    if ids:
+        selectors.append(f"id.in.({','.join(ids)})")
+    if tags:
+        selectors.append(f"tags.ov.{{{','.join(_quote(tag) for tag in tags)}}}")
+    if selectors:
+        filters["or"] = f"({','.join(selectors)})"
+    return await client().select("vm_creation_logs", filters, columns="id,vm_name,ip_address,tags,created_at",
+                                 order="created_at,id", desc=True)
+
+
+def _quote(value):
+    # Array literal element: quote so commas/braces in a tag cannot break the filter
+    return '"' + value.replace("\\", "\\\\").replace('"', '\\"') + '"'
+
+
+async def get_vm_log(log_id, user_email, columns="*"):
+    return _first(await client().select("vm_creation_logs", {"id": log_id, "user_email": user_email},
+                                        columns=columns))
+
+
+async def update_vm_log(log_id, values, user_email=None):
+    """Updated row, or None when no log matches (scoped to user_email when given)"""
+    filters = {"id": log_id}
+    if user_email:
+        filters["user_email"] = user_email
+    return _first(await client().update("vm_creation_logs", values, filters))
+
+
+async def delete_vm_log(log_id, user_email=None):
+    """Deleted row, or None when no log matches (scoped to user_email when given)"""
+    filters = {"id": log_id}
+    if user_email:
+        filters["user_email"] = user_email
+    return _first(await client().delete("vm_creation_logs", filters))
+
+
+async def list_tracked_vms():
+    """Every successfully created VM with its last known state, newest first"""
+    return await client().select("vm_creation_logs", {"status": "success"},
+                                 columns="id,user_email,vm_name,vm_state", order="created_at,id", desc=True)
+
+
+async def set_vm_states(changes, changed_at):
+    """Record reconciled states: one filtered update per distinct state, {log_id: state}"""
+    by_state = {}
+    for log_id, state in changes.items():
+        by_state.setdefault(state, []).append(log_id)
+    for state, log_ids in by_state.items():
+        await update_vm_logs(log_ids, {"vm_state": state, "vm_state_at": changed_at})
+
+
+async def update_vm_logs(log_ids, values):
+    """Apply the same values to several logs in one request"""
+    return await client().update("vm_creation_logs", values, {"id": ("in", f"({','.join(log_ids)})")})
+
+
+# ---vm_log_chunks---
+
+async def replace_log_chunks(log_id, stream, chunks):
+    """Swap a stream's chunks for new ones in one transaction"""
+    await client().rpc("replace_vm_log_chunks", {"p_log_id": log_id, "p_stream": stream, "p_chunks": chunks})
+
+
+async def append_log_chunks(log_id, stream, from_seq, chunks):
+    """Replace a stream's chunks from from_seq on, leaving the earlier ones untouched"""
+    await client().rpc("append_vm_log_chunks", {"p_log_id": log_id, "p_stream": stream,
+                                                "p_from_seq": from_seq, "p_chunks": chunks})
+
+
+async def list_log_chunks(log_id, stream, after_seq=-1, limit=None):
+    return await client().select("vm_log_chunks", {"log_id": log_id, "stream": stream, "seq": ("gt", after_seq)},
+                                 columns="seq,codec,data", order="seq", limit=limit)
+
+
+async def delete_log_chunks_before(created_before):
+    await client().delete("vm_log_chunks", {"created_at": ("lt", created_before)}, returning=False)
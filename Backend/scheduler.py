@@ -0,0 +1,220 @@
+import json
+import os
+import threading
+import time
+import traceback
+from collections import deque
+
+
+def _host_memory_mb():
+    """Physical memory of this machine in MB, 8192 when it cannot be read"""
+    try:
+        return os.sysconf("SC_PAGE_SIZE") * os.sysconf("SC_PHYS_PAGES") // (1024 * 1024)
+    except (AttributeError, ValueError, OSError):
+        pass
+    try:
+        import ctypes
+
+        class MemoryStatus(ctypes.Structure):
+            _fields_ = [("dwLength", ctypes.c_ulong), ("dwMemoryLoad", ctypes.c_ulong),
+                        ("ullTotalPhys", ctypes.c_ulonglong), ("ullAvailPhys", ctypes.c_ulonglong),
+                        ("ullTotalPageFile", ctypes.c_ulonglong), ("ullAvailPageFile", ctypes.c_ulonglong),
+                        ("ullTotalVirtual", ctypes.c_ulonglong), ("ullAvailVirtual", ctypes.c_ulonglong),
+                        ("ullAvailExtendedVirtual", ctypes.c_ulonglong)]
+
+        status = MemoryStatus()
+        status.dwLength = ctypes.sizeof(MemoryStatus)
+        if ctypes.windll.kernel32.GlobalMemoryStatusEx(ctypes.byref(status)):
+            return status.ullTotalPhys // (1024 * 1024)
+    except Exception:
+        pass
+    return 8192
+
+
+# ---Host Scheduler Configuration----
+HOST_CPUS = int(os.getenv("HOST_CPUS", "0")) or os.cpu_count() or 1  # 0 detects
+HOST_MEMORY_MB = int(os.getenv("HOST_MEMORY_MB", "0")) or _host_memory_mb()  # 0 detects
+HOST_CPU_OVERCOMMIT = float(os.getenv("HOST_CPU_OVERCOMMIT", "1"))  # vCPUs handed out per host CPU
+HOST_RESERVED_MEMORY_MB = int(os.getenv("HOST_RESERVED_MEMORY_MB", "2048"))  # kept back for the host OS and VirtualBox
+SCHEDULER_QUEUE_LIMIT = int(os.getenv("SCHEDULER_QUEUE_LIMIT", "50"))  # requests waiting for capacity
+
+
+class CapacityError(Exception):
+    """The request can never fit on this host"""
+
+
+class SchedulerFullError(Exception):
+    pass
+
+
+class HostScheduler:
+    """Admits VM builds against the host's vCPUs and RAM, queueing the ones that do not fit yet.
+
+    A reservation is held per workspace key from admission until the VM is
+    destroyed, and persisted so a restart does not forget running VMs.
+    Waiting requests are admitted in arrival order as capacity is released;
+    one that does not fit holds back those behind it, so large VMs are not
+    starved by a stream of small ones.
+    """
+
+    def __init__(self, cpus=HOST_CPUS, memory_mb=HOST_MEMORY_MB, overcommit=HOST_CPU_OVERCOMMIT,
+                 reserved_memory_mb=HOST_RESERVED_MEMORY_MB, queue_limit=SCHEDULER_QUEUE_LIMIT, state_file=None):
+        self.cpu_capacity = int(cpus * overcommit)
+        self.memory_capacity = memory_mb - reserved_memory_mb
+        self.queue_limit = queue_limit
+        self.state_file = state_file
+        self._lock = threading.Lock()
+        self._reservations = {}  # workspace key -> (cpus, memory)
+        self._waiting = deque()  # (items, on_admit, queued_at)
+        self._admitted = 0
+        self._queued = 0
+        self._rejected = 0
+        self._waits = deque(maxlen=100)
+        self._load()
+
+    def check(self, cpus, memory):
+        """Raise CapacityError for a size this host could never run"""
+        if cpus < 1 or memory < 1:
+            raise CapacityError("cpus and memory must be positive")
+        if cpus > self.cpu_capacity or memory > self.memory_capacity:
+            with self._lock:
+                self._rejected += 1
+            raise CapacityError(
+                f"{cpus} vCPUs / {memory} MB exceeds this host's capacity "
+                f"({self.cpu_capacity} vCPUs / {self.memory_capacity} MB)"
+            )
+
+    def request(self, items, on_admit):
+        """Reserve items ({workspace key: (cpus, memory)}) together, calling on_admit() once they fit.
+
+        Returns True when admitted at once, False when the request was queued.
+        """
+        self.check(sum(c for c, _ in items.values()), sum(m for _, m in items.values()))
+        with self._lock:
+            if self._waiting or not self._fits(items):
+                if len(self._waiting) >= self.queue_limit:
+                    raise SchedulerFullError(f"{len(self._waiting)} requests already waiting for host capacity")
+                self._waiting.append((items, on_admit, time.monotonic()))
+                self._queued += 1
+                return False
+            self._reserve(items)
+            self._admitted += 1
+        self._admit(items, on_admit)
+        return True
+
+    def try_reserve(self, key, cpus, memory):
+        """Reserve only if it fits now and nobody is waiting (for background work such as warm VMs)"""
+        items = {key: (cpus, memory)}
+        with self._lock:
+            if self._waiting or not self._fits(items):
+                return False
+            self._reserve(items)
+        return True
+
+    def can_admit(self, cpus, memory):
+        """Whether a request of this size would be admitted right now"""
+        with self._lock:
+            return not self._waiting and self._fits({None: (cpus, memory)})
+
+    def free(self):
+        """(cpus, memory) not reserved yet"""
+        with self._lock:
+            return (self.cpu_capacity - sum(c for c, _ in self._reservations.values()),
+                    self.memory_capacity - sum(m for _, m in self._reservations.values()))
+
+    def resize(self, cpu_capacity, memory_capacity):
+        """Change the capacity (e.g. a host re-registering) and admit whatever now fits"""
+        with self._lock:
+            self.cpu_capacity = cpu_capacity
+            self.memory_capacity = memory_capacity
+        self._drain()
+
+    def rekey(self, old_key, new_key):
+        """Move a reservation to a renamed workspace"""
+        with self._lock:
+            if old_key in self._reservations:
+                self._reservations[new_key] = self._reservations.pop(old_key)
+                self._save()
+
+    def release(self, key):
+        """Free a destroyed VM's reservation and admit whatever now fits"""
+        with self._lock:
+            if self._reservations.pop(key, None) is not None:
+                self._save()
+        self._drain()
+
+    def stats(self):
+        with self._lock:
+            cpus = sum(c for c, _ in self._reservations.values())
+            memory = sum(m for _, m in self._reservations.values())
+            waits = list(self._waits)
+            now = time.monotonic()
+            return {
+                "capacity": {"cpus": self.cpu_capacity, "memory_mb": self.memory_capacity},
+                "reserved": {"cpus": cpus, "memory_mb": memory, "vms": len(self._reservations)},
+                "free": {"cpus": self.cpu_capacity - cpus, "memory_mb": self.memory_capacity - memory},
+                "utilisation": {
+                    "cpus": round(cpus / self.cpu_capacity, 4) if self.cpu_capacity > 0 else None,
+                    "memory": round(memory / self.memory_capacity, 4) if self.memory_capacity > 0 else None,
+                },
+                "waiting": len(self._waiting),
+                "oldest_wait_seconds": round(now - self._waiting[0][2], 1) if self._waiting else None,
+                "admitted": self._admitted,
+                "queued": self._queued,
+                "rejected": self._rejected,
+                "wait_seconds": {
+                    "avg": round(sum(waits) / len(waits), 2) if waits else None,
+                    "max": round(max(waits), 2) if waits else None,
+                },
+            }
+
+    def _fits(self, items):
+        # Keys already reserved (a VM being rebuilt) give their current share back first
+        cpus = sum(c for key, (c, _) in self._reservations.items() if key not in items)
+        memory = sum(m for key, (_, m) in self._reservations.items() if key not in items)
+        return (cpus + sum(c for c, _ in items.values()) <= self.cpu_capacity
+                and memory + sum(m for _, m in items.values()) <= self.memory_capacity)
+
+    def _reserve(self, items):
+        self._reservations.update(items)
+        self._save()
+
+    def _admit(self, items, on_admit):
+        try:
+            on_admit()
+        except Exception:
+            traceback.print_exc()
+            with self._lock:
+                for key in items:
+                    self._reservations.pop(key, None)
+                self._save()
+
+    def _drain(self):
+        admitted = []
+        with self._lock:
+            while self._waiting and self._fits(self._waiting[0][0]):
+                items, on_admit, queued_at = self._waiting.popleft()
+                self._reserve(items)
+                self._admitted += 1
+                self._waits.append(time.monotonic() - queued_at)
+                admitted.append((items, on_admit))
+        for items, on_admit in admitted:
+            self._admit(items, on_admit)
+        if admitted:
+            # An admission that failed gave its share back
+            self._drain()
+
+    def _load(self):
+        if not self.state_file or not os.path.exists(self.state_file):
+            return
+        with open(self.state_file) as f:
+            self._reservations = {key: tuple(size) for key, size in json.load(f).items()}
+
+    def _save(self):
+        if not self.state_file:
+            return
+        os.makedirs(os.path.dirname(self.state_file), exist_ok=True)
+        tmp_path = self.state_file + ".tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(self._reservations, f, indent=2)
+        os.replace(tmp_path, self.state_file)
@@ -0,0 +1,215 @@
+import os
+import socket
+import threading
+import time
+from collections import deque
+
+import paramiko
+
+# ---SSH Session Pool Configuration----
+SSH_USER = os.getenv("SSH_USER", "vagrant")
+SSH_CONNECT_TIMEOUT = float(os.getenv("SSH_CONNECT_TIMEOUT", "10"))
+SSH_COMMAND_TIMEOUT = float(os.getenv("SSH_COMMAND_TIMEOUT", "60"))  # default per-command deadline
+SSH_MAX_COMMAND_TIMEOUT = float(os.getenv("SSH_MAX_COMMAND_TIMEOUT", "3600"))  # largest deadline a request may ask for
+SSH_IDLE_TIMEOUT = float(os.getenv("SSH_IDLE_TIMEOUT", "300"))  # seconds before an unused session is closed
+SSH_KEEPALIVE = int(os.getenv("SSH_KEEPALIVE", "30"))  # seconds between transport keepalives
+SSH_MAX_CHANNELS = int(os.getenv("SSH_MAX_CHANNELS", "10"))  # concurrent commands per session
+SSH_OUTPUT_TAIL = int(os.getenv("SSH_OUTPUT_TAIL", "200"))  # lines of output kept per command
+
+
+class SSHCommandTimeout(Exception):
+    pass
+
+
+class SSHChannelError(Exception):
+    """No channel could be opened, so the command never started and can safely be retried"""
+
+
+class SSHSession:
+    """One authenticated SSH transport to a VM; every command gets its own channel on it"""
+
+    def __init__(self, host, key_path, username=SSH_USER, port=22):
+        self.host = host
+        self.key_path = key_path
+        self.client = paramiko.SSHClient()
+        # Matches the old `ssh -o StrictHostKeyChecking=no`: VMs are recreated with fresh host keys
+        self.client.set_missing_host_key_policy(paramiko.AutoAddPolicy())
+        self.client.connect(
+            host, port=port, username=username, key_filename=key_path,
+            timeout=SSH_CONNECT_TIMEOUT, banner_timeout=SSH_CONNECT_TIMEOUT, auth_timeout=SSH_CONNECT_TIMEOUT,
+            look_for_keys=False, allow_agent=False,
+        )
+        self.transport = self.client.get_transport()
+        self.transport.set_keepalive(SSH_KEEPALIVE)
+        self._channels = threading.BoundedSemaphore(SSH_MAX_CHANNELS)
+        self.opened_at = time.time()
+        self.last_used = self.opened_at
+        self.commands = 0
+        self.in_flight = 0
+        self._in_flight_lock = threading.Lock()
+
+    def alive(self):
+        if self.transport is None or not self.transport.is_active():
+            return False
+        try:
+            self.transport.send_ignore()
+            return True
+        except (paramiko.SSHException, EOFError, OSError):
+            return False
+
+    def run(self, command, timeout=SSH_COMMAND_TIMEOUT, on_line=None):
+        """Run command on a new channel; returns (exit_code, output tail), stderr folded into stdout"""
+        deadline = time.time() + timeout
+        # Counted from before the channel opens, so the reaper never closes a session a command is using
+        with self._in_flight_lock:
+            self.in_flight += 1
+        try:
+            with self._channels:
+                self.last_used = time.time()
+                self.commands += 1
+                try:
+                    channel = self.transport.open_session(timeout=SSH_CONNECT_TIMEOUT)
+                except (paramiko.SSHException, EOFError, OSError) as e:
+                    raise SSHChannelError(f"Could not open a channel to {self.host}: {e}") from e
+                try:
+                    channel.set_combine_stderr(True)
+                    channel.exec_command(command)
+                    tail = deque(maxlen=SSH_OUTPUT_TAIL)
+                    pending = b""
+                    while True:
+                        remaining = deadline - time.time()
+                        if remaining <= 0:
+                            raise SSHCommandTimeout(f"Command timed out after {timeout}s on {self.host}: {command}")
+                        channel.settimeout(remaining)
+                        try:
+                            data = channel.recv(32768)
+                        except socket.timeout:
+                            continue
+                        if not data:
+                            break
+                        *lines, pending = (pending + data).split(b"\n")
+                        for line in lines:
+                            _emit(line, tail, on_line)
+                    if pending:
+                        _emit(pending, tail, on_line)
+                    exit_code = channel.recv_exit_status()
+                finally:
+                    channel.close()
+                    self.last_used = time.time()
+        finally:
+            with self._in_flight_lock:
+                self.in_flight -= 1
+        return exit_code, "\n".join(tail)
+
+    def close(self):
+        self.client.close()
+
+
+def _emit(raw, tail, on_line):
+    line = raw.decode("utf-8", "replace").rstrip("\r")
+    tail.append(line)
+    if on_line:
+        on_line(line)
+
+
+class SSHSessionPool:
+    """Keeps one multiplexed SSH session per VM and reuses it across commands.
+
+    Sessions are health-checked before reuse and re-established once if no
+    channel can be opened on them. A command that already started is never
+    re-run, since it may not be safe to run twice. A reaper thread closes
+    sessions with no command running that have been idle for longer than
+    SSH_IDLE_TIMEOUT.
+    """
+
+    def __init__(self, idle_timeout=SSH_IDLE_TIMEOUT):
+        self.idle_timeout = idle_timeout
+        self._sessions = {}  # (host, key_path) -> SSHSession
+        self._connect_locks = {}
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._reaper = None
+        self.connects = 0
+        self.reuses = 0
+
+    def start(self):
+        if self._reaper is None:
+            self._reaper = threading.Thread(target=self._reap_loop, name="ssh-reaper", daemon=True)
+            self._reaper.start()
+
+    def stop(self):
+        self._stop.set()
+        with self._lock:
+            sessions, self._sessions = list(self._sessions.values()), {}
+        for session in sessions:
+            session.close()
+
+    def session(self, host, key_path):
+        key = (host, key_path)
+        with self._lock:
+            connect_lock = self._connect_locks.setdefault(key, threading.Lock())
+        # Concurrent callers for the same VM wait for one handshake instead of racing their own
+        with connect_lock:
+            with self._lock:
+                session = self._sessions.get(key)
+            if session is not None and session.alive():
+                self.reuses += 1
+                return session
+            if session is not None:
+                session.close()
+            session = SSHSession(host, key_path)
+            self.connects += 1
+            with self._lock:
+                self._sessions[key] = session
+            return session
+
+    def run(self, host, key_path, command, timeout=None, on_line=None):
+        """(exit_code, output) of command on host, over the pooled session"""
+        timeout = timeout or SSH_COMMAND_TIMEOUT
+        session = self.session(host, key_path)
+        try:
+            return session.run(command, timeout=timeout, on_line=on_line)
+        except SSHChannelError:
+            # The transport died before the command started (VM rebooted, network blip): reconnect once
+            self.drop(host)
+            return self.session(host, key_path).run(command, timeout=timeout, on_line=on_line)
+
+    def drop(self, host):
+        """Close every session to host, e.g. once its VM is destroyed"""
+        with self._lock:
+            keys = [key for key in self._sessions if key[0] == host]
+            sessions = [self._sessions.pop(key) for key in keys]
+        for session in sessions:
+            session.close()
+
+    def reap_idle(self):
+        now = time.time()
+        with self._lock:
+            stale = [key for key, s in self._sessions.items()
+                     if not s.in_flight and now - s.last_used > self.idle_timeout]
+            sessions = [self._sessions.pop(key) for key in stale]
+        for session in sessions:
+            session.close()
+        return len(sessions)
+
+    def stats(self):
+        now = time.time()
+        with self._lock:
+            sessions = list(self._sessions.values())
+        return {
+            "sessions": [
+                {"host": s.host, "commands": s.commands, "in_flight": s.in_flight,
+                 "idle_seconds": round(now - s.last_used, 1),
+                 "age_seconds": round(now - s.opened_at, 1)}
+                for s in sessions
+            ],
+            "connects": self.connects,
+            "reuses": self.reuses,
+        }
+
+    def _reap_loop(self):
+        while not self._stop.wait(min(self.idle_timeout, 30)):
+            try:
+                self.reap_idle()
+            except Exception as e:
+                print(f"Error reaping idle SSH sessions: {e}")
@@ -0,0 +1,9 @@
+/*
+  # Per-VM IP addresses
+
+  1. Table Updates
+    - Add `ip_address` column to vm_creation_logs, filled with the address
+      leased to the VM's workspace from the IP pool
+*/
+
+ALTER TABLE vm_creation_logs ADD COLUMN IF NOT EXISTS ip_address text;
@@ -0,0 +1,28 @@
+/*
+  # Token revocation list
+
+  1. New Tables
+    - `revoked_tokens`
+      - `jti` (text, primary key) - `jti` claim of the revoked JWT
+      - `user_email` (text)
+      - `expires_at` (timestamp) - when the token would have expired anyway
+      - `revoked_at` (timestamp)
+
+  2. Security
+    - Enable RLS, permissive like the other tables (custom JWT auth)
+*/
+
+CREATE TABLE IF NOT EXISTS revoked_tokens (
+  jti text PRIMARY KEY,
+  user_email text NOT NULL,
+  expires_at timestamptz NOT NULL,
+  revoked_at timestamptz DEFAULT now()
+);
+
+ALTER TABLE revoked_tokens ENABLE ROW LEVEL SECURITY;
+
+CREATE POLICY "Allow all operations on revoked_tokens" ON public.revoked_tokens
+FOR ALL USING (true) WITH CHECK (true);
+
+CREATE INDEX IF NOT EXISTS idx_revoked_tokens_revoked_at ON revoked_tokens(revoked_at);
+CREATE INDEX IF NOT EXISTS idx_revoked_tokens_expires_at ON revoked_tokens(expires_at);
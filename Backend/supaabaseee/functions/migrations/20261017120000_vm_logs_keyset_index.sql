@@ -0,0 +1,10 @@
+/*
+  # Keyset pagination index for vm_creation_logs
+
+  1. Indexes
+    - `idx_vm_creation_logs_user_created_id` on (`user_email`, `created_at` DESC, `id` DESC)
+      so `/vm-logs` pages by (created_at, id) cursor with an index range scan
+*/
+
+CREATE INDEX IF NOT EXISTS idx_vm_creation_logs_user_created_id
+  ON vm_creation_logs(user_email, created_at DESC, id DESC);
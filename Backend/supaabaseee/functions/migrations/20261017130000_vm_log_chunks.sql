@@ -0,0 +1,38 @@
+/*
+  # Compressed, chunked VM log output
+
+  1. New Tables
+    - `vm_log_chunks`
+      - `log_id` (uuid, references vm_creation_logs, cascades on delete)
+      - `stream` (text) - `output` for terraform/vagrant output, `logs` for job log entries
+      - `seq` (int) - chunk order within the stream
+      - `codec` (text) - `gzip` or `zstd`
+      - `data` (text) - base64 of one fixed-size slice of the compressed stream
+      - `created_at` (timestamp)
+      - primary key (`log_id`, `stream`, `seq`)
+
+  2. Security
+    - Enable RLS, permissive like the other tables (custom JWT auth)
+
+  3. Notes
+    - `terraform_output` and `logs` on vm_creation_logs are no longer written;
+      existing rows keep their inline values and are still served from there
+*/
+
+CREATE TABLE IF NOT EXISTS vm_log_chunks (
+  log_id uuid NOT NULL REFERENCES vm_creation_logs(id) ON DELETE CASCADE,
+  stream text NOT NULL,
+  seq int NOT NULL,
+  codec text NOT NULL,
+  data text NOT NULL,
+  created_at timestamptz DEFAULT now(),
+  PRIMARY KEY (log_id, stream, seq)
+);
+
+ALTER TABLE vm_log_chunks ENABLE ROW LEVEL SECURITY;
+
+CREATE POLICY "Allow all operations on vm_log_chunks" ON public.vm_log_chunks
+FOR ALL USING (true) WITH CHECK (true);
+
+-- Retention deletes by age
+CREATE INDEX IF NOT EXISTS idx_vm_log_chunks_created_at ON vm_log_chunks(created_at);
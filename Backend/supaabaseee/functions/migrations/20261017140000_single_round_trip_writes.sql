@@ -0,0 +1,73 @@
+/*
+  # Single round-trip write paths
+
+  1. New Functions
+    - `get_or_create_user(p_email, p_password_hash)` - insert the user unless the
+      email exists and return the row either way; an existing password is kept
+    - `verify_email_code(p_email, p_code)` - check the latest code for an email,
+      mark it used and mark the user verified (creating it if needed) in one
+      transaction; returns `{"status": ..., "user": ...}`
+    - `replace_vm_log_chunks(p_log_id, p_stream, p_chunks)` - swap a log stream's
+      compressed chunks atomically
+
+  2. Notes
+    - Each replaces a chain of PostgREST calls the API used to make one by one
+*/
+
+CREATE OR REPLACE FUNCTION get_or_create_user(p_email text, p_password_hash text DEFAULT NULL)
+RETURNS SETOF users
+LANGUAGE sql
+AS $$
+  INSERT INTO users (email, password_hash, email_verified, created_at)
+  VALUES (p_email, p_password_hash, false, now())
+  ON CONFLICT (email) DO UPDATE SET id = COALESCE(users.id, gen_random_uuid())
+  RETURNING *;
+$$;
+
+CREATE OR REPLACE FUNCTION verify_email_code(p_email text, p_code text)
+RETURNS jsonb
+LANGUAGE plpgsql
+AS $$
+DECLARE
+  v_code verification_codes%ROWTYPE;
+  v_user users%ROWTYPE;
+BEGIN
+  SELECT * INTO v_code FROM verification_codes
+  WHERE email = p_email
+  ORDER BY created_at DESC
+  LIMIT 1
+  FOR UPDATE;
+
+  IF NOT FOUND THEN
+    RETURN jsonb_build_object('status', 'missing');
+  END IF;
+  IF v_code.used THEN
+    RETURN jsonb_build_object('status', 'used');
+  END IF;
+  IF v_code.expires_at < now() THEN
+    RETURN jsonb_build_object('status', 'expired');
+  END IF;
+  IF v_code.code <> p_code THEN
+    RETURN jsonb_build_object('status', 'invalid');
+  END IF;
+
+  UPDATE verification_codes SET used = true WHERE id = v_code.id;
+
+  INSERT INTO users (email, email_verified, created_at)
+  VALUES (p_email, true, now())
+  ON CONFLICT (email) DO UPDATE SET email_verified = true, id = COALESCE(users.id, gen_random_uuid())
+  RETURNING * INTO v_user;
+
+  RETURN jsonb_build_object('status', 'verified', 'user', to_jsonb(v_user));
+END;
+$$;
+
+CREATE OR REPLACE FUNCTION replace_vm_log_chunks(p_log_id uuid, p_stream text, p_chunks jsonb)
+RETURNS void
+LANGUAGE sql
+AS $$
+  DELETE FROM vm_log_chunks WHERE log_id = p_log_id AND stream = p_stream;
+  INSERT INTO vm_log_chunks (log_id, stream, seq, codec, data, created_at)
+  SELECT p_log_id, p_stream, c.seq, c.codec, c.data, now()
+  FROM jsonb_to_recordset(p_chunks) AS c(seq int, codec text, data text);
+$$;
@@ -0,0 +1,77 @@
+/*
+  # TTL reaping and lookup indexes for verification_codes and password_resets
+
+  1. Indexes
+    - `idx_verification_codes_email_created_unused` on (`email`, `created_at` DESC) WHERE NOT used
+    - `idx_password_resets_email_created_unused` on (`email`, `created_at` DESC) WHERE NOT used
+      Latest-code lookups only read unused rows, so they stay an index probe as the tables grow
+
+  2. New Functions
+    - `reap_auth_rows(p_table, p_batch)` - delete at most `p_batch` used or expired
+      rows from verification_codes or password_resets; returns the number deleted.
+      The API calls it in a loop from a background task
+
+  3. Changed Functions
+    - `verify_email_code` looks at the newest unused code only and, on success,
+      uses up every outstanding code for the email
+*/
+
+CREATE INDEX IF NOT EXISTS idx_verification_codes_email_created_unused
+  ON verification_codes(email, created_at DESC) WHERE used = false;
+CREATE INDEX IF NOT EXISTS idx_password_resets_email_created_unused
+  ON password_resets(email, created_at DESC) WHERE used = false;
+
+CREATE OR REPLACE FUNCTION reap_auth_rows(p_table text, p_batch int)
+RETURNS int
+LANGUAGE plpgsql
+AS $$
+DECLARE
+  v_deleted int;
+BEGIN
+  IF p_table NOT IN ('verification_codes', 'password_resets') THEN
+    RAISE EXCEPTION 'reap_auth_rows: unsupported table %', p_table;
+  END IF;
+
+  EXECUTE format(
+    'DELETE FROM %I WHERE id IN (SELECT id FROM %I WHERE used OR expires_at < now() LIMIT $1)',
+    p_table, p_table
+  ) USING p_batch;
+  GET DIAGNOSTICS v_deleted = ROW_COUNT;
+  RETURN v_deleted;
+END;
+$$;
+
+CREATE OR REPLACE FUNCTION verify_email_code(p_email text, p_code text)
+RETURNS jsonb
+LANGUAGE plpgsql
+AS $$
+DECLARE
+  v_code verification_codes%ROWTYPE;
+  v_user users%ROWTYPE;
+BEGIN
+  SELECT * INTO v_code FROM verification_codes
+  WHERE email = p_email AND used = false
+  ORDER BY created_at DESC
+  LIMIT 1
+  FOR UPDATE;
+
+  IF NOT FOUND THEN
+    RETURN jsonb_build_object('status', 'missing');
+  END IF;
+  IF v_code.expires_at < now() THEN
+    RETURN jsonb_build_object('status', 'expired');
+  END IF;
+  IF v_code.code <> p_code THEN
+    RETURN jsonb_build_object('status', 'invalid');
+  END IF;
+
+  UPDATE verification_codes SET used = true WHERE email = p_email AND used = false;
+
+  INSERT INTO users (email, email_verified, created_at)
+  VALUES (p_email, true, now())
+  ON CONFLICT (email) DO UPDATE SET email_verified = true, id = COALESCE(users.id, gen_random_uuid())
+  RETURNING * INTO v_user;
+
+  RETURN jsonb_build_object('status', 'verified', 'user', to_jsonb(v_user));
+END;
+$$;
@@ -0,0 +1,13 @@
+/*
+  # VM tags for fleet commands
+
+  1. Table Updates
+    - Add `tags` (text[], default empty) to `vm_creation_logs`
+
+  2. Indexes
+    - GIN index on `tags` so `tags && '{...}'` (PostgREST `ov`) lookups stay cheap
+*/
+
+ALTER TABLE vm_creation_logs ADD COLUMN IF NOT EXISTS tags text[] NOT NULL DEFAULT '{}';
+
+CREATE INDEX IF NOT EXISTS idx_vm_creation_logs_tags ON vm_creation_logs USING GIN (tags);
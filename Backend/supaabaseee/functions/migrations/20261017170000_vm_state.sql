@@ -0,0 +1,11 @@
+/*
+  # Reconciled VM state
+
+  1. Table Updates
+    - Add `vm_state` (text, nullable) to `vm_creation_logs`: the provider state last seen by the
+      reconciler (`running`, `poweroff`, `saved`, `not_created`, ...)
+    - Add `vm_state_at` (timestamptz, nullable): when that state was first observed
+*/
+
+ALTER TABLE vm_creation_logs ADD COLUMN IF NOT EXISTS vm_state text;
+ALTER TABLE vm_creation_logs ADD COLUMN IF NOT EXISTS vm_state_at timestamptz;
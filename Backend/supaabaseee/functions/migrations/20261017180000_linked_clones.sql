@@ -0,0 +1,12 @@
+/*
+  # Linked clone VMs
+
+  1. Table Updates
+    - Add `linked_clone` (boolean, default false) to `vm_creation_logs`: the VM was created as a
+      VirtualBox linked clone of its box's master snapshot instead of a full disk copy
+    - Add `disk_saved_bytes` (bigint, nullable): box disk size minus the clone's own disk once it
+      came up, i.e. the space the clone did not copy
+*/
+
+ALTER TABLE vm_creation_logs ADD COLUMN IF NOT EXISTS linked_clone boolean NOT NULL DEFAULT false;
+ALTER TABLE vm_creation_logs ADD COLUMN IF NOT EXISTS disk_saved_bytes bigint;
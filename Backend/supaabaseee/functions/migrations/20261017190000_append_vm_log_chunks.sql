@@ -0,0 +1,18 @@
+/*
+  # Append-only job log writes
+
+  1. New Functions
+    - `append_vm_log_chunks(p_log_id, p_stream, p_from_seq, p_chunks)` - replace a log
+      stream's chunks from `p_from_seq` on, so a running job rewrites only its last
+      partial chunk and adds new ones instead of swapping the whole stream
+*/
+
+CREATE OR REPLACE FUNCTION append_vm_log_chunks(p_log_id uuid, p_stream text, p_from_seq int, p_chunks jsonb)
+RETURNS void
+LANGUAGE sql
+AS $$
+  DELETE FROM vm_log_chunks WHERE log_id = p_log_id AND stream = p_stream AND seq >= p_from_seq;
+  INSERT INTO vm_log_chunks (log_id, stream, seq, codec, data, created_at)
+  SELECT p_log_id, p_stream, c.seq, c.codec, c.data, now()
+  FROM jsonb_to_recordset(p_chunks) AS c(seq int, codec text, data text);
+$$;
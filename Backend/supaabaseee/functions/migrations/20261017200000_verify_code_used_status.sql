@@ -0,0 +1,48 @@
+/*
+  # Report reused verification codes
+
+  1. Changed Functions
+    - `verify_email_code` returns `{"status": "used"}` again when the email has no
+      unused code left but has used ones, so a reused code gets "Verification code
+      already used" instead of "No verification code found". Once reap_auth_rows has
+      deleted the used rows the status is `missing`
+*/
+
+CREATE OR REPLACE FUNCTION verify_email_code(p_email text, p_code text)
+RETURNS jsonb
+LANGUAGE plpgsql
+AS $$
+DECLARE
+  v_code verification_codes%ROWTYPE;
+  v_user users%ROWTYPE;
+BEGIN
+  SELECT * INTO v_code FROM verification_codes
+  WHERE email = p_email AND used = false
+  ORDER BY created_at DESC
+  LIMIT 1
+  FOR UPDATE;
+
+  IF NOT FOUND THEN
+    -- Only used codes left (until reap_auth_rows deletes them): report the reuse
+    IF EXISTS (SELECT 1 FROM verification_codes WHERE email = p_email AND used) THEN
+      RETURN jsonb_build_object('status', 'used');
+    END IF;
+    RETURN jsonb_build_object('status', 'missing');
+  END IF;
+  IF v_code.expires_at < now() THEN
+    RETURN jsonb_build_object('status', 'expired');
+  END IF;
+  IF v_code.code <> p_code THEN
+    RETURN jsonb_build_object('status', 'invalid');
+  END IF;
+
+  UPDATE verification_codes SET used = true WHERE email = p_email AND used = false;
+
+  INSERT INTO users (email, email_verified, created_at)
+  VALUES (p_email, true, now())
+  ON CONFLICT (email) DO UPDATE SET email_verified = true, id = COALESCE(users.id, gen_random_uuid())
+  RETURNING * INTO v_user;
+
+  RETURN jsonb_build_object('status', 'verified', 'user', to_jsonb(v_user));
+END;
+$$;
@@ -0,0 +1,88 @@
+"""Minimal in-process SMTP server that keeps every message it receives.
+
+A stand-in for a real relay in tests and local runs; point the API at it with
+SMTP_HOST=127.0.0.1 SMTP_PORT=1025 SMTP_SECURITY=none. Run it on its own with
+`python -m supaabaseee.functions.sendmail.local_smtp [port]`.
+"""
+import socketserver
+import sys
+import threading
+from email import message_from_bytes
+
+
+class _SMTPHandler(socketserver.StreamRequestHandler):
+    def reply(self, line):
+        self.wfile.write(f"{line}\r\n".encode("ascii"))
+
+    def handle(self):
+        server = self.server
+        with server.lock:
+            server.connections += 1
+        self.reply("220 local-smtp ready")
+        while True:
+            line = self.rfile.readline()
+            if not line:
+                return
+            command = line.decode("utf-8", "replace").strip()
+            verb = command.split(" ", 1)[0].upper()
+            if verb == "EHLO":
+                self.reply("250-local-smtp")
+                self.reply("250 AUTH PLAIN")
+            elif verb in ("HELO", "MAIL", "RCPT", "RSET", "NOOP"):
+                self.reply("250 OK")
+            elif verb == "AUTH":
+                self.reply("235 Authentication successful")
+            elif verb == "DATA":
+                self.reply("354 End data with <CR><LF>.<CR><LF>")
+                self._receive()
+                self.reply("250 OK queued")
+            elif verb == "QUIT":
+                self.reply("221 Bye")
+                return
+            else:
+                self.reply("502 Command not implemented")
+
+    def _receive(self):
+        lines = []
+        while True:
+            line = self.rfile.readline()
+            if not line or line == b".\r\n":
+                break
+            lines.append(line[1:] if line.startswith(b"..") else line)
+        message = message_from_bytes(b"".join(lines))
+        with self.server.lock:
+            self.server.messages.append(message)
+        if self.server.verbose:
+            print(f"[local-smtp] {message['To']}: {message['Subject']}")
+
+
+class LocalSMTPServer(socketserver.ThreadingTCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self, host="127.0.0.1", port=0, verbose=False):
+        super().__init__((host, port), _SMTPHandler)
+        self.messages = []
+        self.connections = 0
+        self.verbose = verbose
+        self.lock = threading.Lock()
+        self._thread = None
+
+    @property
+    def port(self):
+        return self.server_address[1]
+
+    def start(self):
+        self._thread = threading.Thread(target=self.serve_forever, name="local-smtp", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
+
+
+if __name__ == "__main__":
+    port = int(sys.argv[1]) if len(sys.argv) > 1 else 1025
+    print(f"Local SMTP stand-in listening on 127.0.0.1:{port}")
+    LocalSMTPServer(port=port, verbose=True).serve_forever()
@@ -0,0 +1,187 @@
+import os
+import queue
+import smtplib
+import threading
+import time
+import uuid
+from collections import deque
+
+from .send_email import SMTPPool, build_message, render
+
+# ---Mail Outbox Configuration----
+MAIL_WORKERS = int(os.getenv("MAIL_WORKERS", "2"))  # also the number of pooled SMTP connections
+MAIL_QUEUE_LIMIT = int(os.getenv("MAIL_QUEUE_LIMIT", "1000"))
+MAIL_BATCH_SIZE = int(os.getenv("MAIL_BATCH_SIZE", "20"))  # messages sent per connection checkout
+MAIL_MAX_ATTEMPTS = int(os.getenv("MAIL_MAX_ATTEMPTS", "5"))
+MAIL_RETRY_BACKOFF = float(os.getenv("MAIL_RETRY_BACKOFF", "2"))  # seconds, doubled per attempt
+MAIL_FAILED_LIMIT = int(os.getenv("MAIL_FAILED_LIMIT", "100"))  # undeliverable messages kept for inspection
+
+_STOP = object()
+
+
+class OutboxFullError(Exception):
+    pass
+
+
+class OutboundMessage:
+    def __init__(self, to, subject, body, html=None):
+        self.id = str(uuid.uuid4())
+        self.to = to
+        self.subject = subject
+        self.body = body
+        self.html = html
+        self.attempts = 0
+        self.error = None
+        self.queued_at = time.time()
+
+    def to_dict(self):
+        return {
+            "id": self.id,
+            "to": self.to,
+            "subject": self.subject,
+            "attempts": self.attempts,
+            "error": self.error,
+            "queued_at": self.queued_at,
+        }
+
+
+class MailOutbox:
+    """Queue of outgoing mail drained by worker threads over pooled SMTP connections.
+
+    Callers enqueue and return straight away. Each worker takes up to
+    `batch_size` messages, sends them over one pooled connection, and puts
+    transient failures back on the queue with exponential backoff; permanent
+    (5xx) rejections and messages out of attempts go to `failed`.
+    """
+
+    def __init__(self, workers=MAIL_WORKERS, max_queue=MAIL_QUEUE_LIMIT, batch_size=MAIL_BATCH_SIZE,
+                 max_attempts=MAIL_MAX_ATTEMPTS, backoff=MAIL_RETRY_BACKOFF, pool=None):
+        self.workers = workers
+        self.batch_size = batch_size
+        self.max_attempts = max_attempts
+        self.backoff = backoff
+        self.pool = pool or SMTPPool(workers)
+        self._queue = queue.Queue(maxsize=max_queue)
+        self._threads = []
+        self._lock = threading.Lock()
+        self.failed = deque(maxlen=MAIL_FAILED_LIMIT)
+        self.sent = 0
+        self.retried = 0
+        self.batches = 0
+
+    @property
+    def enabled(self):
+        return bool(os.getenv("SMTP_HOST"))
+
+    def start(self):
+        if self._threads or not self.enabled:
+            return
+        for i in range(self.workers):
+            thread = threading.Thread(target=self._run, name=f"mail-outbox-{i}", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+
+    def stop(self, timeout=10):
+        """Let queued mail drain for up to timeout seconds, then close the connections"""
+        for _ in self._threads:
+            self._queue.put(_STOP)
+        deadline = time.time() + timeout
+        for thread in self._threads:
+            thread.join(max(0, deadline - time.time()))
+        self._threads = []
+        self.pool.close()
+
+    def enqueue(self, to, subject, body, html=None):
+        """Queue a message and return its id; raises OutboxFullError when the queue is at its limit"""
+        message = OutboundMessage(to, subject, body, html)
+        try:
+            self._queue.put_nowait(message)
+        except queue.Full:
+            raise OutboxFullError(f"Mail outbox is full ({self._queue.maxsize} queued)")
+        return message.id
+
+    def enqueue_template(self, to, template, text, **values):
+        subject, html = render(template, **values)
+        return self.enqueue(to, subject, text, html=html)
+
+    def stats(self):
+        with self._lock:
+            return {
+                "enabled": self.enabled,
+                "queued": self._queue.qsize(),
+                "sent": self.sent,
+                "retried": self.retried,
+                "batches": self.batches,
+                "failed": len(self.failed),
+                "recent_failures": [m.to_dict() for m in list(self.failed)[-10:]],
+                "connections": self.pool.stats(),
+            }
+
+    def _run(self):
+        while True:
+            batch = [self._queue.get()]
+            while len(batch) < self.batch_size and batch[-1] is not _STOP:
+                try:
+                    batch.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            stop = batch[-1] is _STOP
+            messages = [m for m in batch if m is not _STOP]
+            if messages:
+                self._send_batch(messages)
+            if stop:
+                return
+
+    def _send_batch(self, messages):
+        try:
+            server = self.pool.acquire()
+        except (smtplib.SMTPException, OSError) as e:
+            for message in messages:
+                self._retry(message, e)
+            return
+
+        healthy = True
+        for i, message in enumerate(messages):
+            try:
+                server.send_message(build_message(message.to, message.subject, message.body, message.html))
+                with self._lock:
+                    self.sent += 1
+            except smtplib.SMTPResponseException as e:
+                if e.smtp_code >= 500:
+                    self._fail(message, e)
+                else:
+                    self._retry(message, e)
+            except (smtplib.SMTPException, OSError) as e:
+                # The connection itself is gone: retry this and the rest of the batch elsewhere
+                healthy = False
+                for pending in messages[i:]:
+                    self._retry(pending, e)
+                break
+        with self._lock:
+            self.batches += 1
+        self.pool.release(server, healthy=healthy)
+
+    def _retry(self, message, error):
+        message.attempts += 1
+        message.error = str(error)
+        if message.attempts >= self.max_attempts:
+            self._fail(message, error)
+            return
+        with self._lock:
+            self.retried += 1
+        delay = self.backoff * 2 ** (message.attempts - 1)
+        timer = threading.Timer(delay, self._requeue, args=(message,))
+        timer.daemon = True
+        timer.start()
+
+    def _requeue(self, message):
+        try:
+            self._queue.put_nowait(message)
+        except queue.Full:
+            self._fail(message, OutboxFullError("Mail outbox is full"))
+
+    def _fail(self, message, error):
+        message.error = str(error)
+        print(f"Giving up on mail to {message.to} after {message.attempts} attempt(s): {error}")
+        with self._lock:
+            self.failed.append(message)
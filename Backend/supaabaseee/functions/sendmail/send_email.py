@@ -1,13 +1,131 @@
 import os
 import smtplib
+import string
+import threading
+import time
+from collections import deque
+from email.mime.multipart import MIMEMultipart
 from email.mime.text import MIMEText
 
-def send_email(to: str, subject: str, body: str):
-    msg = MIMEText(body)
+# ---SMTP Configuration----
+SMTP_SECURITY = os.getenv("SMTP_SECURITY", "ssl")  # ssl, starttls or none (local stand-in)
+SMTP_TIMEOUT = float(os.getenv("SMTP_TIMEOUT", "10"))
+SMTP_NOOP_AFTER = float(os.getenv("SMTP_NOOP_AFTER", "5"))  # idle seconds before a pooled connection is NOOP-checked
+SMTP_IDLE_SECONDS = float(os.getenv("SMTP_IDLE_SECONDS", "60"))  # idle seconds before it is closed instead
+
+TEMPLATE_DIR = os.path.dirname(os.path.abspath(__file__))
+
+
+def _load_template(filename):
+    with open(os.path.join(TEMPLATE_DIR, filename), encoding="utf-8") as f:
+        return string.Template(f.read())
+
+
+# Parsed once at import, so rendering a message is a single substitute() call
+TEMPLATES = {
+    "verification": ("VM Creation - Verify your email", _load_template("verification_email.html")),
+    "password_reset": ("VM Creation - Password reset", _load_template("password_reset.html")),
+}
+
+
+def render(template, **values):
+    """(subject, html) for one of TEMPLATES"""
+    subject, html = TEMPLATES[template]
+    return subject, html.substitute(**values)
+
+
+def build_message(to, subject, body, html=None):
+    if html is None:
+        msg = MIMEText(body)
+    else:
+        msg = MIMEMultipart("alternative")
+        msg.attach(MIMEText(body, "plain"))
+        msg.attach(MIMEText(html, "html"))
     msg["Subject"] = subject
     msg["From"] = os.getenv("SMTP_FROM")
     msg["To"] = to
+    return msg
 
-    with smtplib.SMTP_SSL(os.getenv("SMTP_HOST"), int(os.getenv("SMTP_PORT"))) as server:
+
+def connect():
+    """Open a logged-in SMTP connection using the SMTP_* settings"""
+    host = os.getenv("SMTP_HOST")
+    port = int(os.getenv("SMTP_PORT", "465" if SMTP_SECURITY == "ssl" else "25"))
+    if SMTP_SECURITY == "ssl":
+        server = smtplib.SMTP_SSL(host, port, timeout=SMTP_TIMEOUT)
+    else:
+        server = smtplib.SMTP(host, port, timeout=SMTP_TIMEOUT)
+        if SMTP_SECURITY == "starttls":
+            server.starttls()
+    if os.getenv("SMTP_USER"):
         server.login(os.getenv("SMTP_USER"), os.getenv("SMTP_PASS"))
-        server.send_message(msg)
+    return server
+
+
+def send_email(to: str, subject: str, body: str):
+    """Send one message on a fresh connection; the outbox reuses pooled connections instead"""
+    with connect() as server:
+        server.send_message(build_message(to, subject, body))
+
+
+class SMTPPool:
+    """Logged-in SMTP connections kept open between sends.
+
+    A connection idle for longer than SMTP_NOOP_AFTER is checked with NOOP
+    before reuse; one idle past SMTP_IDLE_SECONDS is closed, since servers
+    drop idle sessions on their own anyway.
+    """
+
+    def __init__(self, size, connect_fn=connect):
+        self.size = size
+        self.connect_fn = connect_fn
+        self._idle = deque()  # (server, last_used)
+        self._lock = threading.Lock()
+        self.opened = 0
+        self.reused = 0
+
+    def acquire(self):
+        while True:
+            with self._lock:
+                if not self._idle:
+                    break
+                server, last_used = self._idle.pop()
+            idle = time.time() - last_used
+            if idle < SMTP_NOOP_AFTER or (idle < SMTP_IDLE_SECONDS and _alive(server)):
+                self.reused += 1
+                return server
+            _quit(server)
+        self.opened += 1
+        return self.connect_fn()
+
+    def release(self, server, healthy=True):
+        with self._lock:
+            if healthy and len(self._idle) < self.size:
+                self._idle.append((server, time.time()))
+                return
+        _quit(server)
+
+    def close(self):
+        with self._lock:
+            idle, self._idle = list(self._idle), deque()
+        for server, _ in idle:
+            _quit(server)
+
+    def stats(self):
+        with self._lock:
+            idle = len(self._idle)
+        return {"size": self.size, "idle": idle, "opened": self.opened, "reused": self.reused}
+
+
+def _alive(server):
+    try:
+        return server.noop()[0] == 250
+    except (smtplib.SMTPException, OSError):
+        return False
+
+
+def _quit(server):
+    try:
+        server.quit()
+    except (smtplib.SMTPException, OSError):
+        server.close()
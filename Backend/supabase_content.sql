@@ -43,14 +43,41 @@ CREATE TABLE IF NOT EXISTS vm_creation_logs (
   status TEXT NOT NULL DEFAULT 'pending',
   terraform_output TEXT,
   logs JSONB, -- For storing frontend log entries
+  ip_address TEXT, -- Leased from the workspace IP pool
+  tags TEXT[] NOT NULL DEFAULT '{}', -- Labels for picking VMs in fleet commands
+  vm_state TEXT, -- Provider state last seen by the reconciler (running, poweroff, not_created, ...)
+  vm_state_at TIMESTAMPTZ, -- When vm_state was first observed
+  linked_clone BOOLEAN NOT NULL DEFAULT false, -- Created as a linked clone of the box's master snapshot
+  disk_saved_bytes BIGINT, -- Box disk space the linked clone did not copy
   created_at TIMESTAMPTZ DEFAULT now()
 );
 
+-- Revoked JWTs, mirrored in memory by the API for O(1) checks
+CREATE TABLE IF NOT EXISTS revoked_tokens (
+  jti TEXT PRIMARY KEY,
+  user_email TEXT NOT NULL,
+  expires_at TIMESTAMPTZ NOT NULL,
+  revoked_at TIMESTAMPTZ DEFAULT now()
+);
+
+-- Terraform output and job log entries, compressed and split into fixed-size chunks
+CREATE TABLE IF NOT EXISTS vm_log_chunks (
+  log_id UUID NOT NULL REFERENCES vm_creation_logs(id) ON DELETE CASCADE,
+  stream TEXT NOT NULL, -- 'output' or 'logs'
+  seq INT NOT NULL,
+  codec TEXT NOT NULL, -- 'gzip' or 'zstd'
+  data TEXT NOT NULL, -- base64 slice of the compressed stream
+  created_at TIMESTAMPTZ DEFAULT now(),
+  PRIMARY KEY (log_id, stream, seq)
+);
+
 -- Enable Row Level Security (but make it permissive for your custom JWT auth)
 ALTER TABLE public.users ENABLE ROW LEVEL SECURITY;
 ALTER TABLE public.verification_codes ENABLE ROW LEVEL SECURITY;
 ALTER TABLE public.password_resets ENABLE ROW LEVEL SECURITY;
 ALTER TABLE public.vm_creation_logs ENABLE ROW LEVEL SECURITY;
+ALTER TABLE public.revoked_tokens ENABLE ROW LEVEL SECURITY;
+ALTER TABLE public.vm_log_chunks ENABLE ROW LEVEL SECURITY;
 
 -- Permissive RLS policies since you're using custom JWT authentication
 -- Users table policies
@@ -69,6 +96,14 @@ FOR ALL USING (true) WITH CHECK (true);
 CREATE POLICY "Allow all operations on vm_creation_logs" ON public.vm_creation_logs
 FOR ALL USING (true) WITH CHECK (true);
 
+-- Revoked tokens table policies
+CREATE POLICY "Allow all operations on revoked_tokens" ON public.revoked_tokens
+FOR ALL USING (true) WITH CHECK (true);
+
+-- VM log chunks table policies
+CREATE POLICY "Allow all operations on vm_log_chunks" ON public.vm_log_chunks
+FOR ALL USING (true) WITH CHECK (true);
+
 -- Create indexes for better performance
 CREATE INDEX IF NOT EXISTS idx_users_email ON users(email);
 CREATE INDEX IF NOT EXISTS idx_users_id ON users(id);
@@ -79,5 +114,103 @@ CREATE INDEX IF NOT EXISTS idx_password_resets_email ON password_resets(email);
 CREATE INDEX IF NOT EXISTS idx_password_resets_token ON password_resets(token);
 CREATE INDEX IF NOT EXISTS idx_password_resets_expires_at ON password_resets(expires_at);
 CREATE INDEX IF NOT EXISTS idx_password_resets_created_at ON password_resets(created_at);
+CREATE INDEX IF NOT EXISTS idx_verification_codes_email_created_unused ON verification_codes(email, created_at DESC) WHERE used = false;
+CREATE INDEX IF NOT EXISTS idx_password_resets_email_created_unused ON password_resets(email, created_at DESC) WHERE used = false;
 CREATE INDEX IF NOT EXISTS idx_vm_creation_logs_user_email ON vm_creation_logs(user_email);
-CREATE INDEX IF NOT EXISTS idx_vm_creation_logs_created_at ON vm_creation_logs(created_at);
\ No newline at end of file
+CREATE INDEX IF NOT EXISTS idx_vm_creation_logs_created_at ON vm_creation_logs(created_at);
+CREATE INDEX IF NOT EXISTS idx_vm_creation_logs_user_created_id ON vm_creation_logs(user_email, created_at DESC, id DESC);
+CREATE INDEX IF NOT EXISTS idx_vm_creation_logs_tags ON vm_creation_logs USING GIN (tags);
+CREATE INDEX IF NOT EXISTS idx_revoked_tokens_revoked_at ON revoked_tokens(revoked_at);
+CREATE INDEX IF NOT EXISTS idx_revoked_tokens_expires_at ON revoked_tokens(expires_at);
+CREATE INDEX IF NOT EXISTS idx_vm_log_chunks_created_at ON vm_log_chunks(created_at);
+
+-- Functions that collapse multi-call write paths into one round trip
+CREATE OR REPLACE FUNCTION get_or_create_user(p_email text, p_password_hash text DEFAULT NULL)
+RETURNS SETOF users
+LANGUAGE sql
+AS $$
+  INSERT INTO users (email, password_hash, email_verified, created_at)
+  VALUES (p_email, p_password_hash, false, now())
+  ON CONFLICT (email) DO UPDATE SET id = COALESCE(users.id, gen_random_uuid())
+  RETURNING *;
+$$;
+
+CREATE OR REPLACE FUNCTION verify_email_code(p_email text, p_code text)
+RETURNS jsonb
+LANGUAGE plpgsql
+AS $$
+DECLARE
+  v_code verification_codes%ROWTYPE;
+  v_user users%ROWTYPE;
+BEGIN
+  SELECT * INTO v_code FROM verification_codes
+  WHERE email = p_email AND used = false
+  ORDER BY created_at DESC
+  LIMIT 1
+  FOR UPDATE;
+
+  IF NOT FOUND THEN
+    -- Only used codes left (until reap_auth_rows deletes them): report the reuse
+    IF EXISTS (SELECT 1 FROM verification_codes WHERE email = p_email AND used) THEN
+      RETURN jsonb_build_object('status', 'used');
+    END IF;
+    RETURN jsonb_build_object('status', 'missing');
+  END IF;
+  IF v_code.expires_at < now() THEN
+    RETURN jsonb_build_object('status', 'expired');
+  END IF;
+  IF v_code.code <> p_code THEN
+    RETURN jsonb_build_object('status', 'invalid');
+  END IF;
+
+  UPDATE verification_codes SET used = true WHERE email = p_email AND used = false;
+
+  INSERT INTO users (email, email_verified, created_at)
+  VALUES (p_email, true, now())
+  ON CONFLICT (email) DO UPDATE SET email_verified = true, id = COALESCE(users.id, gen_random_uuid())
+  RETURNING * INTO v_user;
+
+  RETURN jsonb_build_object('status', 'verified', 'user', to_jsonb(v_user));
+END;
+$$;
+
+CREATE OR REPLACE FUNCTION replace_vm_log_chunks(p_log_id uuid, p_stream text, p_chunks jsonb)
+RETURNS void
+LANGUAGE sql
+AS $$
+  DELETE FROM vm_log_chunks WHERE log_id = p_log_id AND stream = p_stream;
+  INSERT INTO vm_log_chunks (log_id, stream, seq, codec, data, created_at)
+  SELECT p_log_id, p_stream, c.seq, c.codec, c.data, now()
+  FROM jsonb_to_recordset(p_chunks) AS c(seq int, codec text, data text);
+$$;
+
+CREATE OR REPLACE FUNCTION append_vm_log_chunks(p_log_id uuid, p_stream text, p_from_seq int, p_chunks jsonb)
+RETURNS void
+LANGUAGE sql
+AS $$
+  DELETE FROM vm_log_chunks WHERE log_id = p_log_id AND stream = p_stream AND seq >= p_from_seq;
+  INSERT INTO vm_log_chunks (log_id, stream, seq, codec, data, created_at)
+  SELECT p_log_id, p_stream, c.seq, c.codec, c.data, now()
+  FROM jsonb_to_recordset(p_chunks) AS c(seq int, codec text, data text);
+$$;
+
+-- Batched cleanup of used/expired verification codes and password resets
+CREATE OR REPLACE FUNCTION reap_auth_rows(p_table text, p_batch int)
+RETURNS int
+LANGUAGE plpgsql
+AS $$
+DECLARE
+  v_deleted int;
+BEGIN
+  IF p_table NOT IN ('verification_codes', 'password_resets') THEN
+    RAISE EXCEPTION 'reap_auth_rows: unsupported table %', p_table;
+  END IF;
+
+  EXECUTE format(
+    'DELETE FROM %I WHERE id IN (SELECT id FROM %I WHERE used OR expires_at < now() LIMIT $1)',
+    p_table, p_table
+  ) USING p_batch;
+  GET DIAGNOSTICS v_deleted = ROW_COUNT;
+  RETURN v_deleted;
+END;
+$$;
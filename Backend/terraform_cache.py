@@ -0,0 +1,176 @@
+import glob
+import hashlib
+import os
+import shutil
+import tempfile
+import threading
+
+from workspaces import VM_WORKSPACE_ROOT
+
+# ---Terraform Cache Configuration----
+TF_SHARED_DIR = os.path.join(VM_WORKSPACE_ROOT, ".terraform.d")
+TF_PLUGIN_CACHE_DIR = os.getenv("TF_PLUGIN_CACHE_DIR", os.path.join(TF_SHARED_DIR, "plugin-cache"))
+TF_PROVIDER_MIRROR_DIR = os.getenv("TF_PROVIDER_MIRROR_DIR", os.path.join(TF_SHARED_DIR, "mirror"))
+TF_CLI_CONFIG_FILE = os.path.join(TF_SHARED_DIR, "terraformrc")
+MIRRORED_PROVIDERS = ["registry.terraform.io/hashicorp/null"]
+FINGERPRINT_FILE = ".init-fingerprint"
+APPLIED_HASH_FILE = ".applied-hash"
+PLAN_FILE = "tfplan"
+
+# The plugin cache is not safe for concurrent installs, so real inits run one at a time
+_init_lock = threading.Lock()
+_mirror_lock = threading.Lock()
+_mirror_attempted = False
+
+
+def write_if_changed(path, content):
+    """Write content to path unless it already holds exactly that; returns True if written"""
+    if os.path.exists(path):
+        with open(path) as f:
+            if f.read() == content:
+                return False
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "w") as f:
+        f.write(content)
+    return True
+
+
+def config_fingerprint(terraform_dir):
+    """Hash of the rendered *.tf files in a workspace"""
+    digest = hashlib.sha256()
+    for path in sorted(glob.glob(os.path.join(terraform_dir, "*.tf"))):
+        digest.update(os.path.basename(path).encode("utf-8"))
+        with open(path, "rb") as f:
+            digest.update(f.read())
+    return digest.hexdigest()
+
+
+def mirror_seeded():
+    return all(
+        os.path.isdir(os.path.join(TF_PROVIDER_MIRROR_DIR, *provider.split("/")))
+        for provider in MIRRORED_PROVIDERS
+    )
+
+
+def seed_provider_mirror(run_command, config_text):
+    """Fill the local mirror with the providers config_text needs (needs network once)"""
+    global _mirror_attempted
+    with _mirror_lock:
+        if mirror_seeded() or _mirror_attempted:
+            return mirror_seeded()
+        _mirror_attempted = True
+        scratch = tempfile.mkdtemp(prefix="tf-mirror-")
+        try:
+            with open(os.path.join(scratch, "main.tf"), "w") as f:
+                f.write(config_text)
+            run_command(f'terraform providers mirror "{TF_PROVIDER_MIRROR_DIR}"', cwd=scratch)
+            print(f"Seeded terraform provider mirror at {TF_PROVIDER_MIRROR_DIR}")
+        except Exception as e:
+            print(f"Could not seed terraform provider mirror, using the registry: {e}")
+        finally:
+            shutil.rmtree(scratch, ignore_errors=True)
+        return mirror_seeded()
+
+
+def _write_cli_config():
+    # Prefer the local mirror for the providers we seed, the registry for the rest
+    if mirror_seeded():
+        mirror_path = TF_PROVIDER_MIRROR_DIR.replace("\\", "/")
+        providers = ", ".join(f'"{p}"' for p in MIRRORED_PROVIDERS)
+        content = f'''provider_installation {{
+  filesystem_mirror {{
+    path    = "{mirror_path}"
+    include = [{providers}]
+  }}
+  direct {{
+    exclude = [{providers}]
+  }}
+}}
+'''
+    else:
+        content = "provider_installation {\n  direct {}\n}\n"
+    write_if_changed(TF_CLI_CONFIG_FILE, content)
+
+
+def terraform_env():
+    """Environment for terraform subprocesses: shared plugin cache and CLI config"""
+    os.makedirs(TF_PLUGIN_CACHE_DIR, exist_ok=True)
+    _write_cli_config()
+    env = os.environ.copy()
+    env["TF_PLUGIN_CACHE_DIR"] = TF_PLUGIN_CACHE_DIR
+    env["TF_PLUGIN_CACHE_MAY_BREAK_DEPENDENCY_LOCK_FILE"] = "true"
+    env["TF_CLI_CONFIG_FILE"] = TF_CLI_CONFIG_FILE
+    env["TF_IN_AUTOMATION"] = "1"
+    return env
+
+
+def is_initialized(terraform_dir, fingerprint=None):
+    """True when the workspace was already initialised for exactly this config"""
+    path = os.path.join(terraform_dir, ".terraform", FINGERPRINT_FILE)
+    if not os.path.exists(path):
+        return False
+    with open(path) as f:
+        return f.read().strip() == (fingerprint or config_fingerprint(terraform_dir))
+
+
+def ensure_initialized(terraform_dir, run_command, on_line=None):
+    """Run terraform init only if the config changed since the last init.
+
+    Returns (output, skipped).
+    """
+    fingerprint = config_fingerprint(terraform_dir)
+    if is_initialized(terraform_dir, fingerprint):
+        return "Workspace already initialised for this config, skipping terraform init", True
+
+    with open(os.path.join(terraform_dir, "main.tf")) as f:
+        seed_provider_mirror(run_command, f.read())
+
+    with _init_lock:
+        output = run_command("terraform init -input=false", cwd=terraform_dir,
+                             on_line=on_line, env=terraform_env())
+    with open(os.path.join(terraform_dir, ".terraform", FINGERPRINT_FILE), "w") as f:
+        f.write(fingerprint)
+    return output, False
+
+
+def workspace_hash(terraform_dir):
+    """Hash of everything an apply depends on: the *.tf files and the Vagrantfile"""
+    digest = hashlib.sha256(config_fingerprint(terraform_dir).encode("utf-8"))
+    vagrantfile = os.path.join(terraform_dir, "vagrant", "Vagrantfile")
+    if os.path.exists(vagrantfile):
+        with open(vagrantfile, "rb") as f:
+            digest.update(f.read())
+    return digest.hexdigest()
+
+
+def _record_applied(terraform_dir, content_hash):
+    with open(os.path.join(terraform_dir, APPLIED_HASH_FILE), "w") as f:
+        f.write(content_hash)
+
+
+def apply_if_changed(terraform_dir, run_command, on_line=None):
+    """Apply only when the workspace changed since its last successful apply.
+
+    An unchanged hash returns straight away; otherwise `terraform plan
+    -detailed-exitcode` decides whether there is a delta, and only a
+    non-empty plan is applied. Returns (output, skipped).
+    """
+    content_hash = workspace_hash(terraform_dir)
+    applied_path = os.path.join(terraform_dir, APPLIED_HASH_FILE)
+    if os.path.exists(applied_path) and os.path.exists(os.path.join(terraform_dir, "terraform.tfstate")):
+        with open(applied_path) as f:
+            if f.read().strip() == content_hash:
+                return "Workspace unchanged since last apply, skipping terraform apply", True
+
+    env = terraform_env()
+    plan_output, exit_code = run_command(
+        f"terraform plan -input=false -detailed-exitcode -out={PLAN_FILE}",
+        cwd=terraform_dir, on_line=on_line, env=env, ok_codes=(0, 2), with_exit_code=True
+    )
+    if exit_code == 0:
+        _record_applied(terraform_dir, content_hash)
+        return "terraform plan reported no changes, skipping terraform apply\n" + plan_output, True
+
+    output = run_command(f"terraform apply -input=false {PLAN_FILE}", cwd=terraform_dir, on_line=on_line, env=env)
+    _record_applied(terraform_dir, content_hash)
+    return output, False
@@ -0,0 +1,88 @@
+"""Shared fixtures: the API runs against bench/fake_supabase.py and the stub terraform/vagrant in bench/bin.
+
+Run from Backend/: `python -m pytest tests`. The environment below is set
+before main is imported, since most settings are read at import time.
+"""
+import os
+import shutil
+import sys
+import tempfile
+import time
+import uuid
+
+import pytest
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+
+from bench.fake_supabase import FakeSupabase  # noqa: E402
+
+FAKE = FakeSupabase(latency=0, jitter=0)
+FAKE.start()
+
+os.environ.update({
+    "SUPABASE_URL": FAKE.url,
+    "SUPABASE_SERVICE_ROLE_KEY": "test",
+    "JWT_SECRET": "test-secret-of-at-least-thirty-two-bytes",
+    "VM_WORKSPACE_ROOT": tempfile.mkdtemp(prefix="vm-workspaces-"),
+    "PATH": os.path.join(BACKEND_DIR, "bench", "bin") + os.pathsep + os.environ.get("PATH", ""),
+    "BENCH_TIME_SCALE": "0",
+    "BENCH_OUTPUT_LINES": "8",
+    "BENCH_VAGRANT_HOME": tempfile.mkdtemp(prefix="vagrant-bench-"),
+    "GOLDEN_IMAGE_CACHE_SIZE": "0",
+    "WARM_POOL_SIZE": "0",
+    "VM_RECONCILE_INTERVAL": "3600",
+    "REAPER_INTERVAL": "3600",
+    "LOG_RETENTION_DAYS": "0",
+    "HOST_CPUS": "8",
+    "HOST_MEMORY_MB": "16384",
+    "HOST_RESERVED_MEMORY_MB": "0",
+    "BCRYPT_ROUNDS": "4",
+    "PASSWORD_HASH_WORKERS": "1",
+})
+os.environ.pop("NODE_TOKEN", None)
+os.environ.pop("SMTP_HOST", None)
+
+
+@pytest.fixture(scope="session")
+def fake():
+    yield FAKE
+    FAKE.stop()
+
+
+@pytest.fixture(scope="session")
+def api(fake):
+    """TestClient with the app's startup run, so the repository client is bound to its loop"""
+    from fastapi.testclient import TestClient
+
+    import main
+
+    with TestClient(main.app) as client:
+        yield client
+    shutil.rmtree(os.environ["VM_WORKSPACE_ROOT"], ignore_errors=True)
+    shutil.rmtree(os.environ["BENCH_VAGRANT_HOME"], ignore_errors=True)
+
+
+@pytest.fixture
+def user(api, fake):
+    """A fresh verified user and its bearer headers"""
+    import main
+
+    email = f"user-{uuid.uuid4().hex[:8]}@example.com"
+    row = fake.insert("users", [{"email": email, "email_verified": True}])[0]
+    token = main.create_access_token({"user_id": row["id"], "email": email, "email_verified": True})
+    return {"email": email, "headers": {"Authorization": f"Bearer {token}"}}
+
+
+@pytest.fixture
+def wait_for_job(api):
+    """Polls GET /jobs/{id} until the job finishes and returns it"""
+    def wait(user, job_id, timeout=30):
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            job = api.get(f"/jobs/{job_id}", headers=user["headers"]).json()
+            if job["status"] in ("succeeded", "failed"):
+                return job
+            time.sleep(0.05)
+        raise AssertionError(f"job {job_id} did not finish in {timeout}s")
+    return wait
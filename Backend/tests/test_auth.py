@@ -0,0 +1,32 @@
+from datetime import datetime, timedelta, timezone
+
+
+def in_an_hour():
+    return (datetime.now(timezone.utc) + timedelta(hours=1)).isoformat()
+
+
+def test_reused_reset_token_is_reported_as_used(api, fake, user):
+    fake.insert("password_resets", [{"email": user["email"], "token": "reset-token", "expires_at": in_an_hour()}])
+    body = {"email": user["email"], "token": "reset-token", "new_password": "a-new-password"}
+
+    assert api.post("/auth/reset-password", json=body).status_code == 200
+    reused = api.post("/auth/reset-password", json=body)
+    assert reused.status_code == 400
+    assert reused.json()["detail"] == "Reset token already used"
+
+
+def test_reset_without_a_request_is_reported_as_missing(api, user):
+    response = api.post("/auth/reset-password",
+                        json={"email": user["email"], "token": "whatever", "new_password": "a-new-password"})
+    assert response.status_code == 400
+    assert response.json()["detail"] == "No reset request found"
+
+
+def test_reused_verification_code_is_reported_as_used(api, fake, user):
+    fake.insert("verification_codes", [{"email": user["email"], "code": "123456", "expires_at": in_an_hour()}])
+    body = {"email": user["email"], "code": "123456"}
+
+    assert api.post("/auth/verify-code", json=body).status_code == 200
+    reused = api.post("/auth/verify-code", json=body)
+    assert reused.status_code == 400
+    assert reused.json()["detail"] == "Verification code already used"
@@ -0,0 +1,77 @@
+import os
+import uuid
+
+import pytest
+
+import main
+
+
+def create(api, user, name):
+    return api.post("/create-vm", headers=user["headers"],
+                    json={"box_name": "ubuntu/focal64", "vm_name": name, "cpus": 1, "memory": 512})
+
+
+def assert_nothing_held(user, name):
+    key = main.workspace_allocator.key_for(user["email"], name)
+    assert main.workspace_allocator.find(user["email"], name) is None
+    assert main.workspace_allocator.ip_pool.get(key) is None
+    assert main.node_registry.node_for(key) is None
+
+
+def test_full_job_queue_releases_the_workspace_and_ip(api, user, monkeypatch):
+    monkeypatch.setattr(main.job_queue, "max_pending", 0)
+    leases = main.workspace_allocator.ip_pool.leases()
+    reserved = main.scheduler.free()
+    name = f"vm-{uuid.uuid4().hex[:8]}"
+
+    response = create(api, user, name)
+    assert response.status_code == 503
+    assert response.headers["Retry-After"] == "30"
+    assert_nothing_held(user, name)
+    assert main.workspace_allocator.ip_pool.leases() == leases
+    assert main.scheduler.free() == reserved
+
+
+def test_full_scheduler_queue_releases_the_workspace(api, user, monkeypatch):
+    monkeypatch.setattr(main.scheduler, "queue_limit", 0)
+    cpus, memory = main.scheduler.free()
+    assert main.scheduler.try_reserve("test-filler", cpus, memory)
+    try:
+        name = f"vm-{uuid.uuid4().hex[:8]}"
+        assert create(api, user, name).status_code == 503
+        assert_nothing_held(user, name)
+        assert main.scheduler.free() == (0, 0)
+    finally:
+        main.scheduler.release("test-filler")
+
+
+@pytest.mark.parametrize("name", ["-leading-dash", "has space", "semi;colon", "a" * 64])
+def test_unsafe_vm_names_are_rejected(api, user, name):
+    assert create(api, user, name).status_code == 422
+
+
+def test_failed_batch_gives_back_every_workspace_and_reservation(api, user, wait_for_job, monkeypatch):
+    run_command = main.run_command
+
+    def failing_apply(command, *args, **kwargs):
+        if command.startswith("terraform apply"):
+            raise RuntimeError("terraform apply exited with 2")
+        return run_command(command, *args, **kwargs)
+
+    monkeypatch.setattr(main, "run_command", failing_apply)
+    leases = main.workspace_allocator.ip_pool.leases()
+    free = main.scheduler.free()
+    batches = set(os.listdir(main.workspace_allocator.batches_dir)) if os.path.isdir(main.workspace_allocator.batches_dir) else set()
+    names = [f"vm-{uuid.uuid4().hex[:8]}" for _ in range(3)]
+
+    response = api.post("/create-vms", headers=user["headers"], json={"vms": [
+        {"box_name": "ubuntu/focal64", "vm_name": name, "cpus": 1, "memory": 512} for name in names]})
+    assert response.status_code == 202
+    assert wait_for_job(user, response.json()["job_id"])["status"] == "failed"
+
+    for name in names:
+        assert_nothing_held(user, name)
+    assert main.workspace_allocator.ip_pool.leases() == leases
+    assert main.scheduler.free() == free
+    assert main.linked_clones.stats()["clones"] == 0
+    assert set(os.listdir(main.workspace_allocator.batches_dir)) == batches
@@ -0,0 +1,13 @@
+from jobs import JOB_LOG_LIMIT, Job
+
+
+def test_entry_count_keeps_counting_past_the_log_limit():
+    job = Job("create-vm", "a@example.com")
+    for i in range(JOB_LOG_LIMIT + 5):
+        job.output(f"line {i}")
+    body = job.to_dict()
+    assert len(body["phases"]) == JOB_LOG_LIMIT
+    assert body["entry_count"] == JOB_LOG_LIMIT + 5
+    # What a client that had seen the first 3 entries still has to show
+    fresh = min(body["entry_count"] - 3, len(body["phases"]))
+    assert body["phases"][-fresh:][-1]["message"] == f"line {JOB_LOG_LIMIT + 4}"
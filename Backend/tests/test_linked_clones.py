@@ -0,0 +1,88 @@
+import os
+
+import pytest
+
+import linked_clones
+from linked_clones import LinkedCloneMasters
+
+BOX = "ubuntu/focal64"
+
+
+@pytest.fixture
+def box_home(tmp_path, monkeypatch):
+    """A VAGRANT_HOME holding BOX with a master_id, as Vagrant leaves it after the first linked clone"""
+    monkeypatch.setattr(linked_clones, "VAGRANT_HOME", str(tmp_path / "vagrant.d"))
+    directory = tmp_path / "vagrant.d" / "boxes" / "ubuntu-VAGRANTSLASH-focal64" / "1.0" / "virtualbox"
+    directory.mkdir(parents=True)
+    (directory / "box-disk1.vmdk").write_bytes(b"\0" * 4096)
+    (directory / "master_id").write_text("master-1\n")
+    return directory
+
+
+class Commands:
+    def __init__(self, fail=False):
+        self.fail = fail
+        self.calls = []
+
+    def __call__(self, command, on_line=None, cwd=None):
+        self.calls.append(command)
+        if self.fail:
+            raise RuntimeError("VBoxManage failed")
+        return ""
+
+
+def test_master_is_removed_with_its_last_clone(box_home, tmp_path):
+    commands = Commands()
+    masters = LinkedCloneMasters(commands, state_file=str(tmp_path / "state" / "linked_clones.json"))
+    for key in ("a", "b"):
+        masters.acquire(key, BOX)
+        masters.built(key, str(tmp_path / key))
+    assert masters.stats()["boxes"][BOX]["clones"] == 2
+    assert masters.saved_bytes("a") == 4096
+
+    masters.release("a")
+    assert commands.calls == []
+    masters.release("b")
+    assert commands.calls == [f"{linked_clones.VBOXMANAGE} unregistervm master-1 --delete"]
+    assert not os.path.exists(box_home / "master_id")
+    assert masters.stats()["clones"] == 0
+
+
+def test_releasing_an_unknown_key_does_nothing(box_home, tmp_path):
+    commands = Commands()
+    masters = LinkedCloneMasters(commands)
+    masters.acquire("a", BOX)
+    masters.release("never-cloned")
+    assert masters.is_clone("a")
+    assert commands.calls == []
+
+
+def test_master_still_in_use_is_kept_for_the_next_release(box_home, tmp_path):
+    commands = Commands(fail=True)
+    masters = LinkedCloneMasters(commands)
+    masters.acquire("a", BOX)
+    masters.built("a", str(tmp_path / "a"))
+    masters.release("a")
+    assert os.path.exists(box_home / "master_id")
+
+    commands.fail = False
+    masters.acquire("b", BOX)
+    masters.release("b")
+    assert commands.calls == [f"{linked_clones.VBOXMANAGE} unregistervm master-1 --delete"] * 2
+    assert not os.path.exists(box_home / "master_id")
+
+
+def test_counts_follow_renames_and_survive_a_restart(box_home, tmp_path):
+    state_file = str(tmp_path / "linked_clones.json")
+    masters = LinkedCloneMasters(Commands(), state_file=state_file)
+    masters.acquire("warm-1", BOX)
+    masters.built("warm-1", str(tmp_path / "warm-1"))
+    masters.rekey("warm-1", "owned")
+
+    commands = Commands()
+    restarted = LinkedCloneMasters(commands, state_file=state_file)
+    assert not restarted.is_clone("warm-1")
+    assert restarted.is_clone("owned")
+    assert restarted.saved_bytes("owned") == 4096
+    restarted.release("owned")
+    assert commands.calls == [f"{linked_clones.VBOXMANAGE} unregistervm master-1 --delete"]
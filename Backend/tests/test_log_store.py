@@ -0,0 +1,67 @@
+import json
+import uuid
+
+import pytest
+
+import log_store
+import repository as db
+
+
+@pytest.fixture
+def small_chunks(api, monkeypatch):
+    """Chunks of a few bytes, so even short logs span several rows"""
+    monkeypatch.setattr(log_store, "LOG_CHUNK_BYTES", 32)
+
+
+def stored_chunks(fake, log_id, stream):
+    return sorted(c["seq"] for c in fake.tables.get("vm_log_chunks", [])
+                  if c["log_id"] == log_id and c["stream"] == stream)
+
+
+def test_output_round_trips_across_chunks(small_chunks, fake):
+    log_id = str(uuid.uuid4())
+    text = "".join(f"line {i}: {uuid.uuid4()} ünïcode\n" for i in range(200))
+    db.run_sync(log_store.write(log_id, log_store.OUTPUT_STREAM, text))
+
+    seqs = stored_chunks(fake, log_id, log_store.OUTPUT_STREAM)
+    assert len(seqs) > log_store.LOG_READ_BATCH  # read back over more than one round trip
+    assert seqs == list(range(len(seqs)))
+    assert db.run_sync(log_store.read_text(log_id, log_store.OUTPUT_STREAM)) == text
+
+
+def test_rewrite_replaces_the_whole_stream(small_chunks, fake):
+    log_id = str(uuid.uuid4())
+    db.run_sync(log_store.write(log_id, log_store.OUTPUT_STREAM, "x" * 5000 + str(uuid.uuid4()) * 50))
+    db.run_sync(log_store.write(log_id, log_store.OUTPUT_STREAM, "short"))
+    assert stored_chunks(fake, log_id, log_store.OUTPUT_STREAM) == [0]
+    assert db.run_sync(log_store.read_text(log_id, log_store.OUTPUT_STREAM)) == "short"
+
+
+def test_missing_stream_reads_as_none(api):
+    assert db.run_sync(log_store.read_text(str(uuid.uuid4()), log_store.OUTPUT_STREAM)) is None
+    assert db.run_sync(log_store.read_logs(str(uuid.uuid4()))) is None
+
+
+def test_appended_entries_read_back_while_and_after_running(small_chunks, fake, monkeypatch):
+    log_id = str(uuid.uuid4())
+    appender = log_store.LogsAppender(log_id)
+    rewrites = []
+    append_log_chunks = db.append_log_chunks
+
+    async def record(log_id, stream, from_seq, chunks):
+        rewrites.append((from_seq, len(chunks)))
+        await append_log_chunks(log_id, stream, from_seq, chunks)
+
+    monkeypatch.setattr(db, "append_log_chunks", record)
+    entries = [{"level": "output", "message": f"{uuid.uuid4()} {i}"} for i in range(40)]
+    for i in range(0, len(entries), 4):
+        db.run_sync(appender.append_entries(entries[i:i + 4], i + 4))
+        assert db.run_sync(log_store.read_logs(log_id)) == entries[:i + 4]
+
+    # Each flush starts at the last partial chunk instead of rewriting the stream
+    starts = [from_seq for from_seq, _ in rewrites]
+    assert starts == sorted(starts) and starts[-1] > 0
+
+    db.run_sync(log_store.write_logs(log_id, entries[-10:]))
+    assert db.run_sync(log_store.read_logs(log_id)) == entries[-10:]
+    assert json.loads(db.run_sync(log_store.read_text(log_id, log_store.LOGS_STREAM))) == entries[-10:]
@@ -0,0 +1,49 @@
+import pytest
+
+import main
+import nodes
+from jobs import Job
+from nodes import NodeRegistry
+from reconciler import VMReconciler
+from workspaces import WorkspaceAllocator
+
+
+@pytest.fixture
+def registry(tmp_path, monkeypatch):
+    registry = NodeRegistry(None, state_dir=str(tmp_path))
+    monkeypatch.setattr(main, "node_registry", registry)
+    return registry
+
+
+def test_failed_remote_build_drops_its_placement(api, registry, monkeypatch):
+    node = registry.register("agent-1", "http://agent-1:8101", 4, 4096)
+    req = main.VMRequest(box_name="ubuntu/focal64", vm_name="remote-vm", cpus=1, memory=512)
+    key = main.workspace_allocator.key_for("owner@example.com", req.vm_name)
+    registry.assign(key, node.id)
+    assert node.scheduler.try_reserve(key, 1, 512)
+
+    def unreachable(*args, **kwargs):
+        raise RuntimeError("agent unreachable")
+
+    monkeypatch.setattr(nodes, "call_agent", unreachable)
+    with pytest.raises(RuntimeError):
+        main.provision_remote_vm(Job("create-vm", "owner@example.com"), req, node)
+
+    assert registry.node_for(key) is None
+    assert node.scheduler.free() == (4, 4096)
+
+
+def test_reconciler_does_not_load_vms_placed_on_agents(tmp_path):
+    allocator = WorkspaceAllocator(str(tmp_path))
+    # Placements survive a restart before the agent has re-registered
+    NodeRegistry(None, state_dir=str(tmp_path)).assign(allocator.key_for("a@example.com", "remote"), "agent-1")
+    registry = NodeRegistry(None, state_dir=str(tmp_path))
+
+    reconciler = VMReconciler(lambda *a, **k: "", allocator, lambda changes: None)
+    reconciler.load([
+        {"id": "1", "user_email": "a@example.com", "vm_name": "remote", "vm_state": "running"},
+        {"id": "2", "user_email": "a@example.com", "vm_name": "local", "vm_state": "running"},
+    ], skip=registry.is_remote)
+
+    assert reconciler.get("a@example.com", "remote") is None
+    assert reconciler.get("a@example.com", "local")["state"] == "running"
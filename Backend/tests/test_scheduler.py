@@ -0,0 +1,80 @@
+import pytest
+
+from scheduler import CapacityError, HostScheduler, SchedulerFullError
+
+
+def make_scheduler(tmp_path=None, cpus=4, memory_mb=4096, queue_limit=2):
+    state_file = str(tmp_path / "reservations.json") if tmp_path else None
+    return HostScheduler(cpus=cpus, memory_mb=memory_mb, overcommit=1, reserved_memory_mb=0,
+                         queue_limit=queue_limit, state_file=state_file)
+
+
+def test_admits_what_fits_and_queues_the_rest():
+    scheduler = make_scheduler()
+    admitted = []
+    assert scheduler.request({"a": (2, 2048)}, lambda: admitted.append("a"))
+    assert scheduler.request({"b": (2, 1024)}, lambda: admitted.append("b"))
+    assert not scheduler.request({"c": (1, 512)}, lambda: admitted.append("c"))
+    assert admitted == ["a", "b"]
+    assert scheduler.free() == (0, 1024)
+
+    scheduler.release("a")
+    assert admitted == ["a", "b", "c"]
+    assert scheduler.free() == (1, 2560)
+
+
+def test_waiting_requests_are_admitted_in_order():
+    scheduler = make_scheduler()
+    admitted = []
+    scheduler.request({"a": (4, 1024)}, lambda: admitted.append("a"))
+    scheduler.request({"big": (3, 1024)}, lambda: admitted.append("big"))
+    # Would fit beside the big one, but must not overtake it
+    assert not scheduler.request({"small": (1, 512)}, lambda: admitted.append("small"))
+    scheduler.release("a")
+    assert admitted == ["a", "big", "small"]
+
+
+def test_full_queue_raises_scheduler_full():
+    scheduler = make_scheduler(queue_limit=1)
+    scheduler.request({"a": (4, 1024)}, lambda: None)
+    scheduler.request({"b": (1, 512)}, lambda: None)
+    with pytest.raises(SchedulerFullError):
+        scheduler.request({"c": (1, 512)}, lambda: None)
+    assert scheduler.stats()["waiting"] == 1
+
+
+def test_oversized_request_is_a_capacity_error():
+    scheduler = make_scheduler()
+    with pytest.raises(CapacityError):
+        scheduler.request({"a": (5, 512)}, lambda: None)
+
+
+def test_try_reserve_never_jumps_the_queue():
+    scheduler = make_scheduler()
+    scheduler.request({"a": (3, 1024)}, lambda: None)
+    scheduler.request({"big": (2, 512)}, lambda: None)
+    # One vCPU is free, but it is owed to the waiting request
+    assert not scheduler.try_reserve("warm", 1, 512)
+    scheduler.release("a")
+    assert scheduler.try_reserve("warm", 1, 512)
+    assert scheduler.free() == (1, 4096 - 1024)
+
+
+def test_failed_admission_gives_the_reservation_back():
+    scheduler = make_scheduler()
+
+    def fail():
+        raise RuntimeError("could not start")
+
+    scheduler.request({"a": (2, 1024)}, fail)
+    assert scheduler.free() == (4, 4096)
+
+
+def test_reservations_survive_a_restart(tmp_path):
+    scheduler = make_scheduler(tmp_path)
+    scheduler.request({"a": (2, 1024)}, lambda: None)
+    scheduler.rekey("a", "renamed")
+    restarted = make_scheduler(tmp_path)
+    assert restarted.free() == (2, 3072)
+    restarted.release("renamed")
+    assert restarted.free() == (4, 4096)
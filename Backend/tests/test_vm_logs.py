@@ -0,0 +1,67 @@
+import base64
+import json
+import uuid
+from datetime import datetime, timedelta, timezone
+
+
+def seed_logs(fake, email, count, ties=0):
+    """count logs a second apart, the newest `ties` of them sharing one created_at"""
+    start = datetime(2026, 1, 1, tzinfo=timezone.utc)
+    rows = []
+    for i in range(count):
+        created_at = start + timedelta(seconds=min(i, count - ties))
+        rows.append({"id": str(uuid.uuid4()), "user_email": email, "box_name": "ubuntu/focal64",
+                     "vm_name": f"vm-{i}", "cpus": 1, "memory": 512, "status": "success",
+                     "created_at": created_at.isoformat()})
+    fake.insert("vm_creation_logs", rows)
+    return sorted(rows, key=lambda row: (row["created_at"], row["id"]), reverse=True)
+
+
+def test_cursor_pages_cover_every_log_once_newest_first(api, fake, user):
+    expected = seed_logs(fake, user["email"], 7, ties=3)
+    seen, cursor = [], None
+    while True:
+        params = {"limit": 2, **({"cursor": cursor} if cursor else {})}
+        response = api.get("/vm-logs", params=params, headers=user["headers"])
+        assert response.status_code == 200
+        body = response.json()
+        assert len(body["logs"]) <= 2
+        seen += [log["id"] for log in body["logs"]]
+        cursor = body["next_cursor"]
+        if cursor is None:
+            break
+    assert seen == [row["id"] for row in expected]
+
+
+def test_default_projection_leaves_out_heavy_columns(api, fake, user):
+    seed_logs(fake, user["email"], 1)
+    log = api.get("/vm-logs", headers=user["headers"]).json()["logs"][0]
+    assert "terraform_output" not in log and "logs" not in log
+
+
+def test_invalid_cursor_is_rejected(api, user):
+    response = api.get("/vm-logs", params={"cursor": "not-a-cursor"}, headers=user["headers"])
+    assert response.status_code == 400
+
+
+def test_cursor_with_filter_syntax_is_rejected(api, user):
+    crafted = json.dumps(['2026-01-01",user_email.neq."x', str(uuid.uuid4())]).encode("utf-8")
+    cursor = base64.urlsafe_b64encode(crafted).decode("ascii")
+    response = api.get("/vm-logs", params={"cursor": cursor}, headers=user["headers"])
+    assert response.status_code == 400
+
+
+def test_unchanged_page_answers_304_until_it_changes(api, fake, user):
+    seed_logs(fake, user["email"], 2)
+    first = api.get("/vm-logs", headers=user["headers"])
+    etag = first.headers["ETag"]
+
+    cached = api.get("/vm-logs", headers={**user["headers"], "If-None-Match": etag})
+    assert cached.status_code == 304
+    assert cached.content == b""
+    assert cached.headers["ETag"] == etag
+
+    seed_logs(fake, user["email"], 1)
+    changed = api.get("/vm-logs", headers={**user["headers"], "If-None-Match": etag})
+    assert changed.status_code == 200
+    assert changed.headers["ETag"] != etag
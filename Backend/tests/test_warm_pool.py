@@ -0,0 +1,43 @@
+import time
+
+from warm_pool import WarmPool
+from workspaces import IPPool, WorkspaceAllocator
+
+PROFILE = ("ubuntu/focal64", 1, 512)
+
+
+def wait_for_builds(pool, timeout=10):
+    deadline = time.monotonic() + timeout
+    while pool.stats()["profiles"]["ubuntu/focal64:1:512"]["building"]:
+        assert time.monotonic() < deadline, "warm builds did not finish"
+        time.sleep(0.01)
+
+
+def test_failed_build_gives_back_its_workspace_ip_and_reservation(tmp_path):
+    allocator = WorkspaceAllocator(str(tmp_path), ip_pool=IPPool("10.0.0.0/28", lease_file=str(tmp_path / "leases.json")))
+    reserved, discarded = set(), []
+
+    def build(workspace, profile, vm_name):
+        raise RuntimeError("vagrant up failed")
+
+    def reserve(key, profile):
+        reserved.add(key)
+        return True
+
+    def discard(key, workspace):
+        discarded.append(workspace.key)
+        reserved.discard(key)
+
+    pool = WarmPool(allocator, build, profiles=[PROFILE], size=3, reserve_fn=reserve, discard_fn=discard)
+    try:
+        for _ in range(3):  # the replenisher keeps retrying a broken profile
+            pool.refill()
+            wait_for_builds(pool)
+    finally:
+        pool.stop()
+
+    assert pool.stats()["build_failures"] == 9
+    assert len(discarded) == 9
+    assert allocator.ip_pool.leases() == {}
+    assert reserved == set()
+    assert not list((tmp_path / "workspaces").iterdir())
@@ -0,0 +1,88 @@
+import hashlib
+import os
+import threading
+import time
+from datetime import datetime
+
+import jwt
+
+from cache import TTLCache
+
+# ---Token Cache Configuration----
+TOKEN_CACHE_SIZE = int(os.getenv("TOKEN_CACHE_SIZE", "10000"))  # 0 disables the cache
+REVOCATION_REFRESH_SECONDS = float(os.getenv("REVOCATION_REFRESH_SECONDS", "30"))
+
+
+def token_digest(token):
+    return hashlib.sha256(token.encode("utf-8")).hexdigest()
+
+
+class RevokedTokenError(Exception):
+    pass
+
+
+class TokenVerifier:
+    """JWT verification with a cache of already-verified tokens and a revocation set.
+
+    Verified tokens are cached by digest until their own `exp`, so repeat
+    requests skip the HMAC check. Revoked token ids (the `jti` claim, or the
+    token digest for tokens issued without one) live in an in-memory dict
+    mirrored from the revoked_tokens table, checked in O(1) on every call.
+    """
+
+    def __init__(self, secret, algorithm, cache_size=TOKEN_CACHE_SIZE):
+        self.secret = secret
+        self.algorithm = algorithm
+        self.cache = TTLCache(cache_size, ttl=0)
+        self._revoked = {}  # token id -> expires_at (epoch seconds)
+        self._lock = threading.Lock()
+        self.last_synced = None  # revoked_at of the newest row seen
+
+    def verify(self, token):
+        """Claims for a valid, unrevoked token; raises jwt errors or RevokedTokenError"""
+        digest = token_digest(token)
+        claims = self.cache.get(digest)
+        if claims is None:
+            payload = jwt.decode(token, self.secret, algorithms=[self.algorithm])
+            claims = {
+                "user_id": payload.get("user_id"),
+                "email": payload.get("email"),
+                "jti": payload.get("jti") or digest,
+                "exp": payload.get("exp"),
+            }
+            if claims["exp"] is not None:
+                self.cache.set(digest, claims, expires_at=claims["exp"])
+        if self.is_revoked(claims["jti"]):
+            raise RevokedTokenError("Token has been revoked")
+        return dict(claims)
+
+    def is_revoked(self, token_id):
+        with self._lock:
+            expires_at = self._revoked.get(token_id)
+        return expires_at is not None and expires_at > time.time()
+
+    def revoke(self, token_id, expires_at):
+        with self._lock:
+            self._revoked[token_id] = expires_at
+
+    def load_revocations(self, rows):
+        """Merge revoked_tokens rows and forget ids whose tokens have expired anyway"""
+        now = time.time()
+        with self._lock:
+            for row in rows:
+                self._revoked[row["jti"]] = _epoch(row["expires_at"])
+                if self.last_synced is None or row["revoked_at"] > self.last_synced:
+                    self.last_synced = row["revoked_at"]
+            for token_id in [t for t, exp in self._revoked.items() if exp <= now]:
+                del self._revoked[token_id]
+
+    def stats(self):
+        with self._lock:
+            revoked = len(self._revoked)
+        return {"verified_cache": self.cache.stats(), "revoked": revoked}
+
+
+def _epoch(value):
+    if isinstance(value, (int, float)):
+        return float(value)
+    return datetime.fromisoformat(value).timestamp()
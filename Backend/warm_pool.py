@@ -0,0 +1,223 @@
+import json
+import os
+import threading
+import time
+import traceback
+import uuid
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+# ---Warm Pool Configuration----
+# Comma separated box:cpus:memory profiles, e.g. "ubuntu/bionic64:2:2048,ubuntu/focal64:1:1024"
+WARM_POOL_PROFILES = os.getenv("WARM_POOL_PROFILES", "")
+WARM_POOL_SIZE = int(os.getenv("WARM_POOL_SIZE", "0"))  # ready VMs kept per profile
+WARM_POOL_WORKERS = int(os.getenv("WARM_POOL_WORKERS", "1"))
+WARM_POOL_INTERVAL = float(os.getenv("WARM_POOL_INTERVAL", "30"))  # seconds between refill checks
+
+WARM_POOL_OWNER = "warm-pool"
+WARM_MARKER_FILE = ".warm-profile"
+
+
+def parse_profiles(spec):
+    profiles = []
+    for item in spec.split(","):
+        item = item.strip()
+        if not item:
+            continue
+        box_name, cpus, memory = item.rsplit(":", 2)
+        profiles.append((box_name, int(cpus), int(memory)))
+    return profiles
+
+
+def profile_label(profile):
+    box_name, cpus, memory = profile
+    return f"{box_name}:{cpus}:{memory}"
+
+
+class WarmPool:
+    """Keeps pre-booted, provisioned VMs per (box_name, cpus, memory) profile.
+
+    build_fn(workspace, profile, vm_name) boots a VM into a workspace; claimed
+    VMs are moved to the requesting user's workspace and the replenisher
+    builds a replacement in the background. reserve_fn(key, profile), when
+    given, must return True before a build starts, and on_claim(old, new)
+    is told about every workspace handed over. When a build fails,
+    discard_fn(key, workspace) tears down what it left behind and frees the
+    reservation (workspace is None if it was never acquired); the pool then
+    releases the workspace and its IP.
+    """
+
+    def __init__(self, allocator, build_fn, profiles=None, size=WARM_POOL_SIZE,
+                 workers=WARM_POOL_WORKERS, interval=WARM_POOL_INTERVAL, reserve_fn=None, on_claim=None,
+                 discard_fn=None):
+        self.allocator = allocator
+        self.build_fn = build_fn
+        self.reserve_fn = reserve_fn
+        self.discard_fn = discard_fn
+        self.on_claim = on_claim
+        self.profiles = profiles if profiles is not None else parse_profiles(WARM_POOL_PROFILES)
+        self.size = size
+        self.interval = interval
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="warm-pool")
+        self._lock = threading.Lock()
+        self._ready = {profile: deque() for profile in self.profiles}
+        self._building = {profile: 0 for profile in self.profiles}
+        # Claim timestamps still waiting for a replacement, used for refill lag
+        self._deficits = {profile: deque() for profile in self.profiles}
+        self._hits = 0
+        self._misses = 0
+        self._failures = 0
+        self._lags = deque(maxlen=100)
+        self._stop = threading.Event()
+        self._thread = None
+
+    @property
+    def enabled(self):
+        return self.size > 0 and bool(self.profiles)
+
+    def start(self):
+        if not self.enabled or self._thread:
+            return
+        self._discover()
+        self._thread = threading.Thread(target=self._replenish_loop, name="warm-pool-replenisher", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+    def claim(self, box_name, cpus, memory, user_email, vm_name):
+        """Hand a ready VM to user_email as vm_name, or None on a pool miss"""
+        if not self.enabled:
+            return None
+        profile = (box_name, cpus, memory)
+        with self._lock:
+            ready = self._ready.get(profile)
+            if not ready or self.allocator.find(user_email, vm_name):
+                self._misses += 1
+                return None
+            workspace = ready.popleft()
+            self._hits += 1
+            self._deficits[profile].append(time.monotonic())
+        try:
+            os.remove(os.path.join(workspace.terraform_dir, WARM_MARKER_FILE))
+        except FileNotFoundError:
+            pass
+        claimed = self.allocator.rename(workspace, user_email, vm_name)
+        if self.on_claim:
+            self.on_claim(workspace, claimed)
+        self.refill()
+        return claimed
+
+    def give_back(self, workspace, box_name, cpus, memory):
+        """Return a claimed VM that never reached its user (e.g. its create was refused) to the pool"""
+        profile = (box_name, cpus, memory)
+        vm_name = f"warm-{uuid.uuid4().hex[:8]}"
+        returned = self.allocator.rename(workspace, WARM_POOL_OWNER, vm_name)
+        if self.on_claim:
+            self.on_claim(workspace, returned)
+        self._mark_ready(returned, profile, vm_name)
+        with self._lock:
+            self._ready[profile].appendleft(returned)
+            self._hits -= 1
+            if self._deficits[profile]:
+                self._deficits[profile].pop()
+        return returned
+
+    def refill(self):
+        """Schedule builds for every profile below its target size"""
+        if not self.enabled or self._stop.is_set():
+            return
+        with self._lock:
+            for profile in self.profiles:
+                missing = self.size - len(self._ready[profile]) - self._building[profile]
+                for _ in range(max(missing, 0)):
+                    self._building[profile] += 1
+                    self._executor.submit(self._build, profile)
+
+    def stats(self):
+        with self._lock:
+            lookups = self._hits + self._misses
+            lags = list(self._lags)
+            return {
+                "enabled": self.enabled,
+                "target_size": self.size,
+                "hits": self._hits,
+                "misses": self._misses,
+                "hit_rate": round(self._hits / lookups, 4) if lookups else None,
+                "build_failures": self._failures,
+                "refill_lag_seconds": {
+                    "last": round(lags[-1], 2) if lags else None,
+                    "avg": round(sum(lags) / len(lags), 2) if lags else None,
+                    "max": round(max(lags), 2) if lags else None,
+                },
+                "profiles": {
+                    profile_label(profile): {
+                        "ready": len(self._ready[profile]),
+                        "building": self._building[profile],
+                        "waiting_refill": len(self._deficits[profile]),
+                    }
+                    for profile in self.profiles
+                },
+            }
+
+    def _build(self, profile):
+        vm_name = f"warm-{uuid.uuid4().hex[:8]}"
+        key = self.allocator.key_for(WARM_POOL_OWNER, vm_name)
+        workspace = None
+        try:
+            if self.reserve_fn and not self.reserve_fn(key, profile):
+                return  # no room right now; the next refill tries again
+            workspace = self.allocator.acquire(WARM_POOL_OWNER, vm_name)
+            self.build_fn(workspace, profile, vm_name)
+            self._mark_ready(workspace, profile, vm_name)
+            with self._lock:
+                self._ready[profile].append(workspace)
+                if self._deficits[profile]:
+                    self._lags.append(time.monotonic() - self._deficits[profile].popleft())
+            print(f"Warm pool: {vm_name} ready for {profile_label(profile)}")
+        except Exception:
+            traceback.print_exc()
+            with self._lock:
+                self._failures += 1
+            # Retried every interval, so a broken box must not keep an IP and capacity per attempt
+            self._discard(key, workspace)
+        finally:
+            with self._lock:
+                self._building[profile] -= 1
+
+    def _discard(self, key, workspace):
+        try:
+            if self.discard_fn:
+                self.discard_fn(key, workspace)
+        except Exception:
+            traceback.print_exc()
+        if workspace is not None:
+            self.allocator.release(workspace)
+
+    def _mark_ready(self, workspace, profile, vm_name):
+        with open(os.path.join(workspace.terraform_dir, WARM_MARKER_FILE), "w") as f:
+            json.dump({"profile": list(profile), "vm_name": vm_name}, f)
+
+    def _discover(self):
+        # Re-adopt warm VMs that were booted before a restart
+        if not os.path.isdir(self.allocator.workspaces_dir):
+            return
+        for key in os.listdir(self.allocator.workspaces_dir):
+            marker = os.path.join(self.allocator.workspaces_dir, key, WARM_MARKER_FILE)
+            if not os.path.exists(marker):
+                continue
+            with open(marker) as f:
+                info = json.load(f)
+            profile = tuple(info["profile"])
+            workspace = self.allocator.find(WARM_POOL_OWNER, info["vm_name"])
+            if profile in self._ready and workspace:
+                self._ready[profile].append(workspace)
+
+    def _replenish_loop(self):
+        while not self._stop.is_set():
+            try:
+                self.refill()
+            except Exception:
+                traceback.print_exc()
+            self._stop.wait(self.interval)
@@ -0,0 +1,206 @@
+import hashlib
+import ipaddress
+import json
+import os
+import re
+import shutil
+import threading
+import uuid
+
+# ---Workspace Configuration----
+# A relative root resolves against Backend/, not the directory the API happens to be started from
+VM_WORKSPACE_ROOT = os.path.join(
+    os.path.dirname(os.path.abspath(__file__)),
+    os.getenv("VM_WORKSPACE_ROOT", r"C:\Users\Arin Raut\v-t-vm" if os.name == "nt" else "vm-workspaces"),
+)
+VM_IP_CIDR = os.getenv("VM_IP_CIDR", "192.168.56.0/24")
+# Addresses in the CIDR we never hand out (e.g. the VirtualBox host-only adapter)
+VM_IP_RESERVED = [ip.strip() for ip in os.getenv("VM_IP_RESERVED", "192.168.56.1").split(",") if ip.strip()]
+BATCH_MARKER = ".batch"  # in a workspace built by a batch: path of the batch's terraform directory
+MOVED_MARKER = ".booted-in"  # in a renamed workspace: the vagrant directory its VM was booted from
+
+
+class IPPoolExhaustedError(Exception):
+    pass
+
+
+class IPPool:
+    """Leases private_network addresses out of a CIDR, persisted to a JSON file"""
+
+    def __init__(self, cidr=VM_IP_CIDR, lease_file=None, reserved=None):
+        self.network = ipaddress.ip_network(cidr, strict=False)
+        self.lease_file = lease_file
+        self.reserved = set(reserved if reserved is not None else VM_IP_RESERVED)
+        self._leases = {}  # owner key -> ip
+        self._lock = threading.Lock()
+        self._load()
+
+    def lease(self, key):
+        """Return the address leased to key, leasing a free one if needed"""
+        with self._lock:
+            if key in self._leases:
+                return self._leases[key]
+            taken = set(self._leases.values()) | self.reserved
+            for host in self.network.hosts():
+                ip = str(host)
+                if ip not in taken:
+                    self._leases[key] = ip
+                    self._save()
+                    return ip
+        raise IPPoolExhaustedError(f"No free addresses left in {self.network}")
+
+    def release(self, key):
+        with self._lock:
+            ip = self._leases.pop(key, None)
+            if ip is not None:
+                self._save()
+            return ip
+
+    def get(self, key):
+        with self._lock:
+            return self._leases.get(key)
+
+    def rekey(self, old_key, new_key):
+        """Move an existing lease to a new owner key"""
+        with self._lock:
+            ip = self._leases.pop(old_key)
+            self._leases[new_key] = ip
+            self._save()
+            return ip
+
+    def leases(self):
+        with self._lock:
+            return dict(self._leases)
+
+    def _load(self):
+        if not self.lease_file or not os.path.exists(self.lease_file):
+            return
+        with open(self.lease_file) as f:
+            self._leases = json.load(f)
+
+    def _save(self):
+        if not self.lease_file:
+            return
+        os.makedirs(os.path.dirname(self.lease_file), exist_ok=True)
+        tmp_path = self.lease_file + ".tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(self._leases, f, indent=2)
+        os.replace(tmp_path, self.lease_file)
+
+
+class Workspace:
+    """Per-VM terraform directory with its own vagrant/ subdirectory and IP"""
+
+    def __init__(self, key, terraform_dir, ip):
+        self.key = key
+        self.terraform_dir = terraform_dir
+        self.vagrant_dir = os.path.join(terraform_dir, "vagrant")
+        self.ip = ip
+
+    def to_dict(self):
+        return {
+            "key": self.key,
+            "terraform_dir": self.terraform_dir,
+            "vagrant_dir": self.vagrant_dir,
+            "ip": self.ip,
+        }
+
+
+class WorkspaceAllocator:
+    """Hands each (user, vm_name) its own workspace directory and IP lease"""
+
+    def __init__(self, root=VM_WORKSPACE_ROOT, ip_pool=None):
+        self.root = root
+        self.workspaces_dir = os.path.join(root, "workspaces")
+        self.batches_dir = os.path.join(root, "batches")
+        self.ip_pool = ip_pool or IPPool(lease_file=os.path.join(root, "ip_leases.json"))
+        self._locks = {}
+        self._locks_guard = threading.Lock()
+
+    def key_for(self, user_email, vm_name):
+        slug = re.sub(r"[^A-Za-z0-9_.-]+", "-", vm_name).strip("-") or "vm"
+        owner = hashlib.sha1(user_email.encode("utf-8")).hexdigest()[:8]
+        return f"{slug}-{owner}"
+
+    def lock(self, key):
+        """Lock serialising create/destroy runs against the same workspace"""
+        with self._locks_guard:
+            return self._locks.setdefault(key, threading.Lock())
+
+    def acquire(self, user_email, vm_name):
+        """Create (or reuse) the workspace for a VM and lease it an address"""
+        key = self.key_for(user_email, vm_name)
+        terraform_dir = os.path.join(self.workspaces_dir, key)
+        ip = self.ip_pool.lease(key)
+        os.makedirs(os.path.join(terraform_dir, "vagrant"), exist_ok=True)
+        return Workspace(key, terraform_dir, ip)
+
+    def find(self, user_email, vm_name):
+        """Existing workspace for a VM, or None if it was never allocated"""
+        key = self.key_for(user_email, vm_name)
+        terraform_dir = os.path.join(self.workspaces_dir, key)
+        if not os.path.isdir(terraform_dir):
+            return None
+        return Workspace(key, terraform_dir, self.ip_pool.get(key))
+
+    def rename(self, workspace, user_email, vm_name):
+        """Hand an existing workspace (and its lease) over to another (user, vm_name)"""
+        key = self.key_for(user_email, vm_name)
+        terraform_dir = os.path.join(self.workspaces_dir, key)
+        with self.lock(workspace.key):
+            # Vagrant's machine index keeps the directory the VM was booted from; remember it for lookups
+            marker = os.path.join(workspace.terraform_dir, MOVED_MARKER)
+            if not os.path.exists(marker):
+                with open(marker, "w") as f:
+                    f.write(workspace.vagrant_dir)
+            os.rename(workspace.terraform_dir, terraform_dir)
+            ip = self.ip_pool.rekey(workspace.key, key)
+        return Workspace(key, terraform_dir, ip)
+
+    def vagrant_homes(self, key):
+        """Directories Vagrant may list a workspace's VM under: its own, then where a renamed one was booted"""
+        terraform_dir = os.path.join(self.workspaces_dir, key)
+        homes = [os.path.join(terraform_dir, "vagrant")]
+        marker = os.path.join(terraform_dir, MOVED_MARKER)
+        if os.path.exists(marker):
+            with open(marker) as f:
+                homes.append(f.read().strip())
+        return homes
+
+    def release(self, workspace):
+        """Give the address back to the pool and remove the workspace directory"""
+        self.ip_pool.release(workspace.key)
+        shutil.rmtree(workspace.terraform_dir, ignore_errors=True)
+
+    def create_batch(self, workspaces):
+        """Give workspaces built together one shared terraform directory and return its path"""
+        batch_dir = os.path.join(self.batches_dir, uuid.uuid4().hex[:12])
+        os.makedirs(batch_dir)
+        for workspace in workspaces:
+            with open(os.path.join(workspace.terraform_dir, BATCH_MARKER), "w") as f:
+                f.write(batch_dir)
+        return batch_dir
+
+    def batch_of(self, workspace):
+        """Terraform directory of the batch a workspace was built in, or None"""
+        marker = os.path.join(workspace.terraform_dir, BATCH_MARKER)
+        if not os.path.exists(marker):
+            return None
+        with open(marker) as f:
+            batch_dir = f.read().strip()
+        return batch_dir if os.path.isdir(batch_dir) else None
+
+    def batch_members(self, batch_dir):
+        """Workspaces still built from batch_dir"""
+        members = []
+        for key in sorted(os.listdir(self.workspaces_dir)):
+            workspace = Workspace(key, os.path.join(self.workspaces_dir, key), self.ip_pool.get(key))
+            if self.batch_of(workspace) == batch_dir:
+                members.append(workspace)
+        return members
+
+    def batch_lock(self, batch_dir):
+        return self.lock("batch:" + os.path.basename(batch_dir))
+
+    def release_batch(self, batch_dir):
+        shutil.rmtree(batch_dir, ignore_errors=True)
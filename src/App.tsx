@@ -2,7 +2,8 @@ import { useState } from 'react';
 import { Play, AlertCircle, CheckCircle, Terminal, Settings, Cpu, HardDrive, Trash2, ChevronDown, LogOut } from 'lucide-react';
 import LoginPage from './component/LoginPage.tsx';
 
-type LogLevel = 'error' | 'warning' | 'info' | 'success';
+// 'output' is a raw terraform/vagrant line from a job
+type LogLevel = 'error' | 'warning' | 'info' | 'success' | 'output';
 
 type LogEntry = {
     timestamp: string;
@@ -79,6 +80,35 @@ function App() {
         setLogs((prev) => [...prev, newLog]);
     };
 
+    // Poll a queued provisioning job until it finishes, surfacing each phase as it happens
+    const waitForJob = async (jobId: string) => {
+        // Counted with job.entry_count: job.phases only keeps the newest JOB_LOG_LIMIT entries
+        let seen = 0;
+        while (true) {
+            const response = await fetch(`http://localhost:8000/jobs/${jobId}`, {
+                headers: getAuthHeaders()
+            });
+            const job = await response.json();
+            if (!response.ok) {
+                throw new Error(job.detail || 'Failed to fetch job status');
+            }
+
+            const fresh = Math.min(job.entry_count - seen, job.phases.length);
+            for (const entry of job.phases.slice(job.phases.length - fresh)) {
+                addLog(entry.level, entry.message);
+                if (entry.phase) {
+                    setCurrentStep(entry.phase);
+                }
+            }
+            seen = job.entry_count;
+
+            if (job.status === 'succeeded' || job.status === 'failed') {
+                return job;
+            }
+            await new Promise((resolve) => setTimeout(resolve, 2000));
+        }
+    };
+
     const createVM = async () => {
         setIsCreating(true);
         setLogs([]);
@@ -105,9 +135,14 @@ function App() {
                 })
             });
 
-            const result = await response.json();
-
+            const accepted = await response.json();
             if (response.ok) {
+                addLog('info', `Provisioning job ${accepted.job_id} queued`);
+            }
+            const job = response.ok ? await waitForJob(accepted.job_id) : null;
+            const result = job ? (job.result ?? { detail: job.error }) : accepted;
+
+            if (job && job.status === 'succeeded') {
                 addLog('success', 'VM created successfully!');
                 addLog('info', `Terraform init output: ${result.terraform_init}`);
                 addLog('info', `Terraform apply output: ${result.terraform_apply}`);
@@ -149,9 +184,11 @@ function App() {
                 })
             });
 
-            const result = await response.json();
+            const accepted = await response.json();
+            const job = response.ok ? await waitForJob(accepted.job_id) : null;
+            const result = job ? (job.result ?? { detail: job.error }) : accepted;
 
-            if (response.ok) {
+            if (job && job.status === 'succeeded') {
                 addLog('success', 'VM destroyed successfully!');
                 addLog('info', `Terraform destroy output: ${result.terraform_destroy}`);
             } else {
@@ -170,6 +207,7 @@ function App() {
             case 'error': return <AlertCircle className="w-4 h-4 text-red-500" />;
             case 'success': return <CheckCircle className="w-4 h-4 text-green-500" />;
             case 'warning': return <AlertCircle className="w-4 h-4 text-amber-500" />;
+            case 'output': return <Terminal className="w-4 h-4 text-gray-500" />;
             default: return <Terminal className="w-4 h-4 text-blue-500" />;
         }
     };
@@ -179,6 +217,7 @@ function App() {
             case 'error': return 'text-red-700 bg-red-50 border-red-200';
             case 'success': return 'text-green-700 bg-green-50 border-green-200';
             case 'warning': return 'text-amber-700 bg-amber-50 border-amber-200';
+            case 'output': return 'text-gray-700 bg-gray-50 border-gray-200';
             default: return 'text-blue-700 bg-blue-50 border-blue-200';
         }
     };
@@ -407,7 +446,8 @@ function App() {
                                                         <span className={`log-badge ${log.level === 'error' ? 'badge-error' :
                                                             log.level === 'success' ? 'badge-success' :
                                                                 log.level === 'warning' ? 'badge-warning' :
-                                                                    'badge-info'
+                                                                    log.level === 'output' ? 'badge-output' :
+                                                                        'badge-info'
                                                             }`}>
                                                             {log.level}
                                                         </span>
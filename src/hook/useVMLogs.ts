@@ -1,5 +1,5 @@
 import { useCallback, useEffect, useState } from "react";
-import type { VMCreationLog, VMLogBackendResponse } from "../lib/supabase";
+import type { VMCreationLog, VMLogBackendResponse, VMLogPage } from "../lib/supabase";
 import { getTokenFromStorage, isTokenExpired } from "../lib/jwt";
 
 const API_BASE_URL = "http://localhost:8000";
@@ -16,6 +16,21 @@ export const useVMLogs = (userId: string | null) => {
         return !!token && !isTokenExpired(token) && !!userId;
     }, [token, userId]);
 
+    // Map backend logs to frontend VMCreationLog type
+    const toFrontendLog = useCallback((log: VMLogBackendResponse): VMCreationLog => ({
+        id: log.id, // Use the actual UUID from backend
+        user_id: userId!,
+        box_name: log.box_name,
+        vm_name: log.vm_name,
+        cpus: log.cpus,
+        memory: log.memory,
+        status: log.status as "pending" | "success" | "error",
+        logs: log.logs || [],
+        terraform_output: log.terraform_output || "",
+        created_at: log.created_at,
+    }), [userId]);
+
+    // Fetch the newest page of logs; the browser revalidates it with the ETag
     const fetchVMLogs = useCallback(async () => {
         if (!isAuthorized()) {
             setVmLogs([]);
@@ -40,7 +55,7 @@ export const useVMLogs = (userId: string | null) => {
                 return;
             }
 
-            const result = await response.json();
+            const result: VMLogPage = await response.json();
 
             if (!Array.isArray(result.logs)) {
                 setError("Invalid response format from server");
@@ -48,21 +63,7 @@ export const useVMLogs = (userId: string | null) => {
                 return;
             }
 
-            // Map backend logs to frontend VMCreationLog type
-            const logs: VMCreationLog[] = result.logs.map((log: VMLogBackendResponse) => ({
-                id: log.id, // Use the actual UUID from backend
-                user_id: userId!,
-                box_name: log.box_name,
-                vm_name: log.vm_name,
-                cpus: log.cpus,
-                memory: log.memory,
-                status: log.status as "pending" | "success" | "error",
-                logs: log.logs || [],
-                terraform_output: log.terraform_output || "",
-                created_at: log.created_at,
-            }));
-
-            setVmLogs(logs);
+            setVmLogs(result.logs.map(toFrontendLog));
         } catch (fetchError) {
             console.error("Error fetching VM logs:", fetchError);
             setError("Network error while fetching VM logs");
@@ -70,7 +71,7 @@ export const useVMLogs = (userId: string | null) => {
         } finally {
             setLoading(false);
         }
-    }, [isAuthorized, token, userId]);
+    }, [isAuthorized, token, toFrontendLog]);
 
     // Fetch logs on userId change or token change
     useEffect(() => {
@@ -38,7 +38,19 @@ export interface  VMLogBackendResponse{
   cpus: number;
   memory: number;
   status:  string;
-  terraform_output: string | null;
-  logs: any[] | null;
+  ip_address?: string | null;
+  tags?: string[];
+  vm_state?: string | null;
+  linked_clone?: boolean;
+  disk_saved_bytes?: number | null;
+  // Only present when requested with ?fields=, otherwise load via /vm-logs/{id}/output
+  terraform_output?: string | null;
+  logs?: any[] | null;
   created_at: string;
 }
+
+// GET /vm-logs page
+export interface VMLogPage {
+  logs: VMLogBackendResponse[];
+  next_cursor: string | null;
+}